@@ -0,0 +1,224 @@
+"""
+Snapshot of an identity's learning state, used for the dashboard.
+
+The dashboard shows several different views of the same UserVerseStatus rows
+(learning queues, review queues, passages, catechisms, next verse due, today's
+stats). Rather than doing separate queries for each, LearningState loads all
+the active rows once, with the related TextVersion and VerseSet objects shared
+between them, and calculates everything in memory. This means the dashboard
+needs a fixed number of queries, however many sets are being learned.
+
+The Identity methods with the same names use this class, so the logic is the
+same whichever is used. Each method here matches the query based code it
+replaced, including ordering.
+"""
+
+import itertools
+from collections import defaultdict
+
+from django.db.models import Count
+from django.utils import timezone
+
+from accounts import memorymodel, reviewqueue
+from bibleverses.models import MemoryStage, QAPair, TextType, VerseSetType
+
+
+class LearningState:
+    def __init__(self, identity, verse_statuses, now):
+        self.identity = identity
+        # All active UserVerseStatuses, in order of 'added', 'id'
+        self.verse_statuses = verse_statuses
+        self.now = now
+
+    @classmethod
+    def load(cls, identity, now=None):
+        verse_statuses = list(
+            identity.verse_statuses.active().prefetch_related("version", "verse_set").order_by("added", "id")
+        )
+        return cls(identity, verse_statuses, timezone.now() if now is None else now)
+
+    def get(self, uvs_id):
+        """
+        Returns the active UserVerseStatus with the given id, or None
+        """
+        for uvs in self.verse_statuses:
+            if uvs.id == uvs_id:
+                return uvs
+        return None
+
+    # Filters, matching UserVerseStatusQuerySet methods
+
+    def _bible(self):
+        return [uvs for uvs in self.verse_statuses if uvs.version.text_type == TextType.BIBLE]
+
+    def _catechism(self):
+        return [uvs for uvs in self.verse_statuses if uvs.version.text_type == TextType.CATECHISM]
+
+    def _passage(self):
+        return [uvs for uvs in self.verse_statuses if _is_passage(uvs)]
+
+    # Bible verses
+
+    def bible_verse_statuses_for_reviewing(self):
+        """
+        Returns the review queue - Bible verses needing review, most urgent first.
+        """
+        uvs_list = [uvs for uvs in self._bible() if uvs.needs_reviewing(self.now) and not _is_passage(uvs)]
+        # Ties stay in 'added' order. Deduping after sorting keeps the most
+        # urgent of any duplicates.
+        uvs_list = reviewqueue.rank_by_urgency(uvs_list, now=self.now)
+        return self.identity._dedupe_uvs_set(uvs_list)
+
+    def bible_verse_statuses_for_learning_grouped(self):
+        uvs_list = [uvs for uvs in self._bible() if uvs.memory_stage < MemoryStage.TESTED and not _is_passage(uvs)]
+        # Ordered by verse set (nulls last), then 'added', 'id' order
+        uvs_list.sort(key=lambda uvs: (uvs.verse_set_id is None, uvs.verse_set_id or 0))
+        # We don't fully dedupe, because we want to distinguish
+        # between UVSes with verse_set == None and verse_set != None
+        uvs_list = self.identity._dedupe_uvs_set_distinguishing_verse_set(uvs_list)
+        return [(a, list(b)) for a, b in itertools.groupby(uvs_list, lambda uvs: uvs.verse_set)]
+
+    # Catechisms
+
+    def catechisms_for_learning(self):
+        catechisms = {}
+        for uvs in self._catechism():
+            if uvs.memory_stage >= MemoryStage.TESTED:
+                continue
+            catechism = uvs.version
+            if catechism.id not in catechisms:
+                catechisms[catechism.id] = catechism
+                catechism.untested_total = 0
+            catechism.untested_total += 1
+
+        if catechisms:
+            qapair_counts = dict(
+                QAPair.objects.filter(catechism__in=list(catechisms))
+                .values("catechism")
+                .annotate(count=Count("id"))
+                .values_list("catechism", "count")
+            )
+            for catechism in catechisms.values():
+                catechism.tested_total = qapair_counts.get(catechism.id, 0) - catechism.untested_total
+
+        return sorted(catechisms.values(), key=lambda c: c.full_name)
+
+    def catechisms_for_reviewing(self):
+        catechisms = {}
+        for uvs in self._catechism():
+            if not uvs.needs_reviewing(self.now):
+                continue
+            catechism = uvs.version
+            if catechism.id not in catechisms:
+                catechisms[catechism.id] = catechism
+                catechism.needs_reviewing_total = 0
+            catechism.needs_reviewing_total += 1
+
+        return sorted(catechisms.values(), key=lambda c: c.full_name)
+
+    # Passages
+
+    def _passage_verse_statuses_by_chosen_set(self):
+        retval = defaultdict(list)
+        for uvs in self._passage():
+            retval[uvs.verse_set_id, uvs.version_id].append(uvs)
+        return retval
+
+    def passages_for_learning(self, extra_stats=True):
+        from accounts.models import ChosenVerseSet
+
+        chosen_verse_sets = {
+            ChosenVerseSet(version=uvs.version, verse_set=uvs.verse_set)
+            for uvs in self._passage()
+            if uvs.memory_stage < MemoryStage.TESTED
+        }
+        if not extra_stats:
+            return list(chosen_verse_sets)
+
+        by_chosen_set = self._passage_verse_statuses_by_chosen_set()
+        for cvs in chosen_verse_sets:
+            uvss = by_chosen_set[cvs.verse_set.id, cvs.version.id]
+            cvs.maximum_urgency = reviewqueue.maximum_urgency(uvss, now=self.now)
+            cvs.tested_total = len([uvs for uvs in uvss if uvs.is_tested()])
+            cvs.untested_total = len(uvss) - cvs.tested_total
+            cvs.needs_review_total = len([uvs for uvs in uvss if uvs.needs_reviewing(self.now)])
+
+        return sorted(list(chosen_verse_sets), key=lambda c: (-c.maximum_urgency, c.sort_key))
+
+    def passages_for_reviewing_and_learning(self):
+        from accounts.models import ChosenVerseSet
+
+        learning_sets = self.passages_for_learning()
+        learning_verse_set_ids = {cvs.id for cvs in learning_sets}
+
+        chosen_verse_sets = {
+            ChosenVerseSet(verse_set=uvs.verse_set, version=uvs.version)
+            for uvs in self._passage()
+            if uvs.needs_reviewing(self.now)
+        }
+        # Remove things that are still in initial learning phase
+        chosen_verse_set_list = [cvs for cvs in chosen_verse_sets if cvs.id not in learning_verse_set_ids]
+
+        by_chosen_set = self._passage_verse_statuses_by_chosen_set()
+        for cvs in chosen_verse_set_list:
+            uvss = sorted(by_chosen_set[cvs.verse_set.id, cvs.version.id], key=lambda uvs: uvs.text_order)
+            self.identity._set_needs_testing_override(uvss)
+            next_section = self.identity.get_next_section(uvss, cvs.verse_set, add_buffer=False)
+            cvs.next_section_verse_count = len(next_section)
+
+            cvs.needs_testing_count = 0
+            cvs.group_testing = True
+            cvs.total_verse_count = len(uvss)
+            cvs.maximum_urgency = reviewqueue.maximum_urgency(uvss, now=self.now)
+
+            for uvs in uvss:
+                if uvs.needs_testing:
+                    cvs.needs_testing_count += 1
+
+                if uvs.strength <= memorymodel.STRENGTH_FOR_GROUP_TESTING:
+                    cvs.group_testing = False
+
+            cvs.splittable = cvs.verse_set.breaks != "" and cvs.group_testing
+
+        reviewing_sets = sorted(chosen_verse_set_list, key=lambda c: (-c.maximum_urgency, c.sort_key))
+        return (reviewing_sets, learning_sets)
+
+    # Other
+
+    def next_verse_due(self):
+        # We need to exlude verses that are part of passage sets that are
+        # still being learned, because those are pushed back from being
+        # 'reviewed' while the rest of the passage is in initial learning.
+        excluded_sets = {(cvs.verse_set.id, cvs.version.id) for cvs in self.passages_for_learning(extra_stats=False)}
+        candidates = [
+            uvs
+            for uvs in self.verse_statuses
+            if uvs.is_reviewable()
+            and uvs.next_test_due > self.now
+            and (uvs.verse_set_id, uvs.version_id) not in excluded_sets
+        ]
+        return min(candidates, key=lambda uvs: uvs.next_test_due, default=None)
+
+    def total_tested_today_count(self):
+        today_start = self.now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return len(
+            {
+                (uvs.version_id, uvs.localized_reference)
+                for uvs in self.verse_statuses
+                if uvs.last_tested is not None and uvs.last_tested >= today_start
+            }
+        )
+
+    def started_today_count(self):
+        today_start = self.now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return len(
+            {
+                (uvs.version_id, uvs.localized_reference)
+                for uvs in self.verse_statuses
+                if uvs.first_seen is not None and uvs.first_seen >= today_start
+            }
+        )
+
+
+def _is_passage(uvs):
+    return uvs.verse_set_id is not None and uvs.verse_set.set_type == VerseSetType.PASSAGE
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import Identity
+from bibleverses.models import TextVersion, VerseSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure query count and time for Identity.add_verse_set for a verse set, "
+        "compared with adding the verses one by one. Changes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("verse_set_slug")
+        parser.add_argument("--version", default="NET", help="Text version slug")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        verse_set = VerseSet.objects.get(slug=options["verse_set_slug"])
+        version = TextVersion.objects.get(slug=options["version"])
+        verse_count = verse_set.verse_choices.count()
+        self.stdout.write(f"{verse_set.name}: {verse_count} verse choices, version {version.slug}")
+
+        def bulk(identity):
+            identity.add_verse_set(verse_set, version=version)
+
+        def one_by_one(identity):
+            for vc in verse_set.verse_choices.all():
+                identity.create_verse_status(vc.get_localized_reference(version.language_code), verse_set, version)
+
+        for name, func in [("add_verse_set", bulk), ("one by one", one_by_one)]:
+            timings = []
+            query_counts = []
+            for _ in range(options["repeat"]):
+                with transaction.atomic():
+                    identity = Identity.objects.create(default_bible_version=version)
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        func(identity)
+                        timings.append(time.perf_counter() - start)
+                    query_counts.append(len(queries))
+                    transaction.set_rollback(True)
+            self.stdout.write(
+                f"{name}: {min(query_counts)} queries, "
+                f"best {min(timings) * 1000:.1f}ms, mean {sum(timings) / len(timings) * 1000:.1f}ms"
+            )
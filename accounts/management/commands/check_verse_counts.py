@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import VerseCounts
+from scores.models import get_verses_finished_count, get_verses_started_counts
+
+
+class Command(BaseCommand):
+    help = "Checks VerseCounts (used for milestones and learning awards) against UserVerseStatus data"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Correct any counts that are wrong")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, **options):
+        batch_size = options["batch_size"]
+        checked = 0
+        wrong = 0
+        counts_list = list(VerseCounts.objects.order_by("identity_id"))
+        for i in range(0, len(counts_list), batch_size):
+            batch = counts_list[i : i + batch_size]
+            started_counts = get_verses_started_counts([counts.identity_id for counts in batch])
+            for counts in batch:
+                checked += 1
+                verses_started = started_counts[counts.identity_id]
+                verses_finished = get_verses_finished_count(counts.identity_id)
+                if (counts.verses_started, counts.verses_finished) == (verses_started, verses_finished):
+                    continue
+                wrong += 1
+                self.stdout.write(
+                    f"Identity {counts.identity_id}: "
+                    f"started {counts.verses_started} should be {verses_started}, "
+                    f"finished {counts.verses_finished} should be {verses_finished}"
+                )
+                if options["fix"]:
+                    counts.verses_started = verses_started
+                    counts.verses_finished = verses_finished
+                    counts.save()
+        self.stdout.write(f"Checked {checked}, {wrong} wrong" + (" (fixed)" if options["fix"] and wrong else ""))
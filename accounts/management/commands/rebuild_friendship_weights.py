@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Rebuilds FriendshipWeight data (used for ranking events) from group memberships and follows"
+
+    def handle(self, **options):
+        from django.db.models import Q
+
+        from accounts.models import Account, FriendshipWeight, update_friendship_weights
+
+        account_ids = list(
+            Account.objects.filter(Q(groups__count_for_friendships=True) | Q(following__isnull=False))
+            .order_by("id")
+            .values_list("id", flat=True)
+            .distinct()
+        )
+        FriendshipWeight.objects.exclude(account_id__in=account_ids).delete()
+        update_friendship_weights(account_ids)
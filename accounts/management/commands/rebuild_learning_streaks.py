@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import rebuild_learning_streaks
+
+
+class Command(BaseCommand):
+    help = "Rebuilds LearningStreak data (used for consistent learner awards) from verse statuses"
+
+    def handle(self, **options):
+        rebuild_learning_streaks()
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.27 on 2026-10-18 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0035_alter_identity_interface_language"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LearningStreak",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("current_start", models.DateField()),
+                ("last_active", models.DateField(db_index=True)),
+                ("longest", models.PositiveIntegerField(default=0)),
+                (
+                    "identity",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="learning_streak",
+                        to="accounts.identity",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.27 on 2026-10-18 12:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0036_learningstreak"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VerseCounts",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("verses_started", models.PositiveIntegerField(default=0)),
+                ("verses_finished", models.PositiveIntegerField(default=0)),
+                (
+                    "identity",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="verse_counts",
+                        to="accounts.identity",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "verse counts",
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.27 on 2026-10-18 14:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0037_versecounts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FriendshipWeight",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("weight", models.FloatField()),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="friendship_weights",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "friend",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="friendshipweight",
+            constraint=models.UniqueConstraint(fields=("account", "friend"), name="friendshipweight_unique"),
+        ),
+    ]
@@ -4,19 +4,19 @@ import operator
 from collections import OrderedDict, defaultdict
 from dataclasses import dataclass
 from datetime import date, timedelta
-from functools import reduce
+from datetime import timezone as dt_timezone
 
 import attr
 import django_ftl
 from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, UserManager
 from django.core import mail
-from django.db import models, transaction
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models.functions import Coalesce, Greatest
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.functional import cached_property
 from fluent_compiler import types as fluent_types
-from sqlalchemy import text as sqla_text
 
 from accounts import memorymodel
 from accounts.signals import (
@@ -41,12 +41,17 @@ from bibleverses.models import (
     parse_validated_localized_reference,
 )
 from bibleverses.signals import verse_set_chosen
-from bibleverses.suggestions.modelapi import create_prompt_list
 from bibleverses.textutils import count_words
 from learnscripture.ftl_bundles import t, t_lazy
-from learnscripture.utils.cache import cache_results, clear_cache_results
 from learnscripture.utils.templates import render_to_string_ftl
-from scores.models import ScoreReason, Scores, TotalScore
+from scores.dailystats import (
+    get_site_daily_stats,
+    record_new_account,
+    record_verses_started,
+    refresh_verses_started,
+    utc_date,
+)
+from scores.models import ActionLog, ScoreReason, Scores, TotalScore
 
 
 class TestingMethod(models.TextChoices):
@@ -72,6 +77,10 @@ DEFAULT_THEME = "calm"
 
 DONT_NAG_NEW_USERS_FOR_MONEY_DAYS = 30
 
+# Limit on how old actions recorded offline can be, see
+# Identity.complete_verse_actions
+MAX_OFFLINE_ACTION_AGE = timedelta(days=7)
+
 
 class HeatmapStatsType(models.TextChoices):
     VERSES_STARTED = "VERSES_STARTED", t_lazy("heatmap-items-started-stat")
@@ -154,6 +163,7 @@ class Account(AbstractBaseUser):
         if self.id is None:
             retval = super().save(**kwargs)
             TotalScore.objects.create(account=self)
+            record_new_account(self.date_joined)
             return retval
         else:
             return super().save(**kwargs)
@@ -175,9 +185,14 @@ class Account(AbstractBaseUser):
 
         # Relationships:
         self.identity.verse_statuses.all().delete()
+        VerseCounts.objects.filter(identity=self.identity).delete()
         self.total_score.delete()
         self.action_logs.all().delete()
+        groups = list(self.groups.all())
         self.memberships.all().delete()
+        for group in groups:
+            group.update_friendship_weights()
+        self.friendship_weights.all().delete()
         self.invitations.all().delete()
         self.invitations_created.all().delete()
         # Preserve the comment object so that conversations still make some
@@ -251,10 +266,31 @@ class Account(AbstractBaseUser):
     def award_action_points(
         self, localized_reference, language_code, text, old_memory_stage, action_change, action_stage, accuracy
     ):
+        signals = []
+        with transaction.atomic():
+            action_logs = self._award_action_points(
+                localized_reference,
+                language_code,
+                text,
+                old_memory_stage,
+                action_change,
+                action_stage,
+                accuracy,
+                signals,
+            )
+        send_signals(signals)
+        return action_logs
+
+    def _award_action_points(
+        self, localized_reference, language_code, text, old_memory_stage, action_change, action_stage, accuracy, signals
+    ):
+        # Signals to be sent are appended to `signals`, for sending after
+        # the transaction is complete.
         if action_stage != StageType.TEST:
             return []
 
-        action_logs = []
+        new_action_logs = []
+        award_signals = []
         word_count = count_words(text)
         max_points = word_count * Scores.points_per_word(language_code)
         if old_memory_stage >= MemoryStage.TESTED:
@@ -262,54 +298,70 @@ class Account(AbstractBaseUser):
         else:
             reason = ScoreReason.VERSE_FIRST_TESTED
         points = max_points * accuracy
-        action_logs.append(self.add_points(points, reason, accuracy=accuracy, localized_reference=localized_reference))
+        new_action_logs.append(
+            ActionLog(
+                points=math.floor(points), reason=reason, accuracy=accuracy, localized_reference=localized_reference
+            )
+        )
 
         if accuracy == 1:
-            action_logs.append(
-                self.add_points(
-                    points * Scores.PERFECT_BONUS_FACTOR,
-                    ScoreReason.PERFECT_TEST_BONUS,
+            new_action_logs.append(
+                ActionLog(
+                    points=math.floor(points * Scores.PERFECT_BONUS_FACTOR),
+                    reason=ScoreReason.PERFECT_TEST_BONUS,
                     localized_reference=localized_reference,
                     accuracy=accuracy,
                 )
             )
             # At least one subscriber to scored_100_percent relies on action_logs
-            # to be created in order to do job. In context of tests, this means
-            # we have to send this signal after creating ActionLog
-            scored_100_percent.send(sender=self)
+            # to be created in order to do job, so signals must be sent
+            # after the ActionLogs are saved.
+            award_signals.append((scored_100_percent, self, {}))
 
         if action_change.old_strength < memorymodel.LEARNED <= action_change.new_strength:
-            action_logs.append(
-                self.add_points(
-                    word_count * Scores.points_per_word(language_code) * Scores.VERSE_LEARNED_BONUS,
-                    ScoreReason.VERSE_LEARNED,
+            new_action_logs.append(
+                ActionLog(
+                    points=math.floor(word_count * Scores.points_per_word(language_code) * Scores.VERSE_LEARNED_BONUS),
+                    reason=ScoreReason.VERSE_LEARNED,
                     localized_reference=localized_reference,
                     accuracy=accuracy,
                 )
             )
-            verse_finished.send(sender=self)
+            award_signals.append((verse_finished, self, {}))
 
         if action_stage == StageType.TEST and old_memory_stage < MemoryStage.TESTED:
-            verse_started.send(sender=self)
+            award_signals.append((verse_started, self, {}))
 
+        action_logs = self._add_action_logs(new_action_logs, signals)
+        signals.extend(award_signals)
         return action_logs
 
     def add_points(self, points, reason, accuracy=None, localized_reference="", award=None):
-        # Need to refresh 'total_score' each time
-        points = math.floor(points)
-        current_points = TotalScore.objects.get(account_id=self.id).points
-        action_log = self.action_logs.create(
-            points=points,
-            reason=reason,
-            localized_reference=localized_reference,
-            accuracy=accuracy,
-            award=award,
+        signals = []
+        [action_log] = self._add_action_logs(
+            [
+                ActionLog(
+                    points=math.floor(points),
+                    reason=reason,
+                    localized_reference=localized_reference,
+                    accuracy=accuracy,
+                    award=award,
+                )
+            ],
+            signals,
         )
+        send_signals(signals)
+        return action_log
+
+    def _add_action_logs(self, action_logs, signals):
+        previous_points = ActionLog.create_for_account(self.id, action_logs)
+        points_added = sum(action_log.points for action_log in action_logs)
         # Change cached object to reflect DB, which has been
         # updated via a SQL UPDATE for max correctness.
-        self.total_score.points = current_points + points
-        points_increase.send(sender=self, previous_points=current_points, points_added=action_log.points)
-        return action_log
+        self.total_score.points = previous_points + points_added
+        # One signal for all the points, rather than one per ActionLog
+        signals.append((points_increase, self, dict(previous_points=previous_points, points_added=points_added)))
+        return action_logs
 
     def get_action_logs(self, from_datetime, highest_id_seen=0):
         return self.action_logs.filter(created__gte=from_datetime, id__gt=highest_id_seen).order_by("created")
@@ -381,11 +433,13 @@ class Account(AbstractBaseUser):
 
     def follow_user(self, account):
         self.following.add(account)
-        clear_friendship_weight_cache(self.id)
+        # Done immediately, because it's nice for explicit actions to be
+        # reflected immediately on the dashboard.
+        update_friendship_weights([self.id])
 
     def unfollow_user(self, account):
         self.following.remove(account)
-        clear_friendship_weight_cache(self.id)
+        update_friendship_weights([self.id])
 
     @property
     def verse_sets_editable(self):
@@ -398,6 +452,34 @@ class Account(AbstractBaseUser):
         return self.is_superuser or self == verse_set.created_by
 
 
+class FriendshipWeight(models.Model):
+    """
+    Strength of the (probable) friendship of `account` with `friend`, from 0
+    to 1, used for ranking events. Only the strongest
+    FRIENDSHIP_WEIGHTS_MAX_FRIENDS are stored for each account. These are
+    recalculated by update_friendship_weights when group memberships and
+    follows change, and when groups are changed or deleted (see groups.hooks).
+    """
+
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="friendship_weights")
+    friend = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="+")
+    weight = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["account", "friend"], name="friendshipweight_unique"),
+        ]
+
+    def __str__(self):
+        return f"FriendshipWeight {self.account_id} -> {self.friend_id}: {self.weight}"
+
+
+FRIENDSHIP_WEIGHTS_MAX_FRIENDS = 200
+
+# Weight given to self, so user sees their own events.
+FRIENDSHIP_WEIGHT_SELF = 0.3
+
+
 def normalize_weighting(weights):
     if not weights:
         return
@@ -406,46 +488,89 @@ def normalize_weighting(weights):
         weights[k] = v / max_weight
 
 
-@cache_results(seconds=1200)
 def account_get_friendship_weights(account_id):
-    # We use groups to define possible friendships.
-    account = Account.objects.get(id=account_id)
-    weights = defaultdict(int)
-    for group in account.groups.filter(count_for_friendships=True).prefetch_related("members"):
-        members = list(group.members.all())
-        # Smaller groups are better evidence of friendship.
-        w = 1.0 / len(members)
-        for m in members:
-            weights[m.id] += w
-
-    # It's nice to see yourself in the event stream, but not that
-    # important, so we first remove self.id, so it doesn't affect
-    # normalisation, then add it back at level 0.5
-
-    try:
-        del weights[account_id]
-    except KeyError:
-        pass
-
-    # Normalize to 1
-    normalize_weighting(weights)
-
-    # We use 'following' in indicate definite friendships. Following is worth
-    # more than any evidence from groups.
-    for acc in account.following.all():
-        weights[acc.id] += 1.5
-
-    # Normalize again
-    normalize_weighting(weights)
-
-    # Give some weight to self, so user sees their own events.
-    weights[account_id] = 0.3
-
+    weights = dict(FriendshipWeight.objects.filter(account_id=account_id).values_list("friend_id", "weight"))
+    weights[account_id] = FRIENDSHIP_WEIGHT_SELF
     return weights
 
 
-def clear_friendship_weight_cache(account_id):
-    clear_cache_results(account_get_friendship_weights, account_id)
+def calculate_friendship_weights(account_ids):
+    """
+    Returns a dictionary of {account_id: {friend_account_id: weight}} for the
+    given accounts. Self is not included.
+    """
+    # We use groups to define possible friendships.
+    group_weights = {account_id: defaultdict(int) for account_id in account_ids}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH group_weights AS (
+              -- Smaller groups are better evidence of friendship.
+              SELECT m.group_id, 1.0 / COUNT(*) AS weight
+              FROM groups_membership m
+              INNER JOIN groups_group g ON g.id = m.group_id
+              WHERE g.count_for_friendships
+                AND m.group_id IN (SELECT group_id FROM groups_membership WHERE account_id = ANY(%(account_ids)s))
+              GROUP BY m.group_id
+            )
+            SELECT m1.account_id, m2.account_id, SUM(gw.weight)
+            FROM groups_membership m1
+            INNER JOIN group_weights gw ON gw.group_id = m1.group_id
+            INNER JOIN groups_membership m2 ON m2.group_id = m1.group_id
+            WHERE m1.account_id = ANY(%(account_ids)s)
+            GROUP BY m1.account_id, m2.account_id;
+            """,
+            dict(account_ids=list(account_ids)),
+        )
+        for account_id, friend_id, weight in cursor.fetchall():
+            group_weights[account_id][friend_id] += float(weight)
+
+    following = defaultdict(list)
+    for from_account_id, to_account_id in Account.following.through.objects.filter(
+        from_account_id__in=account_ids
+    ).values_list("from_account_id", "to_account_id"):
+        following[from_account_id].append(to_account_id)
+
+    retval = {}
+    for account_id, weights in group_weights.items():
+        # It's nice to see yourself in the event stream, but not that
+        # important, so we first remove self, so it doesn't affect
+        # normalisation. It is added back at FRIENDSHIP_WEIGHT_SELF by
+        # account_get_friendship_weights.
+        weights.pop(account_id, None)
+
+        # Normalize to 1
+        normalize_weighting(weights)
+
+        # We use 'following' in indicate definite friendships. Following is worth
+        # more than any evidence from groups.
+        for friend_id in following[account_id]:
+            weights[friend_id] += 1.5
+        weights.pop(account_id, None)
+
+        # Normalize again
+        normalize_weighting(weights)
+        retval[account_id] = weights
+    return retval
+
+
+def update_friendship_weights(account_ids, batch_size=500):
+    """
+    Recalculates the stored FriendshipWeight rows for the given accounts.
+    """
+    account_ids = list(account_ids)
+    for i in range(0, len(account_ids), batch_size):
+        batch_ids = account_ids[i : i + batch_size]
+        new_weights = []
+        for account_id, weights in calculate_friendship_weights(batch_ids).items():
+            strongest = sorted(weights.items(), key=lambda item: (-item[1], item[0]))[:FRIENDSHIP_WEIGHTS_MAX_FRIENDS]
+            new_weights.extend(
+                FriendshipWeight(account_id=account_id, friend_id=friend_id, weight=weight)
+                for friend_id, weight in strongest
+            )
+        with transaction.atomic():
+            FriendshipWeight.objects.filter(account_id__in=batch_ids).delete()
+            FriendshipWeight.objects.bulk_create(new_weights)
 
 
 def send_payment_received_email(account, payment):
@@ -472,6 +597,14 @@ class ActionChange:
         self.__dict__.update(kwargs)
 
 
+def send_signals(signals):
+    """
+    Sends signals collected as a list of (signal, sender, kwargs)
+    """
+    for signal, sender, kwargs in signals:
+        signal.send(sender=sender, **kwargs)
+
+
 class IdentityManager(models.Manager):
     def get_queryset(self):
         return super().get_queryset().select_related("default_bible_version", "account")
@@ -582,27 +715,102 @@ class Identity(models.Model):
             version = self.default_bible_version
         language_code = version.language_code
 
-        out = []
+        vc_refs = [vc.get_localized_reference(language_code) for vc in verse_set.verse_choices.all()]
+        set_uvss = {
+            uvs.localized_reference: uvs for uvs in self.verse_statuses.filter(verse_set=verse_set, version=version)
+        }
 
-        vc_list = verse_set.verse_choices.all()
-        existing_uvss = set(self.verse_statuses.active().filter(verse_set=verse_set, version=version))
+        # Want to preserve order of verse_set, so iterate like this.
+        # Anything we don't already have needs resolving, which we do in bulk.
+        refs_to_resolve = [ref for ref in vc_refs if ref not in set_uvss or set_uvss[ref].ignored]
+        verse_dict = version.get_verses_by_localized_reference_bulk(refs_to_resolve) if refs_to_resolve else {}
+
+        # Merged verses: verse_dict might have a different idea about what
+        # localized_reference is, and existing data for the verse will be under
+        # the corrected reference.
+        same_verses = {}
+        if verse_dict:
+            for uvs in self.verse_statuses.filter(
+                version=version, localized_reference__in={v.localized_reference for v in verse_dict.values()}
+            ).order_by("id"):
+                same_verses.setdefault(uvs.localized_reference, uvs)
 
-        uvss_dict = {uvs.localized_reference: uvs for uvs in existing_uvss}
+        out = []
+        new_uvss = []
+        reactivated_uvss = []
+        # Slightly increasing values of 'added' preserve the order.
+        now = timezone.now()
+        for i, vc_ref in enumerate(vc_refs):
+            uvs = set_uvss.get(vc_ref, None)
+            if uvs is None or uvs.ignored:
+                verse = verse_dict.get(vc_ref, None)
+                if verse is None:
+                    # This can happen if Verse.missing==True for this version.
+                    continue
+                localized_reference = verse.localized_reference
+                uvs = set_uvss.get(localized_reference, None)
+                if uvs is None:
+                    uvs = self._new_verse_status(
+                        verse, verse_set, version, now + timedelta(microseconds=i), same_verses.get(localized_reference)
+                    )
+                    set_uvss[localized_reference] = uvs
+                    new_uvss.append(uvs)
+                elif uvs.ignored:
+                    uvs.ignored = False
+                    reactivated_uvss.append(uvs)
+            if uvs not in out:
+                out.append(uvs)
 
-        # Want to preserve order of verse_set, so iterate like this:
-        for vc in vc_list:
-            vc_localized_reference = vc.get_localized_reference(language_code)
-            if vc_localized_reference in uvss_dict:
-                # Save work - create_verse_status is expensive
-                out.append(uvss_dict[vc_localized_reference])
-            else:
-                new_uvs = self.create_verse_status(vc_localized_reference, verse_set, version)
+        try:
+            if new_uvss:
+                with transaction.atomic():
+                    UserVerseStatus.objects.bulk_create(new_uvss)
+        except IntegrityError:
+            # Another request added some of these at the same time, so
+            # fall back to the slower path that copes with that.
+            out = []
+            for vc_ref in vc_refs:
+                new_uvs = self.create_verse_status(vc_ref, verse_set, version)
                 if new_uvs is not None and new_uvs not in out:
                     out.append(new_uvs)
+        if reactivated_uvss:
+            UserVerseStatus.objects.filter(id__in=[uvs.id for uvs in reactivated_uvss]).update(ignored=False)
+        if reactivated_uvss or any(uvs.memory_stage >= MemoryStage.TESTED for uvs in new_uvss):
+            # Progress may have been copied from ignored verses
+            self.refresh_verse_counts()
+            refresh_verses_started(self.id, [uvs.first_seen for uvs in reactivated_uvss + new_uvss])
 
         verse_set_chosen.send(sender=verse_set, chosen_by=self.account)
         return out
 
+    def _new_verse_status(self, verse, verse_set, version, added, same_verse):
+        """
+        Returns a new unsaved UserVerseStatus for a Verse or ComboVerse,
+        copying progress from same_verse if not None. Bulk version of
+        create_verse_status.
+        """
+        parsed_ref = parse_validated_localized_reference(version.language_code, verse.localized_reference)
+        uvs = UserVerseStatus(
+            for_identity=self,
+            verse_set=verse_set,
+            localized_reference=verse.localized_reference,
+            version=version,
+            text_order=verse.gapless_bible_verse_number,
+            added=added,
+            internal_reference_list=[r.canonical_form() for r in parsed_ref.to_internal().to_list()],
+        )
+        if same_verse is not None:
+            # Use existing data - see create_verse_status
+            uvs.memory_stage = same_verse.memory_stage
+            uvs.strength = same_verse.strength
+            if not same_verse.ignored:
+                uvs.added = same_verse.added
+            uvs.first_seen = same_verse.first_seen
+            uvs.last_tested = same_verse.last_tested
+            uvs.next_test_due = same_verse.next_test_due
+            uvs.early_review_requested = same_verse.early_review_requested
+        return uvs
+
     def add_verse_choice(self, localized_reference: str, version: TextVersion = None):
         if version is None:
             version = self.default_bible_version
@@ -625,6 +833,8 @@ class Identity(models.Model):
         # Some might be set to 'ignored'. Need to fix that.
         if any(uvs.ignored for uvs in existing_uvss):
             base_uvs_query.update(ignored=False)
+            self.refresh_verse_counts()
+            refresh_verses_started(self.id, [uvs.first_seen for uvs in existing_uvss if uvs.ignored])
 
         qapairs = catechism.qapairs.all().order_by("order")
 
@@ -656,16 +866,110 @@ class Identity(models.Model):
         """
         # We keep this separate from award_action_points because it needs
         # different info, and it is easier to test with its current API.
+        # See also `complete_verse_action`.
+        signals = []
+        with transaction.atomic():
+            verse_statuses = self._get_verse_statuses_for_update(
+                self.verse_statuses.filter(localized_reference=localized_reference, version__slug=version_slug)
+            )
+            if len(verse_statuses) == 0:
+                # Shouldn't be possible via UI. The client must be trying to record
+                # actions against verses they have never selected.
+                return None
+            action_change = self._record_verse_action(verse_statuses, stage_type, accuracy, timezone.now(), signals)
+        send_signals(signals)
+        return action_change
+
+    def complete_verse_action(self, uvs_id: int, stage_type: StageType, accuracy: float = None):
+        """
+        Records an action against a UserVerseStatus and awards points for it,
+        returning a tuple (ActionChange, list of new ActionLogs), or None if the
+        UserVerseStatus doesn't exist.
 
-        s = self.verse_statuses.filter(
-            localized_reference=localized_reference, version__slug=version_slug
-        ).select_related("version")
+        This is equivalent to `record_verse_action` followed by
+        `award_action_points`, but it needs fewer queries, and all changes
+        are saved in a single transaction.
+        """
+        signals = []
+        with transaction.atomic():
+            result = self._complete_verse_action(uvs_id, stage_type, accuracy, timezone.now(), signals)
+        send_signals(signals)
+        return result
 
-        if len(s) == 0:
-            # Shouldn't be possible via UI. The client must be trying to record
-            # actions against verses they have never selected.
+    def complete_verse_actions(self, actions):
+        """
+        Records a list of actions, as for `complete_verse_action`, in order and
+        in a single transaction. `actions` is a list of (uvs_id, stage_type,
+        accuracy, time of action). Returns a list of results as for
+        `complete_verse_action`.
+
+        Times of actions are used only for the memory model (`last_tested` and
+        `next_test_due`), and are adjusted to be in order, in the past, and not
+        before MAX_OFFLINE_ACTION_AGE ago. Everything else, including
+        `first_seen` and the summary data that depends on it, uses the current
+        time, so that it is recorded in order.
+        """
+        signals = []
+        results = []
+        now = timezone.now()
+        previous_action_at = now - MAX_OFFLINE_ACTION_AGE
+        with transaction.atomic():
+            for uvs_id, stage_type, accuracy, action_at in actions:
+                action_at = min(max(action_at, previous_action_at), now)
+                results.append(
+                    self._complete_verse_action(uvs_id, stage_type, accuracy, now, signals, tested_at=action_at)
+                )
+                previous_action_at = action_at
+        send_signals(signals)
+        return results
+
+    def _complete_verse_action(self, uvs_id, stage_type, accuracy, now, signals, tested_at=None):
+        # The UVS and any others for the same verse, in one query
+        verse_statuses = self._get_verse_statuses_for_update(
+            self.verse_statuses.filter(
+                models.Exists(
+                    UserVerseStatus.objects.filter(
+                        id=uvs_id,
+                        for_identity=self,
+                        localized_reference=models.OuterRef("localized_reference"),
+                        version=models.OuterRef("version"),
+                    )
+                )
+            )
+        )
+        uvs = next((uvs for uvs in verse_statuses if uvs.id == uvs_id), None)
+        if uvs is None:
             return None
-
+        old_memory_stage = uvs.memory_stage
+        action_change = self._record_verse_action(
+            verse_statuses, stage_type, accuracy, now, signals, tested_at=tested_at
+        )
+        if self.account_id is None:
+            return action_change, []
+        action_logs = self.account._award_action_points(
+            uvs.localized_reference,
+            uvs.version.language_code,
+            uvs.scoring_text,
+            old_memory_stage,
+            action_change,
+            stage_type,
+            accuracy,
+            signals,
+        )
+        return action_change, action_logs
+
+    def _get_verse_statuses_for_update(self, queryset):
+        # Locking means concurrent actions on the same verse are recorded
+        # correctly, including stats that depend on `first_seen` changing.
+        return list(queryset.select_related("version").select_for_update(of=("self",)).order_by("id"))
+
+    def _record_verse_action(self, verse_statuses, stage_type, accuracy, now, signals, tested_at=None):
+        # Updates all the UserVerseStatuses for a verse, which are already
+        # locked, with one UPDATE query. Signals to be sent are appended to
+        # `signals`. `tested_at`, if given, is the time the test was actually
+        # done (for actions recorded offline), and is used for the memory model
+        # only. `now` must be the current time, so that `first_seen` and the
+        # summary data that depends on it are recorded in order.
         mem_stage = {
             StageType.READ: MemoryStage.SEEN,
             StageType.TEST: MemoryStage.TESTED,
@@ -673,37 +977,140 @@ class Identity(models.Model):
 
         # It's possible that they have already been tested, so don't move them
         # down to MemoryStage.SEEN
-        s.filter(memory_stage__lt=mem_stage).update(memory_stage=mem_stage)
-
-        now = timezone.now()
+        updates = dict(memory_stage=Greatest(models.F("memory_stage"), mem_stage))
+        s0 = verse_statuses[0]  # Any should do, they should be all the same
         if mem_stage == MemoryStage.TESTED:
             assert accuracy is not None
-            s0 = s[0]  # Any should do, they should be all the same
 
             # Learn.elm calculateNextTestDue uses the same logic as here to
             # indicate when a verse will be next seen. Changes should be synced.
             old_strength = s0.strength
+            if tested_at is None:
+                tested_at = now
             if s0.last_tested is None:
                 time_elapsed = None
             else:
-                time_elapsed = (now - s0.last_tested).total_seconds()
+                # `tested_at` can be earlier for actions recorded offline
+                tested_at = max(tested_at, s0.last_tested)
+                time_elapsed = (tested_at - s0.last_tested).total_seconds()
             new_strength = memorymodel.strength_estimate(old_strength, accuracy, time_elapsed)
-            next_due = now + timedelta(seconds=memorymodel.next_test_due_after(new_strength))
-            s.update(strength=new_strength, last_tested=now, next_test_due=next_due, early_review_requested=False)
-
+            next_due = tested_at + timedelta(seconds=memorymodel.next_test_due_after(new_strength))
+            updates.update(
+                strength=new_strength, last_tested=tested_at, next_test_due=next_due, early_review_requested=False
+            )
+            action_change = ActionChange(old_strength=old_strength, new_strength=new_strength)
             # Sometimes we get to here with 'first_seen' still null,
             # so we fix it to keep our data making sense.
-            s.filter(strength__gt=0, first_seen__isnull=True).update(first_seen=now)
+            sets_first_seen = new_strength > 0
+        else:
+            action_change = ActionChange()
+            sets_first_seen = True
+
+        newly_started = []
+        if sets_first_seen:
+            newly_started = [uvs for uvs in verse_statuses if uvs.first_seen is None]
+            updates["first_seen"] = Coalesce(
+                models.F("first_seen"), models.Value(now, output_field=models.DateTimeField())
+            )
+        UserVerseStatus.objects.filter(id__in=[uvs.id for uvs in verse_statuses]).update(**updates)
+        if newly_started:
+            self.record_verses_started(newly_started, now)
+        if mem_stage == MemoryStage.TESTED:
+            self._update_verse_counts(verse_statuses, old_strength, new_strength)
 
-            verse_tested.send(sender=self, verse=s0)
+        if mem_stage == MemoryStage.TESTED:
+            signals.append((verse_tested, self, dict(verse=s0)))
             if s0.version.is_catechism and s0.text_order == 1 and old_strength == 0.0 and self.account_id is not None:
-                catechism_started.send(self.account, catechism=s0.version)
+                signals.append((catechism_started, self.account, dict(catechism=s0.version)))
 
-            return ActionChange(old_strength=old_strength, new_strength=new_strength)
+        return action_change
 
-        if mem_stage == MemoryStage.SEEN:
-            s.filter(first_seen__isnull=True).update(first_seen=now)
-            return ActionChange()
+    def _update_verse_counts(self, verse_statuses, old_strength, new_strength):
+        """
+        Updates VerseCounts for UserVerseStatuses being tested, which are
+        already locked and have the old values.
+        """
+        active = [uvs for uvs in verse_statuses if not uvs.ignored]
+        if not active:
+            return
+        started = all(uvs.memory_stage < MemoryStage.TESTED for uvs in active)
+        was_finished = not started and old_strength >= memorymodel.MM.LEARNED
+        is_finished = new_strength >= memorymodel.MM.LEARNED
+        if not started and was_finished == is_finished:
+            return
+
+        # Combo and merged verses count for each verse in them, and we only
+        # count each verse once, so we have to see which verses are already
+        # covered by other UserVerseStatuses.
+        s0 = active[0]
+        refs = set(s0.internal_reference_list)
+        started_refs = set()
+        finished_refs = set()
+        for other_refs, other_strength in (
+            self.verse_statuses.filter(
+                version_id=s0.version_id,
+                ignored=False,
+                memory_stage__gte=MemoryStage.TESTED,
+                internal_reference_list__overlap=list(refs),
+            )
+            .exclude(id__in=[uvs.id for uvs in verse_statuses])
+            .values_list("internal_reference_list", "strength")
+        ):
+            started_refs.update(other_refs)
+            if other_strength >= memorymodel.MM.LEARNED:
+                finished_refs.update(other_refs)
+
+        started_change = len(refs - started_refs) if started else 0
+        finished_change = (is_finished - was_finished) * len(refs - finished_refs)
+        if started_change == 0 and finished_change == 0:
+            return
+        updated = VerseCounts.objects.filter(identity=self).update(
+            verses_started=models.F("verses_started") + started_change,
+            verses_finished=models.F("verses_finished") + finished_change,
+        )
+        if not updated:
+            self.refresh_verse_counts()
+
+    def refresh_verse_counts(self):
+        """
+        Recalculates VerseCounts from UserVerseStatus. This is needed after
+        changes that are not handled incrementally, like cancelling learning.
+        """
+        from scores.models import get_verses_finished_count, get_verses_started_counts
+
+        counts, _ = VerseCounts.objects.update_or_create(
+            identity=self,
+            defaults=dict(
+                verses_started=get_verses_started_counts([self.id])[self.id],
+                verses_finished=get_verses_finished_count(self.id),
+            ),
+        )
+        return counts
+
+    def get_verse_counts(self):
+        try:
+            return VerseCounts.objects.get(identity=self)
+        except VerseCounts.DoesNotExist:
+            return self.refresh_verse_counts()
+
+    def record_verses_started(self, verse_statuses, now):
+        """
+        Updates summary data for UserVerseStatuses having `first_seen` set to `now`
+        """
+        record_verses_started(self.id, verse_statuses, now)
+        self.record_learning_day(now)
+
+    def record_learning_day(self, now):
+        """
+        Updates LearningStreak for verses being started at `now`
+        """
+        day = learning_streak_day(now)
+        with transaction.atomic():
+            streak, created = LearningStreak.objects.select_for_update().get_or_create(
+                identity=self, defaults=dict(current_start=day, last_active=day, longest=1)
+            )
+            if not created and streak.add_day(day):
+                streak.save()
 
     def award_action_points(
         self, localized_reference, language_code, text, old_memory_stage, action_change, action_stage, accuracy
@@ -715,58 +1122,23 @@ class Identity(models.Model):
             localized_reference, language_code, text, old_memory_stage, action_change, action_stage, accuracy
         )
 
-    def get_verse_statuses_bulk(self, ids: list[int]) -> dict[int, UserVerseStatus]:
+    def get_verse_statuses_bulk(self, ids: list[int], prefetched=None) -> dict[int, UserVerseStatus]:
         # ids is a list of UserVerseStatus.id values
         # Returns a dictionary of {uvs.id: uvs}
         # The UVS objects have 'version', 'verse_set',
         # 'text', 'question', 'answer', 'prompt_list' attributes retrieved efficiently,
-        # as appropriate
+        # as appropriate.
+        # prefetched is an optional callable that adds these attributes from a
+        # cache (see learnscripture.prefetch), returning the UVS objects it
+        # couldn't find.
 
         retval = {
             uvs.id: uvs for uvs in (self.verse_statuses.filter(id__in=ids).select_related("version", "verse_set"))
         }
-
-        # We need to get 'text' efficiently too. Group into versions:
-        by_version: dict[int, list[UserVerseStatus]] = {}
-        for uvs in retval.values():
-            by_version.setdefault(uvs.version_id, []).append(uvs)
-
-        # Get the texts/QAPairs in bulk
-        texts = {}
-        qapairs = {}
-        suggestion_d: dict[tuple[int, str], list[set[str]]] = {}
-        for version_id, uvs_list in by_version.items():
-            version = uvs_list[0].version
-            refs = [uvs.localized_reference for uvs in uvs_list]
-            for ref, text in version.get_text_by_localized_reference_bulk(refs).items():
-                # Bibles only here
-                texts[version_id, ref] = text
-            for ref, qapair in version.get_qapairs_by_localized_reference_bulk(refs).items():
-                # catechisms only here
-                qapairs[version_id, ref] = qapair
-            for ref, suggestions in version.get_suggestions_by_localized_reference_bulk(refs).items():
-                # Bibles and catechsims here
-                suggestion_d[version_id, ref] = suggestions
-
-        # Assign texts back to uvs:
-        for uvs in retval.values():
-            text = texts.get((uvs.version_id, uvs.localized_reference), None)
-            if text is not None:
-                # Bible
-                uvs.text = text
-                uvs.scoring_text = text
-                uvs.title_text = uvs.localized_reference
-
-            qapair = qapairs.get((uvs.version_id, uvs.localized_reference), None)
-            if qapair is not None:
-                # Catechism
-                question, answer = qapair.question, qapair.answer
-                uvs.scoring_text = answer
-                uvs.title_text = uvs.localized_reference + ". " + question
-            uvs.prompt_list = create_prompt_list(
-                uvs.suggestion_text, suggestion_d.get((uvs.version_id, uvs.localized_reference), [])
-            )
-
+        uvs_list = list(retval.values())
+        if prefetched is not None:
+            uvs_list = prefetched(uvs_list)
+        add_verse_status_texts(uvs_list)
         return retval
 
     def create_verse_status(self, localized_reference, verse_set, version):
@@ -828,6 +1200,10 @@ class Identity(models.Model):
 
         if dirty:
             uvs.save()
+            if uvs.memory_stage >= MemoryStage.TESTED:
+                # Progress may have been copied from an ignored verse
+                self.refresh_verse_counts()
+            refresh_verses_started(self.id, [uvs.first_seen])
 
         return uvs
 
@@ -840,7 +1216,10 @@ class Identity(models.Model):
         # Not used for passages verse sets.
         qs = self.verse_statuses.filter(localized_reference__in=localized_references, version__slug=version_slug)
         qs = qs.exclude(verse_set__set_type=VerseSetType.PASSAGE)
+        started_times = list(qs.filter(ignored=False).values_list("first_seen", flat=True))
         qs.update(ignored=True)
+        self.refresh_verse_counts()
+        refresh_verses_started(self.id, started_times)
 
     def reset_progress(self, localized_reference, version_slug):
         # Sync with Learn.elm verseStatusResetProgress
@@ -855,6 +1234,7 @@ class Identity(models.Model):
             memory_stage=MemoryStage.ZERO,
             early_review_requested=False,
         )
+        self.refresh_verse_counts()
 
     def review_sooner(self, localized_reference, version_slug, review_after_seconds):
         # Could in theory do this with an update, but it is easier in Python and
@@ -891,15 +1271,29 @@ class Identity(models.Model):
             retval.append(uvs)
         return retval
 
+    def learning_state(self, now=None):
+        """
+        Returns a LearningState snapshot, for calculating dashboard info
+        """
+        from accounts.learningstate import LearningState
+
+        return LearningState.load(self, now=now)
+
     def verse_statuses_started(self):
         return self.verse_statuses.active().filter(strength__gt=0, last_tested__isnull=False)
 
     def verses_started_count(self, started_since=None):
+        if started_since is None:
+            return self.get_verse_counts().verses_started
+
         from scores.models import get_verses_started_counts
 
         return get_verses_started_counts([self.id], started_since=started_since)[self.id]
 
     def verses_finished_count(self, finished_since=None):
+        if finished_since is None:
+            return self.get_verse_counts().verses_finished
+
         from scores.models import get_verses_finished_count
 
         return get_verses_finished_count(self.id, finished_since=finished_since)
@@ -908,14 +1302,7 @@ class Identity(models.Model):
         """
         Returns a list of UserVerseStatuses that need reviewing.
         """
-        qs = (
-            self.verse_statuses.filter(version__text_type=TextType.BIBLE)
-            .needs_reviewing(timezone.now())
-            # Don't include passages - we do those separately:
-            .exclude(verse_set__set_type=VerseSetType.PASSAGE)
-            .order_by("next_test_due", "added")
-        )
-        return sorted(self._dedupe_uvs_set(qs), key=uvs_urgency, reverse=True)
+        return self.learning_state().bible_verse_statuses_for_reviewing()
 
     def bible_verse_statuses_for_learning_qs(self):
         qs = (
@@ -945,17 +1332,8 @@ class Identity(models.Model):
         return self._dedupe_uvs_set(qs)
 
     def bible_verse_statuses_for_learning_grouped(self):
-        qs = self.bible_verse_statuses_for_learning_qs()
-        # Group by verse set, and eagerly load verse set, because we want to
-        # group this way in the UI.  Use prefetch_related instead of
-        # select_related because we are likely to have many UserVerseStatus
-        # objects and very few VerseSet objects.
-        qs = qs.order_by("verse_set", "added", "id").prefetch_related("verse_set")
-
-        # We don't fully dedupe, because we want to distinguish
-        # between UVSes with verse_set == None and verse_set != None
-        uvs_list = self._dedupe_uvs_set_distinguishing_verse_set(qs)
-        return [(a, list(b)) for a, b in itertools.groupby(uvs_list, lambda uvs: uvs.verse_set)]
+        # Grouped by verse set, because we want to group this way in the UI.
+        return self.learning_state().bible_verse_statuses_for_learning_grouped()
 
     def clear_bible_learning_queue(self, verse_set_id):
         qs = self.bible_verse_statuses_for_learning_qs()
@@ -994,42 +1372,13 @@ class Identity(models.Model):
         """
         Return catechism objects decorated with tested_total and untested_total
         """
-        statuses = self.catechism_qas_for_learning(None).select_related("version")
-
-        # Already have enough info for untested_total
-        catechisms = {}
-        for s in statuses:
-            catechism_id = s.version_id
-            if catechism_id not in catechisms:
-                catechism = s.version
-                catechisms[catechism_id] = catechism
-                catechism.untested_total = 0
-            else:
-                catechism = catechisms[catechism_id]
-            catechism.untested_total += 1
-
-        for c in catechisms.values():
-            c.tested_total = c.qapairs.count() - c.untested_total
-
-        return sorted(catechisms.values(), key=lambda c: c.full_name)
+        return self.learning_state().catechisms_for_learning()
 
     def catechisms_for_reviewing(self):
         """
         Returns catechisms that need reviewing, decorated with needs_reviewing_total
         """
-        statuses = self.catechism_qas_for_reviewing(None).select_related("version")
-        catechisms = {}
-        for s in statuses:
-            catechism_id = s.version_id
-            if catechism_id not in catechisms:
-                catechism = s.version
-                catechisms[catechism_id] = catechism
-                catechism.needs_reviewing_total = 0
-            else:
-                catechism = catechisms[catechism_id]
-            catechism.needs_reviewing_total += 1
-
-        return sorted(catechisms.values(), key=lambda c: c.full_name)
+        return self.learning_state().catechisms_for_reviewing()
 
     def clear_catechism_learning_queue(self, catechism_id):
         self.catechism_qas_for_learning_qs(catechism_id).delete()
@@ -1051,34 +1400,7 @@ class Identity(models.Model):
         Objects are decorated with 'untested_total' and 'tested_total' attributes,
         and sorted according to urgency (unless `extra_stats=False` is passed)
         """
-        statuses = (
-            self.verse_statuses.active()
-            .filter(verse_set__set_type=VerseSetType.PASSAGE, memory_stage__lt=MemoryStage.TESTED)
-            .select_related("verse_set", "version")
-        )
-
-        chosen_verse_sets = {ChosenVerseSet(version=uvs.version, verse_set=uvs.verse_set) for uvs in statuses}
-        if not extra_stats:
-            return list(chosen_verse_sets)
-
-        # Attach all the UVSs to get other stats, including maximum_urgency
-        # which is needed for sorting
-        all_statuses = self.verse_statuses.active().filter(
-            verse_set__set_type=VerseSetType.PASSAGE, verse_set__in=[cvs.verse_set for cvs in chosen_verse_sets]
-        )
-
-        now = timezone.now()
-
-        for cvs in chosen_verse_sets:
-            uvss = [
-                uvs for uvs in all_statuses if uvs.verse_set_id == cvs.verse_set.id and uvs.version_id == cvs.version.id
-            ]
-            cvs.maximum_urgency = max(map(uvs_urgency, uvss)) if uvss else 0
-            cvs.tested_total = len([uvs for uvs in uvss if uvs.is_tested()])
-            cvs.untested_total = len(uvss) - cvs.tested_total
-            cvs.needs_review_total = len([uvs for uvs in uvss if uvs.needs_reviewing(now)])
-
-        return sorted(list(chosen_verse_sets), key=lambda c: (-c.maximum_urgency, c.sort_key))
+        return self.learning_state().passages_for_learning(extra_stats=extra_stats)
 
     def verse_sets_chosen(self):
         """
@@ -1132,91 +1454,14 @@ class Identity(models.Model):
          list of ChosenVerseSet items for passage VerseSets that need learning).
         Both have extra info needed by dashboard.
         """
-        learning_sets = self.passages_for_learning()
-        learning_verse_set_ids = {cvs.id for cvs in learning_sets}
         # We need the 'learning' sets in order to calculate the 'reviewing'
         # sets correctly, because we exclude the former from the latter.
         # We also always use these two return values at the same time.
         # So it makes sense to return them together.
-        statuses = (
-            self.verse_statuses.active().select_related("version").filter(verse_set__set_type=VerseSetType.PASSAGE)
-        )
-
-        # If any of them need reviewing, we want to know about it:
-        statuses_for_review = (
-            statuses.reviewable().needs_reviewing(timezone.now()).select_related("verse_set", "version")
-        )
-
-        # We also want to exclude those which have any verses in the set still
-        # untested, but this is easiest done as a second pass after retrieving.
-
-        # Query 1
-        chosen_verse_sets = {
-            ChosenVerseSet(verse_set=uvs.verse_set, version=uvs.version) for uvs in statuses_for_review
-        }
-
-        # Decorate with various extra things we want to show in dashboard:
-        #  - next_section_verse_count
-        #  - splittable
-        #  - needs_testing_count
-        #  - total_verse_count
-
-        # Remove things that are still in initial learning phase
-        chosen_verse_set_list = [cvs for cvs in chosen_verse_sets if cvs.id not in learning_verse_set_ids]
-
-        # We need the complete list of UVSs for each verse set to get
-        # the rest of the info correct.
-        all_uvss = statuses.filter(verse_set__in=[cvs.verse_set for cvs in chosen_verse_set_list]).order_by(
-            "text_order"
-        )
-        uvss_for_cvs = defaultdict(list)
-        for uvs in all_uvss:
-            uvss_for_cvs[uvs.verse_set_id, uvs.version_id].append(uvs)
-
-        for cvs in chosen_verse_set_list:
-            uvss = uvss_for_cvs[cvs.verse_set.id, cvs.version.id]
-            self._set_needs_testing_override(uvss)
-            next_section = self.get_next_section(uvss, cvs.verse_set, add_buffer=False)
-            cvs.next_section_verse_count = len(next_section)
-
-            cvs.needs_testing_count = 0
-            cvs.group_testing = True
-            cvs.total_verse_count = len(uvss)
-            cvs.maximum_urgency = max(uvs_urgency(uvs) for uvs in uvss) if uvss else 0
-
-            for uvs in uvss:
-                if uvs.needs_testing:
-                    cvs.needs_testing_count += 1
-
-                if uvs.strength <= memorymodel.STRENGTH_FOR_GROUP_TESTING:
-                    cvs.group_testing = False
-
-            cvs.splittable = cvs.verse_set.breaks != "" and cvs.group_testing
-
-        reviewing_sets = sorted(list(chosen_verse_set_list), key=lambda c: (-c.maximum_urgency, c.sort_key))
-        return (reviewing_sets, learning_sets)
+        return self.learning_state().passages_for_reviewing_and_learning()
 
     def next_verse_due(self):
-        exclude_ids = []
-        cvss = self.passages_for_learning(extra_stats=False)
-        if cvss:
-            # We need to exlude verses that are part of passage sets that are
-            # still being learned, because those are pushed back from being
-            # 'reviewed' while the rest of the passage is in initial learning.
-            exclude_ids = list(
-                reduce(
-                    operator.or_,
-                    [self.verse_statuses.filter(verse_set=cvs.verse_set, version=cvs.version) for cvs in cvss],
-                ).values_list("id", flat=True)
-            )
-
-        return (
-            self.verse_statuses.reviewable()
-            .needs_reviewing_in_future(timezone.now())
-            .exclude(id__in=exclude_ids)
-            .order_by("next_test_due")
-            .first()
-        )
+        return self.learning_state().next_verse_due()
 
     def first_overdue_verse(self, now):
         return self.verse_statuses.needs_reviewing(now).order_by("next_test_due").first()
@@ -1332,7 +1577,11 @@ class Identity(models.Model):
         # For passages, the UserVerseStatuses may be already tested.
         # We don't want to lose that info, therefore set to 'ignored',
         # rather than delete() (unlike clear_bible_learning_queue)
-        self.verse_statuses.filter(verse_set=verse_set_id, version_id=version_id, ignored=False).update(ignored=True)
+        qs = self.verse_statuses.filter(verse_set=verse_set_id, version_id=version_id, ignored=False)
+        started_times = list(qs.values_list("first_seen", flat=True))
+        qs.update(ignored=True)
+        self.refresh_verse_counts()
+        refresh_verses_started(self.id, started_times)
 
     def get_action_logs(self, from_datetime, highest_id_seen=0):
         if self.account_id is None:
@@ -1360,26 +1609,55 @@ class Identity(models.Model):
         return self.account.can_edit_verse_set(verse_set)
 
 
-def uvs_urgency(uvs):
-    # Sort key for sorting UserVerseStatus by urgency - higher is more urgent.
-    #
-    # When a verse is first being learned, it is much more likely to go out of
-    # the memory than when it is quite well established. So a verse that was
-    # scheduled for a gap of 2 months, one week over due isn't much, but if it
-    # was scheduled for 1 hour, then 2 days is a lot. So we sort by the fraction
-    # overdue, instead of amount overdue.
-
-    # We have to guess the scheduled gap for this verse based on current verse
-    # and our ideal curve.
-    if uvs.next_test_due is None:
-        return 0
-    old_strength = max(uvs.strength - memorymodel.MM.DELTA_S_IDEAL, 0)
-    gap_length = memorymodel.MM.t(uvs.strength) - memorymodel.MM.t(old_strength)
-    # avoid division by zero:
-    if gap_length <= 1:
-        gap_length = 1
-    amount_overdue = (timezone.now() - uvs.next_test_due).seconds
-    return amount_overdue / gap_length
+def add_verse_status_texts(uvs_list: list[UserVerseStatus]):
+    """
+    Sets 'text', 'scoring_text', 'suggestion_text', 'title_text' and
+    'prompt_list' attributes on UserVerseStatus objects, as appropriate,
+    using bulk queries.
+    """
+    # We need to get 'text' efficiently too. Group into versions:
+    by_version: dict[int, list[UserVerseStatus]] = {}
+    for uvs in uvs_list:
+        by_version.setdefault(uvs.version_id, []).append(uvs)
+
+    # Get the texts/QAPairs in bulk
+    texts = {}
+    qapairs = {}
+    for version_id, version_uvs_list in by_version.items():
+        version = version_uvs_list[0].version
+        refs = [uvs.localized_reference for uvs in version_uvs_list]
+        for ref, text in version.get_text_by_localized_reference_bulk(refs).items():
+            # Bibles only here
+            texts[version_id, ref] = text
+        for ref, qapair in version.get_qapairs_by_localized_reference_bulk(refs).items():
+            # catechisms only here
+            qapairs[version_id, ref] = qapair
+
+    # Assign texts back to uvs:
+    for uvs in uvs_list:
+        text = texts.get((uvs.version_id, uvs.localized_reference), None)
+        if text is not None:
+            # Bible
+            uvs.text = text
+            uvs.scoring_text = text
+            uvs.title_text = uvs.localized_reference
+
+        qapair = qapairs.get((uvs.version_id, uvs.localized_reference), None)
+        if qapair is not None:
+            # Catechism
+            question, answer = qapair.question, qapair.answer
+            uvs.scoring_text = answer
+            uvs.suggestion_text = answer
+            uvs.title_text = uvs.localized_reference + ". " + question
+
+    # Prompt lists, Bibles and catechisms:
+    for version_uvs_list in by_version.values():
+        version = version_uvs_list[0].version
+        prompt_lists = version.get_prompt_lists_by_localized_reference_bulk(
+            {uvs.localized_reference: uvs.suggestion_text for uvs in version_uvs_list}
+        )
+        for uvs in version_uvs_list:
+            uvs.prompt_list = prompt_lists[uvs.localized_reference]
 
 
 class Notice(models.Model):
@@ -1396,6 +1674,107 @@ class Notice(models.Model):
         return f"Notice {self.id} for {self.for_identity}"
 
 
+def learning_streak_day(dt):
+    # Days are UTC days, for consistency with get_verse_started_running_streaks
+    return utc_date(dt)
+
+
+class LearningStreak(models.Model):
+    """
+    Summary of the days on which an identity started learning verses
+    (i.e. UserVerseStatus.first_seen was set), used for ConsistentLearnerAward.
+    This is kept up to date by Identity.record_verse_action, and is the
+    incremental equivalent of get_verse_started_running_streaks.
+    """
+
+    identity = models.OneToOneField(Identity, on_delete=models.CASCADE, related_name="learning_streak")
+    current_start = models.DateField()
+    last_active = models.DateField(db_index=True)
+    longest = models.PositiveIntegerField(default=0)  # in days
+
+    def add_day(self, day):
+        """
+        Adds a day on which a verse was started. Returns True if anything changed.
+        """
+        # Days must be added in order. If `day` is earlier than `last_active`
+        # we can't update incrementally, but this doesn't happen in normal
+        # use since `first_seen` is always set to the current time.
+        if self.last_active is not None and day <= self.last_active:
+            return False
+        if self.last_active is None or day != self.last_active + timedelta(days=1):
+            self.current_start = day
+        self.last_active = day
+        self.longest = max(self.longest, (self.last_active - self.current_start).days + 1)
+        return True
+
+    def __str__(self):
+        return f"LearningStreak for {self.identity}"
+
+
+class VerseCounts(models.Model):
+    """
+    Number of distinct verses started and finished by an identity, as
+    calculated by get_verses_started_counts and get_verses_finished_count,
+    used for milestone events and learning awards. This is kept up to date by
+    Identity.record_verse_action, and recalculated by
+    Identity.refresh_verse_counts for less common changes.
+    """
+
+    identity = models.OneToOneField(Identity, on_delete=models.CASCADE, related_name="verse_counts")
+    verses_started = models.PositiveIntegerField(default=0)
+    verses_finished = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "verse counts"
+
+    def __str__(self):
+        return f"VerseCounts for {self.identity}"
+
+
+def get_learning_streaks(active_since=None):
+    """
+    Returns a dictionary of {account_id: largest learning streak}, for accounts
+    that have started learning verses since `active_since` (a date), or all
+    accounts if `active_since` is None.
+    """
+    qs = LearningStreak.objects.filter(identity__account__isnull=False)
+    if active_since is not None:
+        qs = qs.filter(last_active__gte=active_since)
+    return dict(qs.values_list("identity__account_id", "longest"))
+
+
+def rebuild_learning_streaks(identity_ids=None, batch_size=1000):
+    """
+    Rebuilds LearningStreak from UserVerseStatus.first_seen, for the given
+    identities or all identities.
+    """
+    from django.db.models.functions import TruncDate
+
+    days = (
+        UserVerseStatus.objects.filter(first_seen__isnull=False, ignored=False)
+        .annotate(day=TruncDate("first_seen", tzinfo=dt_timezone.utc))
+        .order_by("for_identity_id", "day")
+        .values_list("for_identity_id", "day")
+        .distinct()
+    )
+    if identity_ids is not None:
+        days = days.filter(for_identity_id__in=identity_ids)
+        LearningStreak.objects.filter(identity_id__in=identity_ids).delete()
+    else:
+        LearningStreak.objects.all().delete()
+
+    streaks = []
+    for identity_id, identity_days in itertools.groupby(days.iterator(), key=operator.itemgetter(0)):
+        streak = LearningStreak(identity_id=identity_id, current_start=None, last_active=None, longest=0)
+        for _, day in identity_days:
+            streak.add_day(day)
+        streaks.append(streak)
+        if len(streaks) >= batch_size:
+            LearningStreak.objects.bulk_create(streaks)
+            streaks = []
+    LearningStreak.objects.bulk_create(streaks)
+
+
 @attr.s(hash=False)
 class ChosenVerseSet:
     verse_set = attr.ib()
@@ -1416,6 +1795,9 @@ class ChosenVerseSet:
 def get_verse_started_running_streaks():
     """
     Returns a dictionary of {account_id: largest learning streak}
+
+    This calculates from scratch using all UserVerseStatus rows. See
+    LearningStreak for an incrementally maintained version.
     """
     from learnscripture.utils.sqla import default_engine
 
@@ -1485,69 +1867,16 @@ class AccountStat:
 
 
 def get_account_stats(start_datetime, end_datetime) -> list[AccountStat]:
-    from learnscripture.utils.sqla import default_engine
-
-    monthly_span_size = 30
-    start_date = start_datetime.date()
-    end_date = end_datetime.date()
-    # We trim the query to be within (query_start, query_end), in multiple
-    # places, to reduce the work load. However, to get the 'active_accounts'
-    # correct at the beginning, we have to adjust the beginning date to further
-    # back than we need
-    query_start = start_date - timedelta(days=monthly_span_size)
-    query_end = end_date + timedelta(days=1)  # end of day = beginning of next day
-
-    sql = sqla_text(
-        """
-    SELECT gs.dte,
-        COALESCE(acc.new_accounts, 0),
-        COALESCE(al1m.active_accounts, 0),
-        COALESCE(al1d.active_accounts, 0),
-        COALESCE(al2.verses_started, 0),
-        COALESCE(al2.verses_tested, 0)
-      FROM generate_series(:query_start, :query_end, interval '1 day') gs(dte)
-      LEFT JOIN LATERAL (
-        SELECT date_trunc('day', date_joined) AS joined_trunc,
-          count(id) AS new_accounts
-        FROM accounts_account WHERE date_joined >= :query_start AND date_joined < :query_end
-        GROUP BY date_trunc('day', date_joined)
-        ) acc ON gs.dte = acc.joined_trunc
-      LEFT JOIN LATERAL (
-         SELECT count(distinct al.account_id) as active_accounts FROM scores_actionlog al
-           WHERE al.created >= gs.dte - (:monthly_span_size - 1) * interval '1 day'
-             AND al.created < gs.dte + interval '1 day'
-      ) al1m ON 1=1
-      LEFT JOIN LATERAL (
-         SELECT count(distinct al.account_id) as active_accounts FROM scores_actionlog al
-           WHERE al.created >= gs.dte
-             AND al.created < gs.dte + interval '1 day'
-      ) al1d ON 1=1
-      LEFT JOIN LATERAL (
-         SELECT
-           date_trunc('day', created) AS created_trunc,
-           count(id) FILTER (WHERE reason = :reason_started) as verses_started,
-           count(id) FILTER (WHERE reason = :reason_tested) as verses_tested
-         FROM scores_actionlog WHERE created >= :query_start AND created < :query_end
-         GROUP BY date_trunc('day', created)
-      ) al2 ON gs.dte = al2.created_trunc
-      ORDER BY gs.dte;
-    """
-    )
-    rows = default_engine.execute(
-        sql,
-        {
-            "query_start": query_start,
-            "query_end": query_end,
-            "monthly_span_size": monthly_span_size,
-            "reason_started": ScoreReason.VERSE_FIRST_TESTED,
-            "reason_tested": ScoreReason.VERSE_REVIEWED,
-        },
-    ).fetchall()
     return [
-        AccountStat(*row)
-        for row in rows
-        # Need to filter out the extra padding at the beginning:
-        if row[0].date() >= start_date
+        AccountStat(
+            date=row["date"],
+            new_accounts=row["new_accounts"],
+            monthly_active_users=row["monthly_active_accounts"],
+            daily_active_users=row["daily_active_accounts"],
+            verses_started=row["verses_first_tested"],
+            verses_tested=row["verses_reviewed"],
+        )
+        for row in get_site_daily_stats(utc_date(start_datetime), utc_date(end_datetime))
     ]
 
 
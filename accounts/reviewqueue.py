@@ -0,0 +1,70 @@
+"""
+Urgency scoring and ordering of verses that need reviewing.
+
+Urgency is the fraction of the scheduled gap by which a verse is overdue (see
+`urgencies` below). Calculating it needs the inverse of the memory model curve,
+so rather than doing that one UserVerseStatus at a time, we do it for a whole
+list with numpy.
+"""
+
+import numpy as np
+from django.utils import timezone
+
+from accounts.memorymodel import MM
+
+
+def urgencies(verse_statuses, now=None) -> np.ndarray:
+    """
+    Returns an array of urgency values for the UserVerseStatus objects passed
+    in, in the same order. Higher is more urgent.
+    """
+    # When a verse is first being learned, it is much more likely to go out of
+    # the memory than when it is quite well established. So a verse that was
+    # scheduled for a gap of 2 months, one week over due isn't much, but if it
+    # was scheduled for 1 hour, then 2 days is a lot. So we sort by the fraction
+    # overdue, instead of amount overdue.
+    if now is None:
+        now = timezone.now()
+    count = len(verse_statuses)
+    strengths = np.fromiter((uvs.strength for uvs in verse_statuses), dtype=float, count=count)
+    due = np.fromiter(
+        (np.nan if uvs.next_test_due is None else uvs.next_test_due.timestamp() for uvs in verse_statuses),
+        dtype=float,
+        count=count,
+    )
+
+    # We have to guess the scheduled gap for this verse based on current verse
+    # and our ideal curve.
+    strengths = np.minimum(strengths, MM.BEST_STRENGTH)
+    old_strengths = np.maximum(strengths - MM.DELTA_S_IDEAL, 0)
+    gap_lengths = _t(strengths) - _t(old_strengths)
+    # avoid division by zero:
+    gap_lengths[gap_lengths <= 1] = 1
+
+    amount_overdue = now.timestamp() - due
+    retval = amount_overdue / gap_lengths
+    # Never tested:
+    retval[np.isnan(due)] = 0
+    return retval
+
+
+def _t(s):
+    # Vectorized version of MemoryModel.t
+    return (-np.log1p(-s) / MM.ALPHA) ** (1.0 / MM.EXPONENT)
+
+
+def rank_by_urgency(verse_statuses, now=None):
+    """
+    Returns the UserVerseStatus objects sorted by urgency, most urgent first.
+    Ties keep their original order.
+    """
+    if not verse_statuses:
+        return []
+    order = np.argsort(-urgencies(verse_statuses, now=now), kind="stable")
+    return [verse_statuses[i] for i in order]
+
+
+def maximum_urgency(verse_statuses, now=None):
+    if not verse_statuses:
+        return 0
+    return float(urgencies(verse_statuses, now=now).max())
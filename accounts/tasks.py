@@ -4,6 +4,13 @@ from learnscripture.ftl_bundles import t
 from learnscripture.utils.tasks import task
 
 
+@task
+def update_friendship_weights(account_ids):
+    from accounts.models import update_friendship_weights
+
+    update_friendship_weights(account_ids)
+
+
 @task
 def notify_account_about_comment(comment_id):
     from comments.models import Comment
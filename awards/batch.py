@@ -0,0 +1,230 @@
+"""
+Batched evaluation of awards.
+
+The tasks in awards.tasks mostly check one account at a time, which is what we
+want when something has just happened to that account. For jobs that check
+every account (e.g. the nightly `create_awards_daily`) that would mean several
+queries per account, so here we instead get the counts for all the accounts
+with one query per award type, and create the newly earned Award rows and their
+ActionLogs in bulk.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import ExtractHour
+from django.utils import timezone
+
+from accounts.models import Account, Identity, LearningStreak, send_signals
+from accounts.signals import points_increase
+from awards.models import AWARD_LOGIC_CLASSES, Award, AwardType, ConsistentLearnerAward, RecruiterAward, SharerAward
+from awards.signals import new_award
+from bibleverses.models import VerseSet, VerseSetType
+from scores.models import ActionLog, ScoreReason
+
+# Number of accounts handled per transaction when creating awards
+BATCH_SIZE = 1000
+
+
+# -- Counts
+#
+# Each of these takes an Account QuerySet and returns a dictionary of
+# {account_id: count} for accounts that have a non-zero count.
+
+
+def get_distinct_hours_counts(accounts):
+    """
+    Number of different hours of the day (0 - 24) in which each account has
+    done something.
+    """
+    return dict(
+        ActionLog.objects.filter(account__in=accounts)
+        .values("account_id")
+        .annotate(hours=Count(ExtractHour("created"), distinct=True))
+        .values_list("account_id", "hours")
+        .order_by()
+    )
+
+
+def get_learning_streak_counts(accounts):
+    """
+    Longest learning streak (in days) for each account.
+    """
+    return dict(
+        LearningStreak.objects.filter(identity__account__in=accounts, longest__gt=0).values_list(
+            "identity__account_id", "longest"
+        )
+    )
+
+
+def get_recruit_counts(accounts):
+    """
+    Number of accounts that each account has referred.
+    """
+    return dict(
+        Identity.objects.filter(account__isnull=False, referred_by__in=accounts)
+        .values("referred_by_id")
+        .annotate(count=Count("id"))
+        .values_list("referred_by_id", "count")
+        .order_by()
+    )
+
+
+def get_public_selection_set_counts(accounts):
+    """
+    Number of public 'selection' verse sets that each account has created.
+    """
+    return dict(
+        VerseSet.objects.public()
+        .filter(created_by__in=accounts, set_type=VerseSetType.SELECTION)
+        .values("created_by_id")
+        .annotate(count=Count("id"))
+        .values_list("created_by_id", "count")
+        .order_by()
+    )
+
+
+# -- Levels
+
+
+def addict_level(hours):
+    return 1 if hours == 24 else 0
+
+
+def consistent_learner_level(streak):
+    return ConsistentLearnerAward(time_period=timedelta(days=streak)).level
+
+
+def recruiter_level(count):
+    return RecruiterAward(count=count).level
+
+
+def sharer_level(count):
+    return SharerAward(count=count).level
+
+
+# Award types that can be evaluated in bulk, with functions for getting the
+# counts and converting a count to a level.
+BATCH_AWARDS = {
+    AwardType.ADDICT: (get_distinct_hours_counts, addict_level),
+    AwardType.CONSISTENT_LEARNER: (get_learning_streak_counts, consistent_learner_level),
+    AwardType.RECRUITER: (get_recruit_counts, recruiter_level),
+    AwardType.SHARER: (get_public_selection_set_counts, sharer_level),
+}
+
+
+def give_awards(award_types, accounts=None):
+    """
+    Evaluates the given award types (from BATCH_AWARDS) for all the accounts in
+    the `accounts` QuerySet (default all active accounts), and gives any awards
+    that have been earned.
+    """
+    if accounts is None:
+        accounts = Account.objects.active()
+    for award_type in award_types:
+        get_counts, get_level = BATCH_AWARDS[award_type]
+        give_award_levels(
+            award_type, {account_id: get_level(count) for account_id, count in get_counts(accounts).items()}
+        )
+
+
+def give_award_levels(award_type, levels):
+    """
+    Gives awards of the given type, for a dictionary of {account_id: level}.
+    This does the same as AwardLogic.give_to for each account, in bulk.
+    """
+    account_ids = sorted(account_id for account_id, level in levels.items() if level > 0)
+    for i in range(0, len(account_ids), BATCH_SIZE):
+        batch_ids = account_ids[i : i + BATCH_SIZE]
+        _give_award_levels(
+            AWARD_LOGIC_CLASSES[award_type], {account_id: levels[account_id] for account_id in batch_ids}
+        )
+
+
+def _give_award_levels(award_class, levels):
+    existing_levels = defaultdict(set)
+    for account_id, level in Award.objects.filter(
+        award_type=award_class.award_type, account_id__in=list(levels)
+    ).values_list("account_id", "level"):
+        existing_levels[account_id].add(level)
+
+    # Create lower levels if they don't exist because a higher level always
+    # implies a lower level. Lower levels go first so notices are in right
+    # order.
+    new_levels = [
+        (account_id, lev)
+        for account_id, level in levels.items()
+        for lev in range(1, level + 1)
+        if lev not in existing_levels[account_id]
+    ]
+    if not new_levels:
+        return
+
+    with transaction.atomic():
+        # Another task may have given some of these since we checked, so only
+        # the rows actually inserted get points and notices.
+        new_awards = _create_awards(award_class.award_type, new_levels)
+        action_logs = [
+            ActionLog(account_id=award.account_id, points=points, reason=ScoreReason.EARNED_AWARD, award=award)
+            for award in new_awards
+            if (points := award_class(level=award.level).points()) > 0
+        ]
+        previous_points = ActionLog.create_for_accounts(action_logs)
+
+    if not new_awards:
+        return
+
+    accounts = Account.objects.select_related("identity").in_bulk(list(levels))
+    points_by_award_id = {action_log.award_id: action_log.points for action_log in action_logs}
+    added_points = defaultdict(int)
+    for action_log in action_logs:
+        added_points[action_log.account_id] += action_log.points
+
+    signals = []
+    for account_id, previous in previous_points.items():
+        signals.append(
+            (
+                points_increase,
+                accounts[account_id],
+                dict(previous_points=previous, points_added=added_points[account_id]),
+            )
+        )
+    for award in new_awards:
+        award.account = accounts[award.account_id]
+        signals.append((new_award, award, dict(points=points_by_award_id.get(award.id, 0))))
+    send_signals(signals)
+
+
+def _create_awards(award_type, new_levels):
+    """
+    Inserts Awards for a list of (account_id, level) tuples, skipping any that
+    already exist, and returns the Award objects that were inserted, in the
+    same order as `new_levels`.
+    """
+    # bulk_create(ignore_conflicts=True) doesn't tell us which rows were
+    # inserted, so we use ON CONFLICT ... RETURNING directly.
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO awards_award (account_id, award_type, level, created)
+            SELECT new.account_id, %(award_type)s, new.level, %(created)s
+            FROM unnest(%(account_ids)s::bigint[], %(levels)s::integer[]) AS new(account_id, level)
+            ON CONFLICT (account_id, award_type, level) DO NOTHING
+            RETURNING id, account_id, level;
+            """,
+            dict(
+                award_type=award_type,
+                created=now,
+                account_ids=[account_id for account_id, level in new_levels],
+                levels=[level for account_id, level in new_levels],
+            ),
+        )
+        inserted = {(account_id, level): award_id for award_id, account_id, level in cursor.fetchall()}
+    return [
+        Award(id=inserted[key], account_id=key[0], award_type=award_type, level=key[1], created=now)
+        for key in new_levels
+        if key in inserted
+    ]
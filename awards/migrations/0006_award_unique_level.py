@@ -0,0 +1,34 @@
+# Generated by Django 4.2.27 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("awards", "0005_alter_award_id"),
+        ("scores", "0017_daily_stats"),
+    ]
+
+    operations = [
+        # Remove any duplicate award levels, keeping the first. The points for
+        # duplicates have already been given, so we keep their ActionLogs, but
+        # detach them from the Award being deleted.
+        migrations.RunSQL(
+            """
+            UPDATE scores_actionlog SET award_id = NULL
+            WHERE award_id IN (
+              SELECT a.id FROM awards_award a
+              INNER JOIN awards_award b
+                ON b.account_id = a.account_id AND b.award_type = a.award_type AND b.level = a.level AND b.id < a.id
+            );
+            DELETE FROM awards_award a
+            USING awards_award b
+            WHERE b.account_id = a.account_id AND b.award_type = a.award_type AND b.level = a.level AND b.id < a.id;
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name="award",
+            constraint=models.UniqueConstraint(fields=("account", "award_type", "level"), name="award_unique_level"),
+        ),
+    ]
@@ -459,6 +459,13 @@ class Award(models.Model):
     account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="awards")
     created = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        constraints = [
+            # Needed so that concurrent calls to AwardLogic.give_to and
+            # awards.batch.give_award_levels can't give the same award twice.
+            models.UniqueConstraint(fields=["account", "award_type", "level"], name="award_unique_level"),
+        ]
+
     def __str__(self):
         return t(
             "awards-level-awarded-for-user",
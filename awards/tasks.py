@@ -1,21 +1,23 @@
 from datetime import timedelta
 
-from accounts.models import Account, Identity, get_verse_started_running_streaks
+from django.utils import timezone
+
+from accounts.models import Account, get_learning_streaks, learning_streak_day
+from awards.batch import consistent_learner_level, give_award_levels, give_awards
 from awards.models import (
     AceAward,
-    AddictAward,
-    ConsistentLearnerAward,
+    AwardType,
     MasterAward,
     OrganizerAward,
-    RecruiterAward,
-    SharerAward,
     StudentAward,
     TrendSetterAward,
 )
-from bibleverses.models import VerseSet, VerseSetType
+from bibleverses.models import VerseSet
 from groups.models import combined_membership_count_for_creator
 from learnscripture.utils.tasks import task
-from scores.models import ScoreReason, get_number_of_distinct_hours_for_account_id
+from scores.models import ScoreReason
+
+CONSISTENT_LEARNER_AWARDS_LOOKBACK = timedelta(days=2)
 
 
 @task
@@ -35,9 +37,7 @@ def give_learning_awards(account_id):
 def give_sharer_awards(account_id):
     if account_id is None:
         return
-    account = Account.objects.get(id=account_id)
-    c = account.verse_sets_created.public().filter(set_type=VerseSetType.SELECTION).count()
-    SharerAward(count=c).give_to(account)
+    give_awards([AwardType.SHARER], Account.objects.filter(id=account_id))
 
 
 @task
@@ -88,21 +88,12 @@ def give_ace_awards(account_id):
 def give_recruiter_award(account_id):
     if account_id is None:
         return
-    account = Account.objects.get(id=account_id)
-
-    count = Identity.objects.filter(account__isnull=False, referred_by=account).count()
-    RecruiterAward(count=count).give_to(account)
+    give_awards([AwardType.RECRUITER], Account.objects.filter(id=account_id))
 
 
 def give_all_addict_awards():
-    for account in Account.objects.active().all():
-        give_addict_award.apply_async([account.id])
-
-
-@task
-def give_addict_award(account_id):
-    if get_number_of_distinct_hours_for_account_id(account_id) == 24:
-        AddictAward().give_to(Account.objects.get(id=account_id))
+    # Accounts that already have the award don't need checking.
+    give_awards([AwardType.ADDICT], Account.objects.active().exclude(awards__award_type=AwardType.ADDICT))
 
 
 @task
@@ -112,12 +103,14 @@ def give_organizer_awards(account_id):
 
 
 def give_all_consistent_learner_awards():
-    min_days = min(ConsistentLearnerAward.DAYS.values())
-    for account_id, streak in get_verse_started_running_streaks().items():
-        if streak >= min_days:
-            give_consistent_learner_award.apply_async([account_id, streak])
-
-
-@task
-def give_consistent_learner_award(account_id, streak):
-    ConsistentLearnerAward(time_period=timedelta(days=streak)).give_to(Account.objects.get(id=account_id))
+    # This runs daily. Streaks only change when accounts start learning
+    # verses, so we only need to look at accounts active since the last run
+    # (with some margin for safety).
+    active_since = learning_streak_day(timezone.now()) - CONSISTENT_LEARNER_AWARDS_LOOKBACK
+    give_award_levels(
+        AwardType.CONSISTENT_LEARNER,
+        {
+            account_id: consistent_learner_level(streak)
+            for account_id, streak in get_learning_streaks(active_since=active_since).items()
+        },
+    )
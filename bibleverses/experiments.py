@@ -0,0 +1,51 @@
+# Some proper tests are in learnscripture.tests
+# These are just for experimental work at the moment and aren't run automatically.
+
+import time
+
+from .books import get_bible_book_name, get_bible_books
+from .constants import BIBLE_BOOK_INFO
+from .languages import LANG
+from .parsing import _parsed_reference_cache, bible_reference_parser_for_lang, parse_validated_localized_reference
+
+
+def all_references(language_code):
+    """
+    Returns a list of all single verse references in the Bible, plus whole
+    chapter and whole book references.
+    """
+    retval = []
+    for book_number, book in enumerate(get_bible_books(language_code)):
+        book_info = BIBLE_BOOK_INFO[get_bible_book_name(LANG.INTERNAL, book_number)]
+        retval.append(book)
+        for chapter, verse_count in book_info.verse_counts.items():
+            retval.append(f"{book} {chapter}")
+            retval.extend(f"{book} {chapter}:{verse}" for verse in range(1, verse_count + 1))
+    return retval
+
+
+def test_reference_parsing_speed(language_code=LANG.EN):
+    refs = all_references(language_code)
+    parser = bible_reference_parser_for_lang(language_code, True)
+
+    start = time.perf_counter()
+    parsy_results = [parser.parse(ref) for ref in refs]
+    parsy_time = time.perf_counter() - start
+
+    _parsed_reference_cache.clear()
+    start = time.perf_counter()
+    uncached_results = [parse_validated_localized_reference(language_code, ref) for ref in refs]
+    uncached_time = time.perf_counter() - start
+
+    # Most recent items are in the cache now, parse them again:
+    recent_refs = refs[-_parsed_reference_cache.maxsize :]
+    start = time.perf_counter()
+    cached_results = [parse_validated_localized_reference(language_code, ref) for ref in recent_refs]
+    cached_time = time.perf_counter() - start
+
+    assert uncached_results == parsy_results
+    assert cached_results == parsy_results[-len(recent_refs) :]
+    print(f"{len(refs)} references")
+    print(f"parsy:              {parsy_time / len(refs) * 1e6:.2f} µs per reference")
+    print(f"fast path:          {uncached_time / len(refs) * 1e6:.2f} µs per reference")
+    print(f"fast path (cached): {cached_time / len(recent_refs) * 1e6:.2f} µs per reference")
@@ -1,10 +1,14 @@
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from bibleverses.models import QAPair, Verse
-from bibleverses.signals import verse_set_chosen
+from bibleverses.models import QAPair, TextVersion, Verse
+from bibleverses.signals import verse_set_chosen, verse_texts_fetched
 from bibleverses.tasks import fix_item_suggestions, verse_set_increase_popularity
+from bibleverses.verseindex import invalidate_verse_index
+
+# Fields that are not used in the verse index
+VERSE_TEXT_FIELDS = {"text_saved", "text_tsv", "text_fetched_at"}
 
 
 def should_update_word_suggestions_on_save():
@@ -58,6 +62,38 @@ def verse_saved_update_text_search(sender, **kwargs):
         verse.version.update_text_search(Verse.objects.filter(id=verse.id))
 
 
+@receiver(verse_texts_fetched)
+def verse_texts_fetched_receiver(sender, **kwargs):
+    # Equivalent of the post_save handlers above, in bulk
+    from bibleverses.suggestions.modelapi import items_needing_suggestions_update
+
+    version = sender
+    verses = kwargs["verses"]
+    if should_update_word_suggestions_on_save():
+        for verse in items_needing_suggestions_update(version, verses):
+            fix_item_suggestions.apply_async([version.slug, verse.localized_reference, verse.text_saved])
+
+    if should_update_text_search_on_save() and version.db_based_searching:
+        version.update_text_search(Verse.objects.filter(id__in=[verse.id for verse in verses]))
+
+
+@receiver(post_save, sender=Verse)
+@receiver(post_delete, sender=Verse)
+def verse_changed_invalidate_verse_index(sender, **kwargs):
+    if getattr(settings, "LOADING_VERSES", False):
+        # load_text does it once at the end
+        return
+    update_fields = kwargs.get("update_fields", None)
+    if update_fields is not None and set(update_fields) <= VERSE_TEXT_FIELDS:
+        return
+    invalidate_verse_index(kwargs["instance"].version_id)
+
+
+@receiver(post_save, sender=TextVersion)
+def text_version_saved_invalidate_verse_index(sender, **kwargs):
+    invalidate_verse_index(kwargs["instance"].id)
+
+
 @receiver(post_save, sender=QAPair)
 def qapair_saved(sender, **kwargs):
     qapair = kwargs["instance"]
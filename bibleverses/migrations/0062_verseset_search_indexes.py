@@ -0,0 +1,45 @@
+# Generated by Django 4.2.27 on 2026-10-18 15:10
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bibleverses", "0061_remove_wordsuggestiondata_language_code"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name="verseset",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("name"), name="gin_trgm_ops"
+                ),
+                name="verseset_name_trgm",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="verseset",
+            index=models.Index(
+                condition=models.Q(("passage_id", ""), _negated=True),
+                fields=["passage_id"],
+                name="verseset_passage_id",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="verseset",
+            index=models.Index(fields=["-popularity", "-id"], name="verseset_popularity"),
+        ),
+        migrations.AddIndex(
+            model_name="verseset",
+            index=models.Index(fields=["-date_added", "-id"], name="verseset_date_added"),
+        ),
+        migrations.AddIndex(
+            model_name="versechoice",
+            index=models.Index(fields=["internal_reference"], name="versechoice_internal_reference"),
+        ),
+    ]
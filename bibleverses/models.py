@@ -1,16 +1,14 @@
-import dataclasses
 import logging
 import math
-import operator
-import random
 from collections import defaultdict
-from functools import reduce
 
 from autoslug import AutoSlugField
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
 from django.db.models import F, Func, Q, Value
 from django.db.models.constraints import UniqueConstraint
+from django.db.models.functions import Upper
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.functional import cached_property
@@ -33,8 +31,12 @@ from .parsing import (
     parse_validated_internal_reference,
     parse_validated_localized_reference,
 )
-from .services import get_fetch_service, get_search_service
+from .services import get_external_search_service, get_fetch_service, get_search_service
+from .signals import verse_texts_fetched
+from .suggestions.utils.numbers import choose_suggestions
 from .textutils import split_into_words
+from .verseindex import get_verse_index
+from .versesetsearch import search_filter
 
 logger = logging.getLogger(__name__)
 
@@ -191,7 +193,7 @@ class TextVersion(models.Model):
 
     def get_localized_reference_list(self, localized_reference):
         if self.is_bible:
-            return [v.localized_reference for v in self.get_verse_list(localized_reference)]
+            return fetch_localized_reference_list(self, self.language_code, localized_reference)
         else:
             return [localized_reference]
 
@@ -213,6 +215,16 @@ class TextVersion(models.Model):
 
         return get_word_suggestions_by_localized_reference_bulk(self, localized_reference_list)
 
+    def get_prompt_lists_by_localized_reference_bulk(self, text_dict):
+        """
+        Given a dictionary of {localized_reference: text}, returns a dictionary
+        of {localized_reference: prompt_list}, where 'prompt_list' is as returned by
+        `create_prompt_list`
+        """
+        from .suggestions.serving import get_prompt_lists_bulk
+
+        return get_prompt_lists_bulk(self, text_dict)
+
     def get_learners(self):
         # This doesn't have to be 100% accurate, so do an easier query - find
         # people who have learned the first item
@@ -236,7 +248,9 @@ class TextVersion(models.Model):
 
     @property
     def db_based_searching(self):
-        return get_search_service(self.slug) is None
+        # We keep the DB search data up to date even if there is a local
+        # search index (see textsearch.py), so it can be used as a fallback.
+        return get_external_search_service(self.slug) is None
 
     def update_text_search(self, verses_qs):
         verses_qs.update(
@@ -460,39 +474,9 @@ class WordSuggestionData(models.Model):
     suggestions = models.JSONField(default=list)
 
     def get_suggestions(self) -> list[set[str]]:
-        if not self.suggestions:
-            return []
         # We could do some of this client side, but we save on bandwidth by
         # returning only a selection of the words, not all the data.
-
-        retval = []
-
-        for word_suggestions in self.suggestions:
-            # Assign a frequency between 0.5 and 1.0 for each word
-            # (lower than 0.5 means they end up not being seen at all
-            #  in practice)
-            pairs = [(word, 1.0 - i * 0.5 / len(word_suggestions)) for i, word in enumerate(word_suggestions)]
-
-            # Make a random selection, weighted according to frequency
-            chosen: set[str] = set()
-            available = pairs[:]
-            while len(chosen) < SUGGESTION_COUNT and len(available) > 0:
-                if len(available) == 1:
-                    # No point doing random
-                    picked = available[0][0]
-                else:
-                    # Weighting:
-                    threshold = random.random()  # 0..1
-                    possible = [word for word, freq in available if freq >= threshold]
-                    if not possible:
-                        continue
-                    # Pick one
-                    picked = random.choice(possible)
-                chosen.add(picked)
-                available = [(word, freq) for word, freq in available if word != picked]
-
-            retval.append(chosen)
-        return retval
+        return [choose_suggestions(word_suggestions, SUGGESTION_COUNT) for word_suggestions in self.suggestions]
 
     class Meta:
         unique_together = [("version_slug", "localized_reference")]
@@ -565,80 +549,8 @@ class VerseSetQuerySet(models.QuerySet):
         return self.filter(public=True)
 
     def search(self, language_codes, query, default_language_code=None):
-        if not query:
-            return self.filter(language_code__in=language_codes) | self.filter(any_language=True)
-
-        result_queries = []
-        # If we are searching multiple languages, but using a verse ref, we will
-        # need to parse the verse ref in the language that matches e.g.
-        # "Yarat 1:1" should parse to 'BOOK0 1:1', and we then search all
-        # VerseSets in all languages that match.
-        parsed_refs = {}
-        for language_code in language_codes:
-            # Does the query look like a Bible reference?
-            try:
-                parsed_ref = parse_unvalidated_localized_reference(
-                    language_code, query, allow_whole_book=False, allow_whole_chapter=True
-                )
-            except InvalidVerseReference:
-                # For invalid verse references, it looks like a verse ref,
-                # but refers to something that doesn't exist e.g. "Gen 73:1".
-                # It should get no results.
-                continue
-            if parsed_ref is not None:
-                parsed_refs[language_code] = parsed_ref
-
-        if len(parsed_refs) == 0:
-            fallback_parsed_ref = None
-        else:
-            try:
-                fallback_parsed_ref = parsed_refs[default_language_code]
-            except KeyError:
-                # We have potentially multiple parsed references, none of them
-                # in the default language, and potentially all of them referring
-                # to different verses. Can't do much here so just pick one.
-                fallback_parsed_ref = list(parsed_refs.values())[0]
-
-        for language_code in language_codes:
-            initial_verse_sets = self.filter(language_code=language_code) | self.filter(any_language=True)
-            parsed_ref = parsed_refs.get(language_code, fallback_parsed_ref)
-            if parsed_ref is not None:
-                if parsed_ref.start_verse is None:
-                    # To find a whole chapter, look for sets containing first verse.
-                    search_parsed_ref = dataclasses.replace(parsed_ref, start_verse=1)
-                    # But limit to only passage types, otherwise we'll get false
-                    # positives for selection sets that contain other verses
-                    # from that chapter.
-                    result_queries.append(
-                        initial_verse_sets.filter(
-                            set_type=VerseSetType.PASSAGE,
-                            verse_choices__internal_reference=search_parsed_ref.to_internal().canonical_form(),
-                        )
-                    )
-                else:
-                    if parsed_ref.get_start() != parsed_ref.get_end():
-                        # Looks like passage ref:
-                        result_queries.append(
-                            initial_verse_sets.filter(
-                                set_type=VerseSetType.PASSAGE,
-                                passage_id=make_verse_set_passage_id(
-                                    parsed_ref.get_start().to_internal(), parsed_ref.get_end().to_internal()
-                                ),
-                            )
-                        )
-                    else:
-                        result_queries.append(
-                            initial_verse_sets.filter(
-                                set_type__in=[VerseSetType.SELECTION, VerseSetType.PASSAGE],
-                                verse_choices__internal_reference=parsed_ref.to_internal().canonical_form(),
-                            )
-                        )
-            else:
-                result_queries.append(initial_verse_sets.filter(name__icontains=query))
-        if result_queries:
-            return reduce(operator.or_, result_queries)
-        else:
-            return self.none()
+        # See bibleverses.versesetsearch
+        return self.filter(search_filter(language_codes, query, default_language_code=default_language_code))
 
 
 class VerseSetManager(models.Manager.from_queryset(VerseSetQuerySet)):
@@ -688,6 +600,15 @@ class VerseSet(models.Model):
 
     objects = VerseSetManager()
 
+    class Meta:
+        indexes = [
+            # For searching, see bibleverses.versesetsearch
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="verseset_name_trgm"),
+            models.Index(fields=["passage_id"], condition=~Q(passage_id=""), name="verseset_passage_id"),
+            models.Index(fields=["-popularity", "-id"], name="verseset_popularity"),
+            models.Index(fields=["-date_added", "-id"], name="verseset_date_added"),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -852,6 +773,10 @@ class VerseChoice(models.Model):
         unique_together = [
             ("verse_set", "internal_reference"),
         ]
+        indexes = [
+            # For finding sets containing a verse, see bibleverses.versesetsearch
+            models.Index(fields=["internal_reference"], name="versechoice_internal_reference"),
+        ]
         base_manager_name = "objects"
 
     def __str__(self):
@@ -1200,50 +1125,16 @@ def fetch_parsed_reference(version, parsed_ref, max_length=MAX_VERSE_QUERY_SIZE)
         else:
             retval = []
     else:
-        ref_start = parsed_ref.get_start().canonical_form()
-        ref_end = parsed_ref.get_end().canonical_form()
-        # Try to get results in just two queries
-        #
-        # We don't do 'missing=False' filter here, because we want to be
-        # able to do things like 'John 5:3-4' even if 'John 5:4' is
-        # missing in the current version.
-        # We also need to handle merged verses, which are marked as 'missing=True'.
-        # So we just miss out the missing verses later when creating the list.
-        vs = version.verse_set.filter(localized_reference__in=[ref_start, ref_end])
-        try:
-            verse_start = [v for v in vs if v.localized_reference == ref_start][0]
-        except IndexError:
-            raise InvalidVerseReference(f"Can't find  '{ref_start}'")
-        try:
-            verse_end = [v for v in vs if v.localized_reference == ref_end][0]
-        except IndexError:
-            raise InvalidVerseReference(f"Can't find  '{ref_end}'")
-
-        if verse_end.bible_verse_number < verse_start.bible_verse_number:
-            raise InvalidVerseReference(f"{ref_start} and {ref_end} are not in ascending order.")
-
-        items = version.verse_set.filter(
-            bible_verse_number__gte=verse_start.bible_verse_number, bible_verse_number__lte=verse_end.bible_verse_number
-        ).select_related("merged_into")
-        retval = []
-        used_ids = set()
-        # Handle merged verses
-        for item in items:
-            if item.merged_into is not None:
-                real = item.merged_into
-            elif item.missing:
-                real = None
-            else:
-                real = item
-            if real is not None and real.id not in used_ids:
-                retval.append(real)
-                used_ids.add(real.id)
-
-    if len(retval) == 0:
-        raise InvalidVerseReference(t("bibleverses-no-verses-matched-ref", dict(ref=parsed_ref.canonical_form())))
+        # Ranges are resolved using the in-memory index, so we only need one
+        # query to get the verses.
+        index = get_verse_index(version)
+        verse_ids = index.get_ids(_get_range_positions(index, parsed_ref))
+        # Fetch one too many so that the check below works.
+        verse_ids = verse_ids[: max_length + 1]
+        verses_by_id = version.verse_set.in_bulk(verse_ids)
+        retval = [verses_by_id[verse_id] for verse_id in verse_ids]
 
-    if len(retval) > max_length:
-        raise TooManyVerses(t("bibleverses-too-many-verses", dict(allowed=max_length)))
+    _check_verse_list_length(parsed_ref, retval, max_length)
 
     # Ensure back references to version are set, so we don't need extra DB lookup
     for v in retval:
@@ -1254,6 +1145,33 @@ def fetch_parsed_reference(version, parsed_ref, max_length=MAX_VERSE_QUERY_SIZE)
     return retval
 
 
+def fetch_localized_reference_list(version, language_code, localized_reference, max_length=MAX_VERSE_QUERY_SIZE):
+    """
+    Returns the list of localized references of the verses for the given
+    localized reference, like fetch_localized_reference, but without needing
+    to fetch verses for verse ranges.
+    """
+    parsed_ref = parse_validated_localized_reference(language_code, localized_reference)
+    if parsed_ref.is_whole_chapter() or parsed_ref.is_single_verse():
+        return [v.localized_reference for v in fetch_parsed_reference(version, parsed_ref, max_length=max_length)]
+    index = get_verse_index(version)
+    retval = index.get_localized_references(_get_range_positions(index, parsed_ref))
+    _check_verse_list_length(parsed_ref, retval, max_length)
+    return retval
+
+
+def _get_range_positions(index, parsed_ref):
+    return index.get_positions_for_range(parsed_ref.get_start().canonical_form(), parsed_ref.get_end().canonical_form())
+
+
+def _check_verse_list_length(parsed_ref, verse_list, max_length):
+    if len(verse_list) == 0:
+        raise InvalidVerseReference(t("bibleverses-no-verses-matched-ref", dict(ref=parsed_ref.canonical_form())))
+
+    if len(verse_list) > max_length:
+        raise TooManyVerses(t("bibleverses-too-many-verses", dict(allowed=max_length)))
+
+
 def fetch_localized_reference_bulk(version, language_code, localized_reference_list, fetch_text=True):
     """
     Returns a dictionary {ref: Verse or ComboVerse} for refs matching the requested references.
@@ -1340,11 +1258,17 @@ def ensure_text(verses):
         if fetcher is None:
             continue  # no service for retrieving data
 
+        fetched_at = timezone.now()
+        fetched_verses = []
         for ref, text in fetcher(missing_refs):
             v = verse_dict[version_slug, ref]
             v.text_saved = text
-            v.text_fetched_at = timezone.now()
-            v.save()
+            v.text_fetched_at = fetched_at
+            fetched_verses.append(v)
+        if fetched_verses:
+            Verse.objects.bulk_update(fetched_verses, ["text_saved", "text_fetched_at"])
+            # bulk_update doesn't send post_save, so send our own signal
+            verse_texts_fetched.send(sender=fetched_verses[0].version, verses=fetched_verses)
 
     # Check that we fixed everything
     for v in verses_to_check:
@@ -1388,11 +1312,11 @@ def is_continuous_set(verse_list):
             return False
 
     try:
-        combined = fetch_localized_reference(version, version.language_code, combined_ref)
+        combined_refs = fetch_localized_reference_list(version, version.language_code, combined_ref)
     except TooManyVerses:
         return False  # Can't do anything else.
 
-    return [v.localized_reference for v in verse_list] == [v.localized_reference for v in combined]
+    return [v.localized_reference for v in verse_list] == combined_refs
 
 
 def get_passage_sections(verse_list, breaks):
@@ -1476,11 +1400,13 @@ def quick_find(
         # Do a search:
         searcher = get_search_service(version.slug)
         if searcher:
-            return searcher(version, search_query, page, page_size)
-
-        results = list(Verse.objects.text_search(search_query, version, limit=page_size + 1, offset=page * page_size))
-        more_results = len(results) > page_size
-        returned_results = [VerseSearchResult(r.localized_reference, [r]) for r in results[0:page_size]]
+            returned_results, more_results = searcher(version, search_query, page, page_size)
+        else:
+            results = list(
+                Verse.objects.text_search(search_query, version, limit=page_size + 1, offset=page * page_size)
+            )
+            more_results = len(results) > page_size
+            returned_results = [VerseSearchResult(r.localized_reference, [r]) for r in results[0:page_size]]
     if identity is not None:
         # This doesn't handle "partial learning" situations well, but its good enough
         relevant_uvss = {
@@ -1,3 +1,4 @@
+import copy
 import dataclasses
 import re
 from dataclasses import dataclass
@@ -5,7 +6,7 @@ from dataclasses import dataclass
 from parsy import ParseError, Parser, char_from, generate, regex, string, string_from, whitespace
 
 from learnscripture.ftl_bundles import t
-from learnscripture.utils.cache import memoize_function
+from learnscripture.utils.cache import LRUCache, memoize_function
 
 from .books import (
     get_bible_book_abbreviation_map,
@@ -368,6 +369,73 @@ def bible_reference_parser_for_lang(language_code: str, strict: bool) -> Parser:
         return bible_reference_loose
 
 
+# Fast path for canonical references
+#
+# parse_validated_localized_reference is used a lot on hot paths with
+# references that come from the database, which are always in canonical form.
+# For these we use a precompiled regex that matches exactly the same strings as
+# bible_reference_strict, and cache the results. Anything the regex doesn't
+# match goes to the parsy parser, so that errors are reported in the same way.
+
+
+@memoize_function
+def canonical_reference_regex(language_code: str) -> re.Pattern:
+    # Longest book names first, and no backtracking into the book name once
+    # it is matched (using lookahead plus backreference), to match the
+    # behaviour of string_from in book_strict
+    books = sorted(get_bible_books(language_code), key=len, reverse=True)
+    book = "(?=(?P<book>" + "|".join(re.escape(b) for b in books) + "))(?P=book)"
+    return re.compile(
+        book
+        + r"(?: (?P<start_chapter>[0-9]+)(?::(?P<start_verse>[0-9]+)"
+        + r"(?:[-–](?P<verse_or_chapter>[0-9]+)(?::(?P<end_verse>[0-9]+))?)?)?)?"
+    )
+
+
+def parse_canonical_reference_fast(language_code, localized_reference):
+    """
+    Parse a reference in canonical form, returning a ParsedReference,
+    or None if it doesn't match the canonical reference format.
+    """
+    match = canonical_reference_regex(language_code).fullmatch(localized_reference)
+    if match is None:
+        return None
+    book_name, start_chapter, start_verse, verse_or_chapter, end_verse = match.group(
+        "book", "start_chapter", "start_verse", "verse_or_chapter", "end_verse"
+    )
+    end_chapter = None
+    if end_verse is None:
+        end_verse = verse_or_chapter
+    else:
+        end_chapter = verse_or_chapter
+    return ParsedReference(
+        language_code=language_code,
+        book_name=book_name,
+        start_chapter=None if start_chapter is None else int(start_chapter),
+        start_verse=None if start_verse is None else int(start_verse),
+        end_chapter=None if end_chapter is None else int(end_chapter),
+        end_verse=None if end_verse is None else int(end_verse),
+    )
+
+
+PARSED_REFERENCE_CACHE_SIZE = 10000
+
+_parsed_reference_cache = LRUCache(PARSED_REFERENCE_CACHE_SIZE)
+
+
+def _parse_validated_localized_reference(language_code, localized_reference):
+    # Raises ParseError for failure
+    key = (language_code, localized_reference)
+    parsed_ref = _parsed_reference_cache.get(key)
+    if parsed_ref is None:
+        parsed_ref = parse_canonical_reference_fast(language_code, localized_reference)
+        if parsed_ref is None:
+            parsed_ref = bible_reference_parser_for_lang(language_code, True).parse(localized_reference)
+        _parsed_reference_cache.set(key, parsed_ref)
+    # ParsedReference is mutable, so we don't hand out the cached instance
+    return copy.copy(parsed_ref)
+
+
 def parse_validated_localized_reference(language_code, localized_reference):
     """
     Parse a validated reference, returning a ParsedReference
@@ -378,7 +446,7 @@ def parse_validated_localized_reference(language_code, localized_reference):
     format).
     """
     try:
-        return bible_reference_parser_for_lang(language_code, True).parse(localized_reference)
+        return _parse_validated_localized_reference(language_code, localized_reference)
     except ParseError as e:
         raise InvalidVerseReference(f"Could not parse '{localized_reference}' as bible reference - {str(e)}")
 
@@ -463,8 +531,9 @@ def parse_break_list(breaks):
     Parse a break list, which is a comma separated list of internal references, or raise a ValueError for failure.
     """
     # breaks is a common separated list of internal references, created in create.js
+    if breaks == "":
+        return []
     try:
-        return (bible_reference_parser_for_lang(LANG.INTERNAL, True).sep_by(string(","))).parse(breaks)
-
+        return [_parse_validated_localized_reference(LANG.INTERNAL, b) for b in breaks.split(",")]
     except ParseError:
         raise ValueError(f"'{breaks}' is not a valid list of internal Bible references")
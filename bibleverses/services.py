@@ -6,18 +6,79 @@ Services for retrieving Bible and text data, where necessary.
 
 import logging
 import re
+import threading
 import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from django.db import models
 from pyquery import PyQuery
+from requests.adapters import HTTPAdapter
 
 from learnscripture.utils.iterators import chunks
 
+from .textsearch import local_text_search_available, search_local_index
+
 logger = logging.getLogger(__name__)
 
 
+# ----- HTTP utilities -----
+
+HTTP_TIMEOUT = 30  # seconds
+
+HTTP_POOL_SIZE = 10
+
+_http_session = None
+
+
+def get_http_session():
+    """
+    Returns a requests Session shared by all services, so that connections
+    are pooled and kept alive between requests.
+    """
+    global _http_session
+    if _http_session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _http_session = session
+    return _http_session
+
+
+class RateLimiter:
+    """
+    Limits the rate at which something is done, across threads, by spacing
+    out calls to `wait()` by at least `min_interval` seconds.
+    """
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start_time = max(now, self._next_time)
+            self._next_time = start_time + self.min_interval
+        if start_time > now:
+            time.sleep(start_time - now)
+
+
+def map_concurrently(func, items, max_workers):
+    """
+    Returns the list of results of calling `func` on each of `items`, using
+    up to `max_workers` threads.
+    """
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
 # ----- ESV v2 API service -----
 
 ESV_V2_BASE_URL = "http://www.esvapi.org/v2/rest/"
@@ -27,64 +88,82 @@ ESV_V2_BASE_URL = "http://www.esvapi.org/v2/rest/"
 # excessively long query string that is generated. We play safe here:
 ESV_V2_BATCH_SIZE = 80
 
+# Don't hammer the API. We make a limited number of requests at once, and
+# limit the rate at which requests are started.
+ESV_V2_MAX_CONCURRENT_REQUESTS = 3
+ESV_V2_MIN_REQUEST_INTERVAL = 0.5  # seconds
+
+esv_v2_rate_limiter = RateLimiter(ESV_V2_MIN_REQUEST_INTERVAL)
+
 
 def do_esv_v2_api(method, params):
     url = ESV_V2_BASE_URL + method + "?" + "&".join(params)
+    esv_v2_rate_limiter.wait()
     logger.info("ESV v2 query %s", url)
-    return requests.get(url).content.decode("utf-8")
+    return get_http_session().get(url, timeout=HTTP_TIMEOUT).content.decode("utf-8")
 
 
 def get_esv_v2(localized_reference_list, batch_size=ESV_V2_BATCH_SIZE):
-    from django.conf import settings
-
-    first_time = True
+    requested = set(localized_reference_list)
     sections = {}
-    for batch in chunks(localized_reference_list, batch_size):
-        if not first_time:
-            time.sleep(1)  # Don't hammer the API.
-
-        params = [
-            f"key={settings.ESV_V2_API_KEY}",
-            f"passage={urllib.parse.quote(';'.join(batch))}",
-            "include-short-copyright=0",
-            # Starting with plain text is easier than messing around
-            # with massaging HTML, even if it means we have to parse
-            # the output in a slightly adhoc way.
-            "output-format=plain-text",
-            "include-passage-horizontal-lines=0",
-            "include-heading-horizontal-lines=0",
-            "include-footnotes=0",
-            "include-subheadings=0",
-            "include-headings=0",
-            "line-length=0",
-        ]
-
-        text = do_esv_v2_api("passageQuery", params)
-        first_time = False
-
-        # Split into passages
-        current_section = None
-        for line in text.split("\n"):
-            l2 = line.strip()
-            if l2 == "":
-                continue
-            if line[0] != " " and l2 in localized_reference_list:
-                current_section = l2
-            else:
-                if current_section is None:
-                    # This can happen when ESV sends us back things we didn't
-                    # ask for e.g. asking for John 5:4 it sends us John 5:3-5
-                    pass
-                else:
-                    l2 = re.sub(r"\[[\d:]*\]", "", l2).strip()
-                    prev = sections[current_section] + "\n" if current_section in sections else ""
-                    sections[current_section] = prev + l2
+    for batch_sections in map_concurrently(
+        lambda batch: get_esv_v2_batch(batch, requested),
+        chunks(localized_reference_list, batch_size),
+        ESV_V2_MAX_CONCURRENT_REQUESTS,
+    ):
+        sections.update(batch_sections)
 
     fix_esv_v2_bugs(sections, localized_reference_list)
 
     return sorted(sections.items())
 
 
+def get_esv_v2_batch(batch, requested):
+    """
+    Returns a dictionary of {localized_reference: text} for a batch of references
+    """
+    from django.conf import settings
+
+    params = [
+        f"key={settings.ESV_V2_API_KEY}",
+        f"passage={urllib.parse.quote(';'.join(batch))}",
+        "include-short-copyright=0",
+        # Starting with plain text is easier than messing around
+        # with massaging HTML, even if it means we have to parse
+        # the output in a slightly adhoc way.
+        "output-format=plain-text",
+        "include-passage-horizontal-lines=0",
+        "include-heading-horizontal-lines=0",
+        "include-footnotes=0",
+        "include-subheadings=0",
+        "include-headings=0",
+        "line-length=0",
+    ]
+
+    text = do_esv_v2_api("passageQuery", params)
+
+    # Split into passages
+    sections = {}
+    current_section = None
+    for line in text.split("\n"):
+        l2 = line.strip()
+        if l2 == "":
+            continue
+        if line[0] != " " and l2 in requested:
+            current_section = l2
+        else:
+            if current_section is None:
+                # This can happen when ESV sends us back things we didn't
+                # ask for e.g. asking for John 5:4 it sends us John 5:3-5
+                pass
+            else:
+                l2 = re.sub(r"\[[\d:]*\]", "", l2).strip()
+                prev = sections[current_section] + "\n" if current_section in sections else ""
+                sections[current_section] = prev + l2
+
+    return sections
+
+
 # The ESV API incorrectly returns nothing for these items
 # (seems to only apply with output-format=plain-text)
 MISSING_ESV_V2 = {
@@ -209,6 +288,13 @@ def get_fetch_service(version_slug):
 
 
 def get_search_service(version_slug):
+    service = get_external_search_service(version_slug)
+    if service is None and local_text_search_available(version_slug):
+        return search_local_index
+    return service
+
+
+def get_external_search_service(version_slug):
     return _SEARCH_SERVICES.get(version_slug, None)
 
 
@@ -2,3 +2,4 @@ from django.dispatch import Signal
 
 verse_set_chosen = Signal()  # sender=VerseSet, chosen_by=Account
 public_verse_set_created = Signal()
+verse_texts_fetched = Signal()  # sender=TextVersion, verses=list of Verse
@@ -41,7 +41,8 @@ Code for generating 'suggestions' for verses.
 #   (NET) and hope that is sufficiently like other versions to be appropriate
 #   as a textual analysis basis.
 
-# * We serialize the results of analyses to disk - see `.storage`
+# * We serialize the results of analyses to disk - see `.storage`. The big
+#   ones use a memory-mapped format that doesn't need deserializing.
 
 # * We create wrappers classes to the analysis results, that in some cases
 #   reduce the size of the data we actually need in memory. see `.tools`
@@ -1,11 +1,13 @@
 import logging
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
 
-import pykov
+import numpy as np
 
 from bibleverses.suggestions.trainingtexts import TrainingTexts
 
 from ..constants import markov_analysis_name_for_size
-from ..utils.numbers import sum_matrices
 from ..utils.pickling import cache_results_with_pickle
 from ..utils.text import split_into_words_for_suggestions
 from .base import Analyzer
@@ -15,7 +17,7 @@ logger = logging.getLogger(__name__)
 
 class MarkovAnalyzerBase(Analyzer):
     def analyze(self, training_texts, keys):
-        return build_summed_markov_chains_for_texts(training_texts, keys, self.size)
+        return build_markov_succ_dict_for_texts(training_texts, keys, self.size)
 
 
 class Markov1Analyzer(MarkovAnalyzerBase):
@@ -33,26 +35,100 @@ class Markov3Analyzer(MarkovAnalyzerBase):
     name = markov_analysis_name_for_size(size)
 
 
-def build_summed_markov_chains_for_texts(training_texts, keys, size):
-    return sum_matrices(build_markov_chains_for_text(training_texts, key, size) for key in keys)
+# A Markov chain of size N has states that are N words long, and transitions
+# from each state to the next word. We build it by mapping words to integer ids,
+# and counting (N + 1)-grams of ids with numpy, rather than building Python
+# dictionaries for each sentence.
 
 
-@cache_results_with_pickle("markov")
-def build_markov_chains_for_text(training_texts: TrainingTexts, key, size):
+@dataclass
+class MarkovCounts:
+    # Vocabulary, indexed by word id
+    words: list[str]
+    # Array of shape (count, size + 1) of word ids for each n-gram, sorted and unique
+    ngrams: np.ndarray
+    # Array of number of occurrences of each n-gram
+    counts: np.ndarray
+
+
+def build_markov_succ_dict_for_texts(training_texts, keys, size):
+    counts = sum_markov_counts([count_markov_ngrams_for_text(training_texts, key, size) for key in keys], size)
+    return markov_succ_dict(counts, size)
+
+
+@cache_results_with_pickle("markovcounts")
+def count_markov_ngrams_for_text(training_texts: TrainingTexts, key, size) -> MarkovCounts:
     text = training_texts[key]
-    sentences = text.split(".")
-    v_accum, c_accum = pykov.maximum_likelihood_probabilities([])
-    matrices = []
     logger.info("Markov analysis level %d for %s", size, key)
-    for i, s in enumerate(sentences):
-        if not s:
-            continue
-        words = split_into_words_for_suggestions(s)
+    sentences = [split_into_words_for_suggestions(s) for s in text.split(".") if s]
+    return count_markov_ngrams(sentences, size)
+
+
+def count_markov_ngrams(sentences: list[list[str]], size) -> MarkovCounts:
+    """
+    Count the n-grams of length size + 1 in the list of sentences (each of
+    which is a list of words). N-grams do not cross sentence boundaries.
+    """
+    word_ids: dict[str, int] = {}
+    ids = []
+    sentence_numbers = []
+    for sentence_number, words in enumerate(sentences):
+        ids.extend(word_ids.setdefault(w, len(word_ids)) for w in words)
+        sentence_numbers.extend([sentence_number] * len(words))
+
+    ids_arr = np.array(ids, dtype=np.int64)
+    sentence_numbers_arr = np.array(sentence_numbers, dtype=np.int64)
+    window_count = max(len(ids_arr) - size, 0)
+    # Column i is the i'th word of every window
+    windows = np.stack([ids_arr[i : i + window_count] for i in range(size + 1)], axis=1)
+    # Exclude windows that span sentences:
+    windows = windows[sentence_numbers_arr[:window_count] == sentence_numbers_arr[size : size + window_count]]
+    ngrams, counts = np.unique(windows, axis=0, return_counts=True)
+    return MarkovCounts(words=list(word_ids), ngrams=ngrams, counts=counts)
+
+
+def sum_markov_counts(markov_counts_list: list[MarkovCounts], size) -> MarkovCounts:
+    # Each MarkovCounts has its own vocabulary, so we have to map to a shared
+    # one before summing.
+    word_ids: dict[str, int] = {}
+    all_ngrams = [np.zeros((0, size + 1), dtype=np.int64)]
+    all_counts = [np.zeros(0, dtype=np.int64)]
+    for markov_counts in markov_counts_list:
+        id_map = np.array([word_ids.setdefault(w, len(word_ids)) for w in markov_counts.words], dtype=np.int64)
+        if len(markov_counts.ngrams) > 0:
+            all_ngrams.append(id_map[markov_counts.ngrams])
+            all_counts.append(markov_counts.counts)
+    ngrams, inverse = np.unique(np.concatenate(all_ngrams), axis=0, return_inverse=True)
+    counts = np.bincount(inverse.reshape(-1), weights=np.concatenate(all_counts), minlength=len(ngrams))
+    return MarkovCounts(words=list(word_ids), ngrams=ngrams, counts=counts.astype(np.int64))
+
+
+def markov_succ_dict(markov_counts: MarkovCounts, size):
+    """
+    Returns a dictionary of {state: {next_state: probability}}, in the format
+    that pykov 'succ' produces, and that tools.markov.Markov uses.
+    """
+    ngrams, counts = markov_counts.ngrams, markov_counts.counts
+    succ = OrderedDict()
+    if len(ngrams) == 0:
+        return succ
+
+    # ngrams are sorted, so all the rows for a state are together. Normalize
+    # counts to probabilities per state:
+    states = ngrams[:, :size]
+    state_starts = np.concatenate([[0], np.flatnonzero(np.any(states[1:] != states[:-1], axis=1)) + 1])
+    state_totals = np.add.reduceat(counts, state_starts)
+    state_lengths = np.diff(np.append(state_starts, len(ngrams)))
+    probabilities = counts / np.repeat(state_totals, state_lengths)
+
+    words = [sys.intern(w) for w in markov_counts.words]
+    for row, probability in zip(ngrams.tolist(), probabilities.tolist()):
+        ngram_words = tuple(words[i] for i in row)
         if size == 1:
-            chain_input = words
+            state, next_state = ngram_words
         else:
-            chain_input = [tuple(words[i : i + size]) for i in range(0, len(words) - (size - 1))]
-        v, c = pykov.maximum_likelihood_probabilities(chain_input, lag_time=1)
-        matrices.append(c)
-
-    return sum_matrices(matrices)
+            state, next_state = ngram_words[:-1], ngram_words[1:]
+        if state not in succ:
+            succ[state] = OrderedDict()
+        succ[state][next_state] = probability
+    return succ
@@ -3,16 +3,20 @@
 
 import random
 import resource
+import time
 import timeit
+import tracemalloc
+from collections import OrderedDict
 
 from bibleverses.books import get_bible_books
 from bibleverses.languages import LANG
 
 from . import serverlogging  # noqa: F401
 from .constants import ALL_TEXT, THESAURUS_ANALYSIS, get_bible_book_groups
-from .generators import SuggestionGenerator
+from .generators import RandomGlobalSuggestions, SuggestionGenerator
 from .storage import AnalysisStorage
 from .trainingtexts import BibleTrainingTexts, CatechismTrainingTexts
+from .utils.text import split_into_words_for_suggestions
 
 try:
     import pympler.asizeof
@@ -124,6 +128,99 @@ def test_suggestion_speed():
     print("Time per text: " + str(timeit.timeit(f, number=COUNT) / (len(TEXTS) * COUNT)))
 
 
+def test_weighted_random_choice_speed(text_slug="NET", book="Genesis"):
+    """
+    Compare per-verse suggestion generation time for a whole book, using the
+    linear scan and alias method implementations of WordCounts.weighted_random_choice
+    """
+    from bibleverses.models import TextVersion
+
+    from .modelapi import get_whole_book
+
+    version = TextVersion.objects.get(slug=text_slug)
+    texts = [v.suggestion_text for v in get_whole_book(book, version).verses]
+    storage = AnalysisStorage()
+    generator = SuggestionGenerator(BibleTrainingTexts(text_version=version, books=[book]))
+    generator.load_data(storage)
+    word_counts = [s for s in generator.strategies if isinstance(s, RandomGlobalSuggestions)][0].global_word_counts
+
+    for label, method in [
+        ("linear scan", word_counts.weighted_random_choice_python),
+        ("alias method", word_counts.weighted_random_choice_alias),
+    ]:
+        word_counts.weighted_random_choice = method
+
+        def f():
+            for t in texts:
+                generator.suggestions_for_text(t)
+
+        print(f"{label}: time per verse {timeit.timeit(f, number=1) / len(texts):.5f}s")
+    del word_counts.weighted_random_choice
+
+
+def pykov_markov_succ_dict(texts, size):
+    """
+    Markov analysis as it was done originally, using pykov, for comparison
+    with analyzers.markov.
+    """
+    import pykov
+
+    from .utils.numbers import sum_matrices
+
+    matrices = []
+    for text in texts:
+        for s in text.split("."):
+            if not s:
+                continue
+            words = split_into_words_for_suggestions(s)
+            if size == 1:
+                chain_input = words
+            else:
+                chain_input = [tuple(words[i : i + size]) for i in range(0, len(words) - (size - 1))]
+            v, c = pykov.maximum_likelihood_probabilities(chain_input, lag_time=1)
+            matrices.append(c)
+    chain = sum_matrices(matrices)
+    succ = OrderedDict([(state, OrderedDict()) for state in chain.states()])
+    for link, probability in chain.items():
+        succ[link[0]][link[1]] = probability
+    return succ
+
+
+def numpy_markov_succ_dict(texts, size):
+    from .analyzers.markov import count_markov_ngrams, markov_succ_dict, sum_markov_counts
+
+    counts = [
+        count_markov_ngrams([split_into_words_for_suggestions(s) for s in text.split(".") if s], size) for text in texts
+    ]
+    return markov_succ_dict(sum_markov_counts(counts, size), size)
+
+
+def test_markov_analysis_speed(text_slug="NET"):
+    """
+    Compare time and peak memory of pykov and numpy based Markov analysis
+    over a whole Bible.
+    """
+    from bibleverses.models import TextVersion
+
+    version = TextVersion.objects.get(slug=text_slug)
+    # Load texts up front so that isn't included in timings
+    group_texts = [
+        BibleTrainingTexts(text_version=version, books=group).values()
+        for group in get_bible_book_groups(version.language_code)
+    ]
+    for size in [1, 2, 3]:
+        for label, func in [("pykov", pykov_markov_succ_dict), ("numpy", numpy_markov_succ_dict)]:
+            tracemalloc.start()
+            start = time.perf_counter()
+            state_count = 0
+            for texts in group_texts:
+                state_count += len(func(texts, size))
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"Markov {size} {label}: {elapsed:.2f}s, peak memory {nice_mem_units(peak)}, {state_count} states")
+
+
 TEXTS = [
     "This is the law of the diseased infection in the garment of wool or linen, "
     "or the warp or woof, or any article of leather, for pronouncing it clean or "
@@ -5,20 +5,34 @@ Word suggestion API for Django model layer code
 import gc
 import hashlib
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
 import pyuca
-from django.db import transaction
+from django.db import connections, transaction
 
 from bibleverses.books import get_bible_book_name, get_bible_book_number, get_bible_books
-from bibleverses.models import ComboVerse, TextType, TextVersion, Verse, WordSuggestionData, ensure_text
+from bibleverses.models import (
+    SUGGESTION_COUNT,
+    ComboVerse,
+    TextType,
+    TextVersion,
+    Verse,
+    WordSuggestionData,
+    ensure_text,
+)
+from bibleverses.parsing import parse_validated_localized_reference
 from bibleverses.services import partial_data_available
 from bibleverses.suggestions.utils.text import split_into_words_for_suggestions
 from learnscripture.utils.iterators import chunks
 
+from .constants import get_bible_book_groups
 from .exceptions import AnalysisMissing
 from .generators import SuggestionGenerator
 from .storage import AnalysisStorage
 from .trainingtexts import BibleTrainingTexts, CatechismTrainingTexts
+from .utils.numbers import choose_suggestions
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +40,13 @@ logger = logging.getLogger(__name__)
 COLLATER = pyuca.Collator()
 
 
+# Collation keys are relatively expensive to compute, and the same words are
+# used over and over again, so we keep a table of them in memory.
+@lru_cache(maxsize=100_000)
+def collation_key(word):
+    return COLLATER.sort_key(word)
+
+
 # Normally generate_suggestions is called only by management command, for
 # generating in bulk. However, at other times it has been necessary to edit a
 # text via the admin, and this triggers 'fix_item' being called to fix up the
@@ -67,34 +88,68 @@ def get_word_suggestions_by_localized_reference(version, localized_reference) ->
 
 
 def get_word_suggestions_by_localized_reference_bulk(version, localized_reference_list) -> dict[str, list[set[str]]]:
-    # Do simple ones in bulk:
-    simple_wsds = list(
-        word_suggestion_data_qs_for_version(version).filter(localized_reference__in=localized_reference_list)
-    )
-    s_dict = {w.localized_reference: w.get_suggestions() for w in simple_wsds}
-    # Others: (i.e. multi-verse references that span multiple database records
-    # in WordSuggestionData). This does O(n) DB queries but hopefully n is small
-    # in any given batch.
-    for localized_ref in localized_reference_list:
-        if localized_ref not in s_dict:
-            s_dict[localized_ref] = get_word_suggestions_by_localized_reference(version, localized_ref)
+    return {
+        localized_ref: [choose_suggestions(word_suggestions, SUGGESTION_COUNT) for word_suggestions in suggestion_lists]
+        for localized_ref, suggestion_lists in get_word_suggestion_lists_by_localized_reference_bulk(
+            version, localized_reference_list
+        ).items()
+    }
+
+
+def get_word_suggestion_lists_by_localized_reference_bulk(
+    version, localized_reference_list
+) -> dict[str, list[list[str]]]:
+    """
+    Returns a dictionary of {localized_reference: suggestion lists}, where
+    'suggestion lists' is the complete stored list of suggestions for each word
+    (see WordSuggestionData.suggestions), not a random selection.
+    """
+    expanded = _expand_localized_references(version, localized_reference_list)
+    # All the records we need, for simple and multi-verse references, in one
+    # query:
+    wsd_dict = _get_word_suggestion_data_dict(version, [ref for refs in expanded.values() for ref in refs])
+    s_dict = {}
+    for localized_ref, localized_refs in expanded.items():
+        suggestion_lists = []
+        for ref in localized_refs:
+            if ref in wsd_dict:
+                suggestion_lists.extend(wsd_dict[ref].suggestions)
+        s_dict[localized_ref] = suggestion_lists
     return s_dict
 
 
+def _expand_localized_references(version, localized_reference_list) -> dict[str, list[str]]:
+    """
+    Returns a dictionary of {localized_reference: list of single verse localized references}
+    """
+    retval = {}
+    for localized_ref in localized_reference_list:
+        if version.is_bible:
+            # Single verse references (the majority) can be dealt with without
+            # hitting the DB:
+            parsed_ref = parse_validated_localized_reference(version.language_code, localized_ref)
+            if parsed_ref is not None and parsed_ref.is_single_verse():
+                retval[localized_ref] = [localized_ref]
+                continue
+        retval[localized_ref] = version.get_localized_reference_list(localized_ref)
+    return retval
+
+
+def _get_word_suggestion_data_dict(version, localized_references) -> dict[str, WordSuggestionData]:
+    return {
+        wsd.localized_reference: wsd
+        for wsd in word_suggestion_data_qs_for_version(version).filter(localized_reference__in=localized_references)
+    }
+
+
 def _get_ordered_word_suggestion_data(version, localized_reference) -> list[WordSuggestionData]:
     """
     Returns a list of WordSuggestionData for a given localized reference
     (i.e. returning multiple items if the localized_reference is multi-verse)
     """
     localized_references = version.get_localized_reference_list(localized_reference)
-    wsds = list(word_suggestion_data_qs_for_version(version).filter(localized_reference__in=localized_references))
-    # wsds might not be ordered correctly, we need to re-order
-    retval = []
-    for localized_ref in localized_references:
-        for wsd in wsds:
-            if wsd.localized_reference == localized_ref:
-                retval.append(wsd)
-    return retval
+    wsd_dict = _get_word_suggestion_data_dict(version, localized_references)
+    return [wsd_dict[ref] for ref in localized_references if ref in wsd_dict]
 
 
 # -- Generate --
@@ -155,7 +210,23 @@ def item_suggestions_need_updating(item):
         return saved_hash != current_hash
 
 
-def generate_suggestions(version, localized_reference=None, missing_only=True, disallow_loading=False, text_saved=None):
+def items_needing_suggestions_update(version, items):
+    """
+    Bulk version of item_suggestions_need_updating, returns the items that need updating.
+    """
+    saved_hashes = dict(
+        word_suggestion_data_qs_for_version(version)
+        .filter(localized_reference__in=[item.localized_reference for item in items])
+        .values_list("localized_reference", "hash")
+    )
+    return [
+        item for item in items if saved_hashes.get(item.localized_reference, None) != hash_text(item.suggestion_text)
+    ]
+
+
+def generate_suggestions(
+    version, localized_reference=None, missing_only=True, disallow_loading=False, text_saved=None, jobs=1
+):
     analysis_storage = AnalysisStorage()
     language_code = version.language_code
     if version.text_type == TextType.BIBLE:
@@ -175,6 +246,8 @@ def generate_suggestions(version, localized_reference=None, missing_only=True, d
                 localized_reference=localized_reference,
                 missing_only=missing_only,
             )
+        elif jobs > 1:
+            generate_suggestions_for_books_parallel(version, missing_only=missing_only, jobs=jobs)
         else:
             for book in get_bible_books(language_code):
                 generate_suggestions_for_book(analysis_storage, version, book, missing_only=missing_only)
@@ -204,6 +277,50 @@ def generate_suggestions_for_book(analysis_storage, version, localized_book_name
     generate_suggestions_for_items(analysis_storage, version, items, training_texts, missing_only=missing_only)
 
 
+def generate_suggestions_for_books_parallel(version, missing_only=True, jobs=2):
+    """
+    Generate suggestions for all books of a Bible version, using a pool of `jobs`
+    worker processes.
+    """
+    # Books in the same group share the same analysis data (see
+    # BibleTrainingTexts), so we submit books in group order. Each worker keeps
+    # its own AnalysisStorage, and will usually get several books from the same
+    # group in a row, so it loads each analysis once. Since the big analyses
+    # are memory-mapped, workers also share those pages.
+    books = []
+    for group in get_bible_book_groups(version.language_code):
+        books.extend(b for b in group if b not in books)
+    books.extend(b for b in get_bible_books(version.language_code) if b not in books)
+
+    # Workers are forked, and must not share the parent's DB connections.
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_suggestions_worker,
+    ) as executor:
+        futures = [
+            executor.submit(_generate_suggestions_for_book_in_worker, version.id, book, missing_only) for book in books
+        ]
+        for future in futures:
+            # Propagate any exceptions
+            future.result()
+
+
+_worker_analysis_storage = None
+
+
+def _init_suggestions_worker():
+    global _worker_analysis_storage
+    connections.close_all()
+    _worker_analysis_storage = AnalysisStorage()
+
+
+def _generate_suggestions_for_book_in_worker(version_id, localized_book_name, missing_only):
+    version = TextVersion.objects.get(id=version_id)
+    generate_suggestions_for_book(_worker_analysis_storage, version, localized_book_name, missing_only=missing_only)
+
+
 def generate_suggestions_for_items(
     analysis_storage,
     version,
@@ -251,7 +368,9 @@ def generate_suggestions_for_items(
                 version.word_suggestion_data.filter(localized_reference__in=to_delete).delete()
             if to_create:
                 logger.info("Creating %s items", len(to_create))
-                WordSuggestionData.objects.bulk_create(to_create)
+                # ignore_conflicts makes this safe if another process has
+                # created some of the same items in the meantime.
+                WordSuggestionData.objects.bulk_create(to_create, ignore_conflicts=True)
         gc.collect()
 
 
@@ -343,6 +462,6 @@ def create_prompt_list(text: str, suggestion_list: list[set[str]]) -> list[list[
 
     correct_words = split_into_words_for_suggestions(text)
     return [
-        sorted(list(suggestions) + [correct_word], key=COLLATER.sort_key)
+        sorted(list(suggestions) + [correct_word], key=collation_key)
         for correct_word, suggestions in zip(correct_words, suggestion_list)
     ]
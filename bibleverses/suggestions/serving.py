@@ -0,0 +1,81 @@
+"""
+Serving of word suggestions to the learn page, in the form of prompt lists.
+
+For each verse/question, the prompt list consists of, for each word, a
+random selection of the stored suggestions plus the correct word, sorted
+according to collation rules. Everything apart from the random selection is
+deterministic, so we keep it in a bounded in-process cache, keyed on
+(version_slug, localized_reference), and validated using a hash of the
+text. Collation keys are kept in a table too (see `modelapi.collation_key`).
+This means that for most requests we don't need to fetch WordSuggestionData
+at all, and the remaining work is O(number of suggestions shown).
+"""
+
+import sys
+
+from bibleverses.models import SUGGESTION_COUNT
+from learnscripture.utils.cache import LRUCache
+
+from .modelapi import collation_key, get_word_suggestion_lists_by_localized_reference_bulk, hash_text
+from .utils.numbers import choose_suggestions
+from .utils.text import split_into_words_for_suggestions
+
+PROMPT_SOURCE_CACHE_SIZE = 2000
+
+_prompt_source_cache = LRUCache(PROMPT_SOURCE_CACHE_SIZE)
+
+
+class PromptSource:
+    """
+    The deterministic parts needed to build a prompt list for a verse/question.
+    """
+
+    def __init__(self, text_hash: str, correct_words: list[str], suggestion_lists: list[list[str]]):
+        self.text_hash = text_hash
+        # Interning reduces memory usage, since the same words are used by many
+        # cached items.
+        self.correct_words = [sys.intern(w) for w in correct_words]
+        self.suggestion_lists = [tuple(sys.intern(w) for w in suggestions) for suggestions in suggestion_lists]
+
+    def prompt_list(self) -> list[list[str]]:
+        # See also modelapi.create_prompt_list, which this must match.
+        if not self.suggestion_lists:
+            return []
+        return [
+            sorted(list(choose_suggestions(suggestions, SUGGESTION_COUNT)) + [correct_word], key=collation_key)
+            for correct_word, suggestions in zip(self.correct_words, self.suggestion_lists)
+        ]
+
+
+def get_prompt_lists_bulk(version, text_dict: dict[str, str]) -> dict[str, list[list[str]]]:
+    """
+    Given a dictionary of {localized_reference: text}, returns a dictionary of
+    {localized_reference: prompt list}
+    """
+    retval = {}
+    missing = {}
+    for localized_reference, text in text_dict.items():
+        text_hash = hash_text(text)
+        source = _prompt_source_cache.get((version.slug, localized_reference))
+        if source is not None and source.text_hash == text_hash:
+            retval[localized_reference] = source.prompt_list()
+        else:
+            missing[localized_reference] = text_hash
+
+    if missing:
+        suggestion_lists_dict = get_word_suggestion_lists_by_localized_reference_bulk(version, list(missing.keys()))
+        for localized_reference, text_hash in missing.items():
+            suggestion_lists = suggestion_lists_dict.get(localized_reference, [])
+            source = PromptSource(
+                text_hash, split_into_words_for_suggestions(text_dict[localized_reference]), suggestion_lists
+            )
+            if suggestion_lists:
+                # If suggestions are not available, they may be created soon,
+                # so we don't cache.
+                _prompt_source_cache.set((version.slug, localized_reference), source)
+            retval[localized_reference] = source.prompt_list()
+    return retval
+
+
+def clear_prompt_source_cache():
+    _prompt_source_cache.clear()
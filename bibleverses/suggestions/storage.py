@@ -30,6 +30,11 @@ from .tools.wordcounts import WordCounts
 
 # Also, some Strategies use the same analysis, so we need to avoid loading twice.
 
+# The larger analyses (Markov chains, thesaurus) are saved in a compact binary
+# format that is memory-mapped on loading (see `.utils.mmapped`), so they are
+# queried in place rather than deserialized, and the pages are shared between
+# processes that load the same file.
+
 logger = logging.getLogger(__name__)
 
 rel = lambda *x: os.path.normpath(os.path.join(os.path.abspath(os.path.dirname(__file__)), *x))
@@ -69,9 +74,9 @@ SERIALIZERS = [
         FirstWordFrequencies.load,
         FirstWordFrequencies.format_version,
     ),
-    Serializer(MARKOV_1_ANALYSIS, Markov.from_pykov, Markov.dump, Markov.load, Markov.format_version),
-    Serializer(MARKOV_2_ANALYSIS, Markov.from_pykov, Markov.dump, Markov.load, Markov.format_version),
-    Serializer(MARKOV_3_ANALYSIS, Markov.from_pykov, Markov.dump, Markov.load, Markov.format_version),
+    Serializer(MARKOV_1_ANALYSIS, Markov.from_succ_dict, Markov.dump, Markov.load, Markov.format_version),
+    Serializer(MARKOV_2_ANALYSIS, Markov.from_succ_dict, Markov.dump, Markov.load, Markov.format_version),
+    Serializer(MARKOV_3_ANALYSIS, Markov.from_succ_dict, Markov.dump, Markov.load, Markov.format_version),
 ]
 
 SERIALIZER_DICT = {s.name: s for s in SERIALIZERS}
@@ -1,10 +1,17 @@
-from collections import OrderedDict
+from array import array
 
-from ..utils.memory import intern_it
-from .utils import PicklerMixin
+from ..utils.mmapped import (
+    MAX_VOCABULARY_SIZE,
+    MappedSections,
+    MappedVocabulary,
+    build_vocabulary,
+    dump_sections,
+    find_sorted,
+    pack_word_ids,
+)
 
 
-class Markov(PicklerMixin):
+class Markov:
     # Interface for strategies:
     def get_next_word_options(self, start):
         try:
@@ -14,32 +21,109 @@ class Markov(PicklerMixin):
         return [(w if isinstance(w, str) else w[-1], f) for w, f in options]
 
     # Loading/saving
-    format_version = 3
+
+    # We save in a compact format (see MappedMarkov), which is loaded as a
+    # MappedMarkov rather than a Markov, but supports the same interface.
+    format_version = 5
 
     def __init__(self, pykov_succ_dict):
+        # The 'succ' dict format was originally that of pykov, see
+        # analyzers.markov.markov_succ_dict
         self.pykov_succ_dict = pykov_succ_dict
 
     @classmethod
-    def from_pykov(cls, pykov_chain):
-        # We could get further wins by rewriting the 'succ' method (from pykov)
-        # using our own version, which is the only method we use after analysis is done,
-        # so we can avoid loading pykov and numpy
-        return cls(pykov_succ_dict(compress_pykov(pykov_chain)))
-
-
-def pykov_succ_dict(pykov_chain):
-    # This is copied from part of pykov.Matric.succ. All we need is the pykov
-    # 'succ' method, and we don't want numpy dependencies
-    _succ = OrderedDict([(state, OrderedDict()) for state in pykov_chain.states()])
-    for link, probability in pykov_chain.items():
-        _succ[link[0]][link[1]] = probability
-    return _succ
-
-
-def compress_pykov(pykov_chain):
-    n = pykov_chain.__class__()
-    for k, v in n.items():
-        # key is a tuple of strings,
-        # or a tuple of a tuple of strings
-        n[intern_it(k)] = intern_it(v)
-    return n
+    def from_succ_dict(cls, succ_dict):
+        return cls(succ_dict)
+
+    @classmethod
+    def load(cls, filehandle):
+        return MappedMarkov(MappedSections(filehandle))
+
+    @classmethod
+    def dump(cls, obj, filehandle):
+        dump_sections(markov_sections(obj.pykov_succ_dict), filehandle)
+
+
+class MappedMarkov:
+    """
+    Markov chain data in a flat, memory-mapped layout.
+
+    States are tuples of word ids packed into a single integer key, stored
+    sorted so that they can be binary searched. For each state there is a range
+    in the successor arrays (next word ids and probabilities).
+    """
+
+    def __init__(self, sections):
+        self.vocabulary = MappedVocabulary(sections)
+        self._state_keys = sections["state_keys"]
+        self._succ_offsets = sections["succ_offsets"]
+        self._succ_word_ids = sections["succ_word_ids"]
+        self._succ_probabilities = sections["succ_probs"]
+
+    # Interface for strategies:
+    def get_next_word_options(self, start):
+        words = (start,) if isinstance(start, str) else start
+        word_ids = []
+        for word in words:
+            word_id = self.vocabulary.word_id(word)
+            if word_id is None:
+                return []
+            word_ids.append(word_id)
+        state_idx = find_sorted(self._state_keys, pack_word_ids(word_ids))
+        if state_idx is None:
+            return []
+        start_idx, end_idx = self._succ_offsets[state_idx], self._succ_offsets[state_idx + 1]
+        word = self.vocabulary.word
+        return [
+            (word(word_id), probability)
+            for word_id, probability in zip(
+                self._succ_word_ids[start_idx:end_idx], self._succ_probabilities[start_idx:end_idx]
+            )
+        ]
+
+
+def markov_sections(succ_dict):
+    """
+    Convert a pykov 'succ' dictionary into sections for saving in compact format.
+    """
+
+    def state_words(state):
+        return (state,) if isinstance(state, str) else state
+
+    def next_word(state):
+        return state if isinstance(state, str) else state[-1]
+
+    all_words = set()
+    for state, successors in succ_dict.items():
+        all_words.update(state_words(state))
+        all_words.update(next_word(s) for s in successors)
+    if len(all_words) >= MAX_VOCABULARY_SIZE:
+        raise ValueError(f"Vocabulary of {len(all_words)} words is too big for compact Markov format")
+
+    word_ids, sections = build_vocabulary(all_words)
+    keyed_states = sorted(
+        (pack_word_ids([word_ids[w] for w in state_words(state)]), successors)
+        for state, successors in succ_dict.items()
+        if successors
+    )
+
+    state_keys = array("Q")
+    succ_offsets = array("I", [0])
+    succ_word_ids = array("I")
+    succ_probs = array("f")
+    for key, successors in keyed_states:
+        state_keys.append(key)
+        for s, probability in successors.items():
+            succ_word_ids.append(word_ids[next_word(s)])
+            succ_probs.append(probability)
+        succ_offsets.append(len(succ_word_ids))
+
+    sections.update(
+        {
+            "state_keys": state_keys,
+            "succ_offsets": succ_offsets,
+            "succ_word_ids": succ_word_ids,
+            "succ_probs": succ_probs,
+        }
+    )
+    return sections
@@ -1,9 +1,10 @@
 import sys
+from array import array
 
-from .utils import PicklerMixin
+from ..utils.mmapped import MappedSections, MappedVocabulary, build_vocabulary, dump_sections, find_sorted
 
 
-class Thesaurus(PicklerMixin):
+class Thesaurus:
     """
     Thesaurus object used by strategies
     """
@@ -18,7 +19,10 @@ class Thesaurus(PicklerMixin):
         return default
 
     # Factories/serialization:
-    format_version = 1
+
+    # We save in a compact format (see MappedThesaurus), which is loaded as a
+    # MappedThesaurus rather than a Thesaurus, but supports the same interface.
+    format_version = 2
 
     def __init__(self, data):
         self.data = data
@@ -26,12 +30,74 @@ class Thesaurus(PicklerMixin):
     @classmethod
     def from_dict(cls, data):
         # Use sys.intern to reduce size of dictionary and 'dedupe' strings.
-        # The saving due to interning appears to survive pickling/unpickling,
-        # although the interning itself may not.
-        # Running compress again after loading increases overall process
-        # memory usage, so we don't bother doing that.
         return cls(compress(data))
 
+    @classmethod
+    def load(cls, filehandle):
+        return MappedThesaurus(MappedSections(filehandle))
+
+    @classmethod
+    def dump(cls, obj, filehandle):
+        dump_sections(thesaurus_sections(obj.data), filehandle)
+
+
+class MappedThesaurus:
+    """
+    Thesaurus data in a flat, memory-mapped layout.
+
+    Entries are stored sorted by word id, each with a range in the
+    alternatives array.
+    """
+
+    def __init__(self, sections):
+        self.vocabulary = MappedVocabulary(sections)
+        self._entry_word_ids = sections["entry_word_ids"]
+        self._entry_offsets = sections["entry_offsets"]
+        self._alternative_ids = sections["alt_word_ids"]
+
+    # Dictionary like interface for strategies to use:
+    def __getitem__(self, key):
+        retval = self.get(key, None)
+        if retval is None:
+            raise KeyError(key)
+        return retval
+
+    def get(self, key, default):
+        word_id = self.vocabulary.word_id(key)
+        if word_id is None:
+            return default
+        # Word ids are positions in the sorted vocabulary, so entry_word_ids
+        # is sorted too, and we can binary search it.
+        entry_idx = find_sorted(self._entry_word_ids, word_id)
+        if entry_idx is None:
+            return default
+        start_idx, end_idx = self._entry_offsets[entry_idx], self._entry_offsets[entry_idx + 1]
+        return [self.vocabulary.word(i) for i in self._alternative_ids[start_idx:end_idx]]
+
+
+def thesaurus_sections(data):
+    all_words = set(data.keys())
+    for alternatives in data.values():
+        all_words.update(alternatives)
+    word_ids, sections = build_vocabulary(all_words)
+
+    entry_word_ids = array("I")
+    entry_offsets = array("I", [0])
+    alt_word_ids = array("I")
+    for word_id, alternatives in sorted((word_ids[k], vs) for k, vs in data.items()):
+        entry_word_ids.append(word_id)
+        alt_word_ids.extend(word_ids[w] for w in alternatives)
+        entry_offsets.append(len(alt_word_ids))
+
+    sections.update(
+        {
+            "entry_word_ids": entry_word_ids,
+            "entry_offsets": entry_offsets,
+            "alt_word_ids": alt_word_ids,
+        }
+    )
+    return sections
+
 
 def compress(data):
     compressed = {}
@@ -1,4 +1,4 @@
-from ..utils.numbers import weighted_random_choice
+from ..utils.numbers import alias_random_choice, build_alias_table, weighted_random_choice
 from .utils import PicklerMixin
 
 
@@ -15,11 +15,16 @@ class WordCounts(PicklerMixin):
     def weighted_random_choice_python(self):
         return weighted_random_choice(self._items, total=self._total)
 
-    # python version seems to be faster, and also we can eliminate numpy dependency.
-    weighted_random_choice = weighted_random_choice_python
+    def weighted_random_choice_alias(self):
+        return self._words[alias_random_choice(self._alias_probabilities, self._aliases)]
+
+    # The python version is faster than numpy for single choices, but is
+    # O(vocabulary size). The alias method is O(1), using tables that are built
+    # at analysis time and saved with the rest of the data.
+    weighted_random_choice = weighted_random_choice_alias
 
     # Factories/serialization:
-    format_version = 2
+    format_version = 3
 
     def __init__(self, counter):
         items = list(counter.items())
@@ -30,6 +35,7 @@ class WordCounts(PicklerMixin):
         frequencies = [count / total for count in counts]
         self._words = words
         self._frequencies = frequencies
+        self._alias_probabilities, self._aliases = build_alias_table(counts)
 
     @classmethod
     def from_counter(cls, counter):
@@ -0,0 +1,196 @@
+"""
+Compact, memory-mappable binary storage for analysis data.
+
+A file consists of a header, a table of contents, and a number of named
+sections. Each section is a flat array of fixed size items (as understood by
+the `array` module). On loading, the file is memory-mapped and each section is
+exposed as a typed `memoryview` over the mapping, so nothing is deserialized up
+front - pages are only read when they are used, and processes that map the same
+file share the same pages via the OS page cache.
+
+This module deliberately has no dependencies on Django or numpy.
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+MAGIC = b"LSMMAP\x00\x00"
+LAYOUT_VERSION = 1
+
+# magic, layout version, byte order flag, section count
+_HEADER = struct.Struct("<8sIII")
+# name, typecode, offset, item count
+_TOC_ENTRY = struct.Struct("<16s4sQQ")
+_ALIGNMENT = 8
+
+_BYTE_ORDERS = {"little": 0, "big": 1}
+
+# Typecodes we allow, with the item sizes we expect. We check these up front
+# because `array` item sizes are platform dependent.
+TYPECODE_SIZES = {
+    "B": 1,  # bytes
+    "I": 4,  # uint32
+    "Q": 8,  # uint64
+    "f": 4,  # float32
+}
+
+
+def _check_typecode(typecode):
+    if typecode not in TYPECODE_SIZES:
+        raise ValueError(f"Unsupported typecode {typecode!r}")
+    if array(typecode).itemsize != TYPECODE_SIZES[typecode]:
+        raise ValueError(f"Typecode {typecode!r} does not have expected size on this platform")
+
+
+def dump_sections(sections, filehandle):
+    """
+    Write a dictionary of {name: array.array} to the file handle.
+    """
+    for name, data in sections.items():
+        _check_typecode(data.typecode)
+        if len(name.encode("ascii")) > 16:
+            raise ValueError(f"Section name {name!r} too long")
+
+    offset = _HEADER.size + _TOC_ENTRY.size * len(sections)
+    toc = []
+    for name, data in sections.items():
+        offset = _align(offset)
+        toc.append((name, data, offset))
+        offset += len(data) * data.itemsize
+
+    filehandle.write(_HEADER.pack(MAGIC, LAYOUT_VERSION, _BYTE_ORDERS[sys.byteorder], len(sections)))
+    for name, data, offset in toc:
+        filehandle.write(_TOC_ENTRY.pack(name.encode("ascii"), data.typecode.encode("ascii"), offset, len(data)))
+    position = _HEADER.size + _TOC_ENTRY.size * len(sections)
+    for name, data, offset in toc:
+        filehandle.write(b"\x00" * (offset - position))
+        data.tofile(filehandle)
+        position = offset + len(data) * data.itemsize
+
+
+def _align(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+class MappedSections:
+    """
+    Read-only view of a file written by `dump_sections`.
+
+    Indexing returns a `memoryview` cast to the section's typecode, which
+    supports `len()`, indexing and slicing without copying.
+    """
+
+    def __init__(self, filehandle):
+        # mmap keeps its own duplicate of the file descriptor, so the
+        # file handle can be closed after this.
+        self._mmap = mmap.mmap(filehandle.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        magic, layout_version, byte_order, section_count = _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{filehandle.name} is not in compact analysis format")
+        if layout_version != LAYOUT_VERSION:
+            raise ValueError(f"{filehandle.name} has unsupported layout version {layout_version}")
+        if byte_order != _BYTE_ORDERS[sys.byteorder]:
+            raise ValueError(f"{filehandle.name} was written on a machine with different byte order")
+
+        self._sections = {}
+        for i in range(section_count):
+            raw_name, raw_typecode, offset, count = _TOC_ENTRY.unpack_from(buffer, _HEADER.size + i * _TOC_ENTRY.size)
+            name = raw_name.rstrip(b"\x00").decode("ascii")
+            typecode = raw_typecode.rstrip(b"\x00").decode("ascii")
+            _check_typecode(typecode)
+            self._sections[name] = buffer[offset : offset + count * TYPECODE_SIZES[typecode]].cast(typecode)
+
+    def __getitem__(self, name):
+        return self._sections[name]
+
+    def __contains__(self, name):
+        return name in self._sections
+
+
+# -- Vocabulary
+#
+# Words are stored sorted by their UTF-8 encoding, as a single blob plus an
+# offsets array, so that a word can be found by binary search directly over
+# the mapped data, and word ids are simply positions in the sorted list.
+
+
+def build_vocabulary(words):
+    """
+    Given an iterable of words, returns (word_ids dict, sections dict)
+    """
+    encoded = sorted({w.encode("utf-8") for w in words})
+    offsets = array("I", [0])
+    blob = array("B")
+    for w in encoded:
+        blob.frombytes(w)
+        offsets.append(len(blob))
+    word_ids = {w.decode("utf-8"): i for i, w in enumerate(encoded)}
+    return word_ids, {"vocab_offsets": offsets, "vocab_blob": blob}
+
+
+class _EncodedWords:
+    # Sequence interface over the encoded vocabulary, for use with `bisect`
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._blob[self._offsets[i] : self._offsets[i + 1]].tobytes()
+
+
+class MappedVocabulary:
+    def __init__(self, sections):
+        self._encoded = _EncodedWords(sections["vocab_offsets"], sections["vocab_blob"])
+
+    def __len__(self):
+        return len(self._encoded)
+
+    def word(self, word_id):
+        return self._encoded[word_id].decode("utf-8")
+
+    def word_id(self, word):
+        """
+        Returns the id for the word, or None if it is not in the vocabulary
+        """
+        encoded = word.encode("utf-8")
+        i = bisect_left(self._encoded, encoded)
+        if i < len(self._encoded) and self._encoded[i] == encoded:
+            return i
+        return None
+
+
+# -- Packed keys
+#
+# A tuple of up to 3 word ids is packed into a single uint64, which gives a
+# total ordering matching tuple ordering, and allows binary search over a flat
+# array.
+
+WORD_ID_BITS = 21
+MAX_PACKED_WORDS = 3
+MAX_VOCABULARY_SIZE = 2**WORD_ID_BITS
+
+
+def pack_word_ids(word_ids):
+    assert len(word_ids) <= MAX_PACKED_WORDS
+    key = 0
+    for word_id in word_ids:
+        key = (key << WORD_ID_BITS) | word_id
+    return key
+
+
+def find_sorted(sorted_keys, key):
+    """
+    Returns the index of key in the sorted sequence sorted_keys, or None if it
+    is not present.
+    """
+    i = bisect_left(sorted_keys, key)
+    if i < len(sorted_keys) and sorted_keys[i] == key:
+        return i
+    return None
@@ -1,5 +1,6 @@
 import operator
 import random
+from bisect import bisect_right
 from collections import Counter
 from functools import reduce
 
@@ -63,3 +64,67 @@ def weighted_random_choice(choices, total=1):
         if upto >= r:
             return c
     assert False, "Shouldn't get here"
+
+
+def build_alias_table(weights):
+    """
+    Builds tables for weighted random choice using the alias method (Vose's
+    algorithm). Returns (probabilities, aliases) lists, for use with
+    alias_random_choice. The weights do not need to add up to 1.
+    """
+    n = len(weights)
+    total = sum(weights)
+    scaled = [w * n / total for w in weights]
+    probabilities = [1.0] * n
+    aliases = list(range(n))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        s = small.pop()
+        lg = large.pop()
+        probabilities[s] = scaled[s]
+        aliases[s] = lg
+        scaled[lg] = scaled[lg] + scaled[s] - 1.0
+        if scaled[lg] < 1.0:
+            small.append(lg)
+        else:
+            large.append(lg)
+    # Anything left over is (within floating point error) exactly 1.0, and
+    # keeps the defaults.
+    return probabilities, aliases
+
+
+def alias_random_choice(probabilities, aliases):
+    """
+    Returns a weighted random index, in O(1) time, using tables from build_alias_table
+    """
+    i = random.randrange(len(probabilities))
+    if random.random() < probabilities[i]:
+        return i
+    return aliases[i]
+
+
+def choose_suggestions(word_suggestions, count):
+    """
+    Make a random selection of up to `count` words from `word_suggestions`
+    (which is in decreasing order of fitness), weighted towards the fitter ones.
+    Returns a set.
+    """
+    n = len(word_suggestions)
+    if n <= count:
+        return set(word_suggestions)
+
+    # Word i is given a frequency of 1.0 - i * 0.5 / n i.e. between 1.0 and 0.5
+    # (lower than 0.5 means they end up not being seen at all in practice).
+    # For each pick, we choose a random threshold up to the highest frequency
+    # still available, and pick uniformly from words with a frequency above
+    # that threshold. Frequency decreases with index, so those words are a prefix
+    # of the remaining indices, which we can find by bisection, avoiding
+    # rejection sampling and rebuilding lists.
+    available = list(range(n))
+    chosen: set[str] = set()
+    while len(chosen) < count and available:
+        threshold = random.random() * (1.0 - available[0] * 0.5 / n)
+        limit = max(bisect_right(available, (1.0 - threshold) * 2 * n), 1)
+        chosen.add(word_suggestions[available.pop(random.randrange(limit))])
+    return chosen
@@ -0,0 +1,317 @@
+"""
+Local full text search for Bible verses.
+
+This is an alternative to the Postgres based search in
+VerseManager.text_search, which doesn't depend on the database for anything
+but fetching the verses found. For each TextVersion, an index is built from
+the Verse table (see the `build_text_search_index` management command), and
+saved to a file that web processes memory-map when needed.
+
+The index consists of:
+
+- a vocabulary of all words that appear in the text (lower cased), with the
+  lexeme that Postgres produces for each using the search configuration in
+  POSTGRES_SEARCH_CONFIGURATIONS. This means that stemming and stop words match
+  the Postgres search, without needing a stemmer in Python. (Query words that
+  are not in the text are stemmed by Postgres at search time).
+
+- posting lists of (document, term frequency) for each lexeme, and document
+  lengths, for BM25 ranking.
+
+Like `plainto_tsquery`, all words in the query must match. Highlighting is
+done using offsets of the matching words in the verse text.
+"""
+
+import math
+import os
+import re
+from array import array
+
+from django.conf import settings
+from django.db import connection
+
+from learnscripture.utils.cache import LRUCache
+
+from .suggestions.utils.mmapped import MappedSections, MappedVocabulary, build_vocabulary, dump_sections
+
+FORMAT_VERSION = 1
+
+WORD_RE = re.compile(r"\w+")
+
+# Values in 'form_lexemes' section that are not lexeme ids:
+STOP_WORD = 2**32 - 1
+NOT_A_FORM = 2**32 - 2
+
+# BM25 parameters, standard values
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def text_search_index_file(version_slug):
+    return os.path.join(settings.DATA_ROOT, "textsearch", f"{version_slug}.v{FORMAT_VERSION}.textsearch")
+
+
+def tokenize(text):
+    """
+    Returns a list of (start offset, end offset, lower cased word)
+    """
+    return [(m.start(), m.end(), m.group(0).lower()) for m in WORD_RE.finditer(text)]
+
+
+# -- Building
+
+
+def build_text_search_index(version):
+    from .models import POSTGRES_SEARCH_CONFIGURATIONS
+
+    verses = list(
+        version.verse_set.filter(missing=False)
+        .exclude(text_saved="")
+        .order_by("bible_verse_number")
+        .values_list("id", "text_saved")
+    )
+    verse_words = [[word for _, _, word in tokenize(text)] for _, text in verses]
+    form_lexemes = get_lexemes(
+        POSTGRES_SEARCH_CONFIGURATIONS[version.language_code], {w for words in verse_words for w in words}
+    )
+    sections = text_search_sections([verse_id for verse_id, _ in verses], verse_words, form_lexemes)
+
+    filename = text_search_index_file(version.slug)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    # Write and rename, so that processes using the old file are not affected.
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        dump_sections(sections, f)
+    os.replace(tmp_filename, filename)
+    return filename
+
+
+def get_lexemes(search_config, words, batch_size=5000):
+    """
+    Returns a dictionary {word: lexeme or None for stop words}, using Postgres
+    to do the stemming.
+    """
+    words = sorted(words)
+    retval = {}
+    with connection.cursor() as cursor:
+        for i in range(0, len(words), batch_size):
+            cursor.execute(
+                """
+                SELECT w, ARRAY(SELECT unnest(lexemes) FROM ts_debug(%s::regconfig, w))
+                FROM unnest(%s::text[]) AS w;
+                """,
+                [search_config, words[i : i + batch_size]],
+            )
+            for word, lexemes in cursor.fetchall():
+                retval[word] = lexemes[0] if lexemes else None
+    return retval
+
+
+def text_search_sections(verse_ids, verse_words, form_lexemes):
+    word_ids, sections = build_vocabulary(set(form_lexemes) | {lex for lex in form_lexemes.values() if lex is not None})
+
+    form_lexeme_ids = array("I", [NOT_A_FORM] * len(word_ids))
+    for form, lexeme in form_lexemes.items():
+        form_lexeme_ids[word_ids[form]] = STOP_WORD if lexeme is None else word_ids[lexeme]
+
+    postings = [{} for _ in range(len(word_ids))]  # lexeme id: {document: term frequency}
+    doc_lengths = array("I")
+    for doc, words in enumerate(verse_words):
+        length = 0
+        for word in words:
+            lexeme_id = form_lexeme_ids[word_ids[word]]
+            if lexeme_id == STOP_WORD:
+                continue
+            length += 1
+            doc_freqs = postings[lexeme_id]
+            doc_freqs[doc] = doc_freqs.get(doc, 0) + 1
+        doc_lengths.append(length)
+
+    posting_offsets = array("I", [0])
+    posting_docs = array("I")
+    posting_freqs = array("I")
+    for doc_freqs in postings:
+        # dicts are in insertion order, which is document order
+        posting_docs.extend(doc_freqs.keys())
+        posting_freqs.extend(doc_freqs.values())
+        posting_offsets.append(len(posting_docs))
+
+    sections.update(
+        {
+            "form_lexemes": form_lexeme_ids,
+            "posting_offsets": posting_offsets,
+            "posting_docs": posting_docs,
+            "posting_freqs": posting_freqs,
+            "doc_verse_ids": array("Q", verse_ids),
+            "doc_lengths": doc_lengths,
+        }
+    )
+    return sections
+
+
+# -- Searching
+
+
+class TextSearchIndex:
+    def __init__(self, sections, search_config):
+        self.search_config = search_config
+        self.vocabulary = MappedVocabulary(sections)
+        self._form_lexemes = sections["form_lexemes"]
+        self._posting_offsets = sections["posting_offsets"]
+        self._posting_docs = sections["posting_docs"]
+        self._posting_freqs = sections["posting_freqs"]
+        self._doc_verse_ids = sections["doc_verse_ids"]
+        self._doc_lengths = sections["doc_lengths"]
+        self.doc_count = len(self._doc_lengths)
+        self.average_doc_length = sum(self._doc_lengths) / self.doc_count if self.doc_count else 0
+
+    @classmethod
+    def load(cls, filename, search_config):
+        with open(filename, "rb") as f:
+            return cls(MappedSections(f), search_config)
+
+    def lexeme_id(self, word):
+        """
+        Returns the lexeme id for a (lower cased) word that appears in the
+        text, STOP_WORD, or None if it is unknown.
+        """
+        word_id = self.vocabulary.word_id(word)
+        if word_id is None:
+            return None
+        lexeme_id = self._form_lexemes[word_id]
+        if lexeme_id == NOT_A_FORM:
+            return None
+        return lexeme_id
+
+    def query_word_lexeme_id(self, word):
+        """
+        Returns the lexeme id for a (lower cased) query word, STOP_WORD, or
+        None if it can't match anything.
+        """
+        lexeme_id = self.lexeme_id(word)
+        if lexeme_id is not None:
+            return lexeme_id
+        # Words that don't appear in the text can still match other forms of
+        # the same word, so we need the lexeme. This is rare enough that it
+        # is OK to ask Postgres, which doesn't involve any table access.
+        key = (self.search_config, word)
+        lexeme = _query_lexeme_cache.get(key, NOT_A_FORM)
+        if lexeme == NOT_A_FORM:
+            lexeme = get_lexemes(self.search_config, [word])[word]
+            _query_lexeme_cache.set(key, lexeme)
+        if lexeme is None:
+            return STOP_WORD
+        return self.vocabulary.word_id(lexeme)
+
+    def query_lexeme_ids(self, query):
+        """
+        Returns a set of lexeme ids for the query, or None if the query
+        can't match anything.
+        """
+        lexeme_ids = set()
+        for _, _, word in tokenize(query):
+            lexeme_id = self.query_word_lexeme_id(word)
+            if lexeme_id is None:
+                return None
+            if lexeme_id != STOP_WORD:
+                lexeme_ids.add(lexeme_id)
+        return lexeme_ids
+
+    def search(self, query, limit=10, offset=0):
+        """
+        Returns a list of (verse id, score) for the best matches to the query.
+        """
+        lexeme_ids = self.query_lexeme_ids(query)
+        if not lexeme_ids:
+            return []
+
+        postings = []
+        for lexeme_id in lexeme_ids:
+            start, end = self._posting_offsets[lexeme_id], self._posting_offsets[lexeme_id + 1]
+            postings.append((self._posting_docs[start:end], self._posting_freqs[start:end]))
+        # Start with the rarest term to keep the intersection small
+        postings.sort(key=lambda p: len(p[0]))
+
+        scores = None
+        for docs, freqs in postings:
+            idf = math.log(1 + (self.doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            term_scores = {}
+            for doc, freq in zip(docs, freqs):
+                if scores is not None and doc not in scores:
+                    continue
+                length_norm = 1 - BM25_B + BM25_B * self._doc_lengths[doc] / self.average_doc_length
+                term_scores[doc] = idf * freq * (BM25_K1 + 1) / (freq + BM25_K1 * length_norm)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {doc: score + term_scores[doc] for doc, score in scores.items() if doc in term_scores}
+            if not scores:
+                return []
+
+        # Ties are returned in Bible order
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(self._doc_verse_ids[doc], score) for doc, score in ranked[offset : offset + limit]]
+
+    def highlight(self, text, query):
+        """
+        Returns the text with words matching the query surrounded with '**'
+        """
+        lexeme_ids = self.query_lexeme_ids(query) or set()
+        parts = []
+        position = 0
+        for start, end, word in tokenize(text):
+            if self.lexeme_id(word) in lexeme_ids:
+                parts.extend([text[position:start], "**", text[start:end], "**"])
+                position = end
+        parts.append(text[position:])
+        return "".join(parts)
+
+
+QUERY_LEXEME_CACHE_SIZE = 10000
+
+_query_lexeme_cache = LRUCache(QUERY_LEXEME_CACHE_SIZE)
+
+_loaded_indexes = {}  # filename: (mtime, TextSearchIndex)
+
+
+def get_text_search_index(version):
+    """
+    Returns the TextSearchIndex for a version, or None if one hasn't been built.
+    """
+    from .models import POSTGRES_SEARCH_CONFIGURATIONS
+
+    filename = text_search_index_file(version.slug)
+    try:
+        mtime = os.stat(filename).st_mtime
+    except FileNotFoundError:
+        return None
+    # Check mtime so that rebuilt indexes are picked up without restarting
+    loaded = _loaded_indexes.get(filename)
+    if loaded is None or loaded[0] != mtime:
+        loaded = (mtime, TextSearchIndex.load(filename, POSTGRES_SEARCH_CONFIGURATIONS[version.language_code]))
+        _loaded_indexes[filename] = loaded
+    return loaded[1]
+
+
+def local_text_search_available(version_slug):
+    return os.path.exists(text_search_index_file(version_slug))
+
+
+def search_local_index(version, words, page, page_size):
+    """
+    Search service (see services.py) using the local text search index.
+    """
+    from .models import VerseSearchResult
+
+    index = get_text_search_index(version)
+    results = index.search(words, limit=page_size + 1, offset=page * page_size)
+    more_results = len(results) > page_size
+    verse_ids = [verse_id for verse_id, _ in results[0:page_size]]
+    verses = version.verse_set.in_bulk(verse_ids)
+    verse_list = []
+    for verse_id in verse_ids:
+        verse = verses[verse_id]
+        verse.version = version
+        verse.highlighted_text = index.highlight(verse.text_saved, words)
+        verse_list.append(verse)
+    return [VerseSearchResult(v.localized_reference, [v]) for v in verse_list], more_results
@@ -0,0 +1,125 @@
+"""
+In-memory index of verse metadata for a TextVersion.
+
+Verse metadata (references, ordering, missing and merged verses) is static for
+a version, so we load it once per process and use it to answer questions like
+"which verses are in 'John 3:16-4:2'?" without database queries. Only the
+verse objects themselves (for the text) then need to be fetched.
+
+The index is invalidated when verses are edited (see hooks.py). To propagate
+this to other processes, we store a 'generation' token in the Django cache,
+which is checked when the index is used.
+"""
+
+import uuid
+from array import array
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .parsing import InvalidVerseReference
+
+_verse_indexes = {}
+
+
+class VerseIndex:
+    def __init__(self, rows, generation):
+        """
+        rows is a list of (id, localized_reference, missing, merged_into_id),
+        in bible_verse_number order.
+        """
+        self.generation = generation
+        self.ids = array("Q")
+        self.localized_references = []
+        self.missing = bytearray()
+        for verse_id, localized_reference, missing, _ in rows:
+            self.ids.append(verse_id)
+            self.localized_references.append(localized_reference)
+            self.missing.append(missing)
+        self._positions = {ref: i for i, ref in enumerate(self.localized_references)}
+        id_positions = {verse_id: i for i, verse_id in enumerate(self.ids)}
+        # Position of the verse this is merged into, or -1
+        self.merged_into = array(
+            "l", [-1 if merged_into_id is None else id_positions[merged_into_id] for *_, merged_into_id in rows]
+        )
+
+    @classmethod
+    def load(cls, version, generation):
+        rows = list(
+            version.verse_set.order_by("bible_verse_number").values_list(
+                "id", "localized_reference", "missing", "merged_into_id"
+            )
+        )
+        return cls(rows, generation)
+
+    def get_positions_for_range(self, ref_start, ref_end) -> list[int]:
+        """
+        For the range between two single verse references (inclusive),
+        returns the positions of the verses that have content, with
+        merged verses corrected.
+
+        Raises InvalidVerseReference if either end doesn't exist or the
+        range is in the wrong order.
+        """
+        # Missing verses are allowed at either end, so that we can do things
+        # like 'John 5:3-4' even if 'John 5:4' is missing in the current
+        # version. Merged verses are marked as missing, with `merged_into` set.
+        try:
+            start = self._positions[ref_start]
+        except KeyError:
+            raise InvalidVerseReference(f"Can't find  '{ref_start}'")
+        try:
+            end = self._positions[ref_end]
+        except KeyError:
+            raise InvalidVerseReference(f"Can't find  '{ref_end}'")
+        if end < start:
+            raise InvalidVerseReference(f"{ref_start} and {ref_end} are not in ascending order.")
+
+        retval = []
+        used = set()
+        for position in range(start, end + 1):
+            if self.merged_into[position] != -1:
+                real = self.merged_into[position]
+            elif self.missing[position]:
+                continue
+            else:
+                real = position
+            if real not in used:
+                retval.append(real)
+                used.add(real)
+        return retval
+
+    def get_ids(self, positions) -> list[int]:
+        return [self.ids[p] for p in positions]
+
+    def get_localized_references(self, positions) -> list[str]:
+        return [self.localized_references[p] for p in positions]
+
+
+def _generation_cache_key(version_id):
+    return f"bibleverses.verseindex.generation.{version_id}"
+
+
+def get_verse_index(version) -> VerseIndex:
+    generation = cache.get(_generation_cache_key(version.id))
+    index = _verse_indexes.get(version.id)
+    if index is None or index.generation != generation:
+        index = VerseIndex.load(version, generation)
+        _verse_indexes[version.id] = index
+    return index
+
+
+def invalidate_verse_index(version_id):
+    _verse_indexes.pop(version_id, None)
+
+    def new_generation():
+        cache.set(_generation_cache_key(version_id), uuid.uuid4().hex, None)
+
+    new_generation()
+    # Other processes might rebuild before we commit, so we need to do it
+    # again after commit.
+    transaction.on_commit(new_generation)
+
+
+def clear_verse_indexes():
+    _verse_indexes.clear()
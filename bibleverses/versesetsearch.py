@@ -0,0 +1,165 @@
+"""
+Searching for verse sets, used by the 'choose' page.
+
+A query is either a Bible reference, which is matched against the verses in
+the sets, or text, which is matched against the set name. To keep this fast as
+the number of sets grows, every kind of query is backed by an index (see the
+VerseSet and VerseChoice Meta classes):
+
+- text: a trigram index on UPPER(name), which is what `name__icontains`
+  compares against.
+- single verses and whole chapters: an index on VerseChoice.internal_reference,
+  which maps a reference to the sets that contain it.
+- passage ranges: an index on VerseSet.passage_id.
+
+The conditions for all the languages being searched are combined into a single
+filter, rather than one queryset per language, so that Postgres can use these
+indexes. Results are paged using keyset pagination on the popularity or age
+order, so later pages are as quick as the first, and no `count()` is needed.
+"""
+
+import dataclasses
+from collections import defaultdict
+from datetime import datetime
+from datetime import timezone as dt_timezone
+
+from django.db.models import Q
+
+from .parsing import InvalidVerseReference, parse_unvalidated_localized_reference
+
+ORDER_FIELDS = ["popularity", "date_added"]
+
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+def search_filter(language_codes, query, default_language_code=None):
+    """
+    Returns a Q object that matches VerseSets in the given languages (or any
+    language) that match `query`.
+    """
+    from .models import VerseChoice, VerseSetType, make_verse_set_passage_id
+
+    if not query:
+        return Q(language_code__in=language_codes) | Q(any_language=True)
+
+    # If we are searching multiple languages, but using a verse ref, we will
+    # need to parse the verse ref in the language that matches e.g.
+    # "Yarat 1:1" should parse to 'BOOK0 1:1', and we then search all
+    # VerseSets in all languages that match.
+    parsed_refs = {}
+    for language_code in language_codes:
+        # Does the query look like a Bible reference?
+        try:
+            parsed_ref = parse_unvalidated_localized_reference(
+                language_code, query, allow_whole_book=False, allow_whole_chapter=True
+            )
+        except InvalidVerseReference:
+            # For invalid verse references, it looks like a verse ref,
+            # but refers to something that doesn't exist e.g. "Gen 73:1".
+            # It should get no results.
+            continue
+        if parsed_ref is not None:
+            parsed_refs[language_code] = parsed_ref
+
+    if len(parsed_refs) == 0:
+        fallback_parsed_ref = None
+    else:
+        try:
+            fallback_parsed_ref = parsed_refs[default_language_code]
+        except KeyError:
+            # We have potentially multiple parsed references, none of them
+            # in the default language, and potentially all of them referring
+            # to different verses. Can't do much here so just pick one.
+            fallback_parsed_ref = list(parsed_refs.values())[0]
+
+    # Usually all the languages end up with the same condition, so we group
+    # them to keep the query simple.
+    languages_for_condition = defaultdict(list)
+    for language_code in language_codes:
+        parsed_ref = parsed_refs.get(language_code, fallback_parsed_ref)
+        if parsed_ref is None:
+            condition = ("name", query)
+        elif parsed_ref.start_verse is None:
+            # To find a whole chapter, look for sets containing first verse.
+            condition = ("chapter", dataclasses.replace(parsed_ref, start_verse=1).to_internal().canonical_form())
+        elif parsed_ref.get_start() != parsed_ref.get_end():
+            # Looks like passage ref:
+            condition = (
+                "passage",
+                make_verse_set_passage_id(parsed_ref.get_start().to_internal(), parsed_ref.get_end().to_internal()),
+            )
+        else:
+            condition = ("verse", parsed_ref.to_internal().canonical_form())
+        languages_for_condition[condition].append(language_code)
+
+    result = Q(pk__in=[])
+    for (kind, value), condition_language_codes in languages_for_condition.items():
+        if kind == "name":
+            q = Q(name__icontains=value)
+        elif kind == "passage":
+            q = Q(set_type=VerseSetType.PASSAGE, passage_id=value)
+        else:
+            q = Q(id__in=VerseChoice.objects.filter(internal_reference=value).values("verse_set_id"))
+            if kind == "chapter":
+                # Limit to only passage types, otherwise we'll get false
+                # positives for selection sets that contain other verses from
+                # that chapter.
+                q &= Q(set_type=VerseSetType.PASSAGE)
+            else:
+                q &= Q(set_type__in=[VerseSetType.SELECTION, VerseSetType.PASSAGE])
+        result |= (Q(language_code__in=condition_language_codes) | Q(any_language=True)) & q
+    return result
+
+
+def get_search_results_page(verse_sets, order_field, from_item, page_size, after=None):
+    """
+    Returns a list of verse sets from the `verse_sets` QuerySet, ordered by
+    `order_field` (one of ORDER_FIELDS) descending, for the page starting at
+    `from_item`. Up to page_size + 1 items are returned, so the caller can tell
+    whether there are more.
+
+    `after` is a (value, id) tuple for the last item of the previous page, if
+    known, which allows us to use keyset pagination instead of OFFSET.
+    """
+    assert order_field in ORDER_FIELDS
+    verse_sets = verse_sets.order_by(f"-{order_field}", "-id")
+    if after is not None:
+        after_value, after_id = after
+        # The first condition is redundant, but allows Postgres to start the
+        # index scan at the right place.
+        verse_sets = verse_sets.filter(**{f"{order_field}__lte": after_value}).filter(
+            Q(**{f"{order_field}__lt": after_value}) | Q(**{order_field: after_value, "id__lt": after_id})
+        )[: page_size + 1]
+    else:
+        verse_sets = verse_sets[from_item : from_item + page_size + 1]
+    return list(verse_sets)
+
+
+def format_after(verse_set, order_field):
+    """
+    Returns the value for the 'after' query parameter for the page following
+    `verse_set`.
+    """
+    value = getattr(verse_set, order_field)
+    if isinstance(value, datetime):
+        # Avoid '+' in the URL
+        value = value.astimezone(dt_timezone.utc).strftime(DATETIME_FORMAT)
+    return f"{value}:{verse_set.id}"
+
+
+def parse_after(after, order_field):
+    """
+    Parses an 'after' query parameter created by `format_after`, returning a
+    (value, id) tuple, or None if it is invalid.
+    """
+    if after is None:
+        return None
+    try:
+        value, verse_set_id = after.rsplit(":", 1)
+        if order_field == "date_added":
+            value = datetime.strptime(value, DATETIME_FORMAT).replace(tzinfo=dt_timezone.utc)
+        else:
+            value = int(value)
+        return value, int(verse_set_id)
+    except ValueError:
+        return None
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.27 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("events", "0015_alter_event_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="base_rank",
+            field=models.FloatField(default=0),
+        ),
+        # See Event.calculate_base_rank, EVENTSTREAM_TIME_DECAY_FACTOR = 43200
+        migrations.RunSQL(
+            "UPDATE events_event SET base_rank = LOG(2, weight) + EXTRACT(EPOCH FROM created) / 43200;",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(fields=["-base_rank"], name="event_base_rank"),
+        ),
+    ]
@@ -20,6 +20,10 @@ from learnscripture.utils.introspection import all_subclasses
 EVENTSTREAM_CUTOFF_DAYS = 3  # just 3 days of events
 EVENTSTREAM_CUTOFF_NUMBER = 8
 
+# Number of candidate events, chosen using Event.base_rank, that are ranked
+# for a specific viewer. See EventManager.for_dashboard
+EVENTSTREAM_CANDIDATE_NUMBER = 200
+
 # Arbitrarily say stuff is 50% less interesting when it is half a day old.
 HALF_LIFE_DAYS = 0.5
 EVENTSTREAM_TIME_DECAY_FACTOR = 3600 * 24 * HALF_LIFE_DAYS
@@ -424,15 +428,19 @@ class EventManager(models.Manager):
         if now is None:
             now = timezone.now()
 
+        # Ranking depends on the viewer, but only by a bounded factor (see
+        # Event.get_rank), so we only need to rank the events with the
+        # highest viewer-independent rank, which the DB can find using an
+        # index on Event.base_rank. This means the work done here doesn't
+        # grow with the total number of recent events.
         start = now - timedelta(EVENTSTREAM_CUTOFF_DAYS)
         events = (
             self.for_viewer(account)
             .filter(created__gte=start)
-            .select_related("account")
             .exclude(event_type=EventType.NEW_COMMENT, account=account)
-            .annotate(comment_count=models.Count("comments"))
+            .order_by("-base_rank")
         )
-        events = list(events)
+        events = list(events[:EVENTSTREAM_CANDIDATE_NUMBER])
         # Avoid repeated messages. Events with the same event type, account id
         # and data will produce the same message.
         events = list(
@@ -455,6 +463,7 @@ class EventManager(models.Manager):
 
         # Limit
         events = events[:EVENTSTREAM_CUTOFF_NUMBER]
+        add_comment_counts(events)
         # Now sort by time
         events.sort(key=lambda e: e.created, reverse=True)
         return events
@@ -511,14 +520,40 @@ class Event(models.Model):
     # Denormalized value
     url = models.CharField(max_length=255, blank=True)
 
+    # Viewer-independent rank, see `calculate_base_rank`.
+    base_rank = models.FloatField(default=0)
+
     objects = EventManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["-base_rank"], name="event_base_rank"),
+        ]
+
     def __repr__(self):
         return f"<Event id={self.id} type={self.event_type}>"
 
     def __str__(self):
         return f"Event {self.id}"
 
+    def save(self, *args, **kwargs):
+        self.base_rank = self.calculate_base_rank()
+        super().save(*args, **kwargs)
+
+    def calculate_base_rank(self):
+        """
+        Returns a rank for the event that doesn't depend on the viewer or the
+        current time.
+        """
+        # Ignoring affinity, get_rank() returns:
+        #
+        #   weight * 2 ** (-(now - created) / EVENTSTREAM_TIME_DECAY_FACTOR)
+        #
+        # The log of this is `base_rank - now / EVENTSTREAM_TIME_DECAY_FACTOR`,
+        # so ordering by base_rank gives the same order at any time `now`, and
+        # we never need to update it.
+        return math.log2(self.weight) + self.created.timestamp() / EVENTSTREAM_TIME_DECAY_FACTOR
+
     def get_rank(self, viewer=None, friendship_weights=None, group_ids=None, now=None):
         """
         Returns the overall weighting for this event, given the viewing account.
@@ -621,6 +656,23 @@ class Event(models.Model):
         return self.comments.all().order_by("created").select_related("author")
 
 
+def add_comment_counts(events):
+    """
+    Sets `comment_count` on a list of events
+    """
+    from comments.models import Comment
+
+    counts = dict(
+        Comment.objects.filter(event__in=events)
+        .order_by()
+        .values("event_id")
+        .annotate(count=models.Count("id"))
+        .values_list("event_id", "count")
+    )
+    for event in events:
+        event.comment_count = counts.get(event.id, 0)
+
+
 def get_absolute_url_for_event_comment(event, comment_id):
     return event.get_absolute_url() + f"#comment-{comment_id}"
 
@@ -1,6 +1,8 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 
-from .models import Invitation, Membership
+import accounts.tasks
+
+from .models import Group, Invitation, Membership
 from .signals import group_joined, invitation_created
 
 
@@ -22,5 +24,49 @@ def invitation_post_save_handler(sender, **kwargs):
         invitation_created.send(sender=kwargs["instance"])
 
 
+# FriendshipWeight depends on groups that count for friendships, so it needs
+# updating when `count_for_friendships` changes or a group is deleted. (Changes
+# to membership are handled by Group.add_user/remove_user).
+
+
+def group_pre_save_handler(sender, **kwargs):
+    if kwargs.get("raw", False):
+        return
+
+    instance = kwargs["instance"]
+    if instance.pk is None:
+        return
+    old_value = Group.objects.filter(pk=instance.pk).values_list("count_for_friendships", flat=True).first()
+    instance._count_for_friendships_changed = old_value is not None and old_value != instance.count_for_friendships
+
+
+def group_post_save_handler(sender, **kwargs):
+    if kwargs.get("raw", False):
+        return
+
+    instance = kwargs["instance"]
+    if getattr(instance, "_count_for_friendships_changed", False):
+        instance._count_for_friendships_changed = False
+        instance.update_friendship_weights(force=True)
+
+
+def group_pre_delete_handler(sender, **kwargs):
+    # Memberships are deleted before post_delete, so we have to get the
+    # members now.
+    instance = kwargs["instance"]
+    if instance.count_for_friendships:
+        instance._friendship_account_ids = list(instance.memberships.values_list("account_id", flat=True))
+
+
+def group_post_delete_handler(sender, **kwargs):
+    account_ids = getattr(kwargs["instance"], "_friendship_account_ids", None)
+    if account_ids:
+        accounts.tasks.update_friendship_weights.apply_async([account_ids])
+
+
 post_save.connect(membership_post_save_handler, sender=Membership)
 post_save.connect(invitation_post_save_handler, sender=Invitation)
+pre_save.connect(group_pre_save_handler, sender=Group)
+post_save.connect(group_post_save_handler, sender=Group)
+pre_delete.connect(group_pre_delete_handler, sender=Group)
+post_delete.connect(group_post_delete_handler, sender=Group)
@@ -5,7 +5,8 @@ from django.db.models import Count
 from django.urls import reverse
 from django.utils import timezone
 
-from accounts.models import Account, clear_friendship_weight_cache
+import accounts.tasks
+from accounts.models import Account
 from common.utils.html import link
 from learnscripture.ftl_bundles import t_lazy
 
@@ -92,14 +93,24 @@ class Group(models.Model):
         return account == self.created_by
 
     def add_user(self, account):
-        self.memberships.get_or_create(account=account)
-        for acc in self.members.all():
-            clear_friendship_weight_cache(acc.id)
+        _, created = self.memberships.get_or_create(account=account)
+        if created:
+            self.update_friendship_weights()
 
     def remove_user(self, account):
-        self.memberships.filter(account=account).delete()
-        for acc in list(self.members.all()) + [account]:
-            clear_friendship_weight_cache(acc.id)
+        deleted, _ = self.memberships.filter(account=account).delete()
+        if deleted:
+            self.update_friendship_weights(extra_account_ids=[account.id])
+
+    def update_friendship_weights(self, extra_account_ids=(), force=False):
+        # Group size affects the weights of all members, which could be a lot
+        # for a big group, so this is done in the background. `force` is for
+        # when `count_for_friendships` has just been changed.
+        if not (self.count_for_friendships or force):
+            return
+        account_ids = list(self.memberships.values_list("account_id", flat=True)) + list(extra_account_ids)
+        if account_ids:
+            accounts.tasks.update_friendship_weights.apply_async([account_ids])
 
     def invited_users(self):
         return [i.account for i in self.invitations.select_related("account")]
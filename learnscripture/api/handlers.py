@@ -8,6 +8,7 @@ of cleaning up if clients other than the web app were to use it.
 import csv
 import datetime
 import json
+from dataclasses import dataclass
 from datetime import date, timedelta
 from io import StringIO
 
@@ -29,7 +30,6 @@ from bibleverses.models import (
     InvalidVerseReference,
     StageType,
     TextVersion,
-    UserVerseStatus,
     VerseSetType,
     make_verse_set_passage_id,
     quick_find,
@@ -39,7 +39,7 @@ from learnscripture.decorators import require_identity_method
 from learnscripture.ftl_bundles import t
 from learnscripture.utils.templates import render_to_string_ftl
 from learnscripture.views import bible_versions_for_request, todays_stats, verse_sets_visible_for_request
-from scores.models import get_verses_started_per_day, get_verses_tested_per_day
+from scores.dailystats import get_identity_daily_stats
 
 
 class rc_factory:
@@ -245,39 +245,19 @@ class ActionCompleteHandler(ApiView):
         else:
             accuracy = None
 
-        # Retrieve UVS
-        try:
-            uvs = request.identity.verse_statuses.get(id=uvs_id)
-        except (KeyError, UserVerseStatus.DoesNotExist):
-            return rc.BAD_REQUEST("valid verse_status id/uvs_id for user required")
-
-        # Apply actions
-
         # If just practising, just remove the VS from the session.
         if practice:
+            if not identity.verse_statuses.filter(id=uvs_id).exists():
+                return rc.BAD_REQUEST("valid verse_status id/uvs_id for user required")
             session.verse_status_finished(request, uvs_id, [])
             return {}
 
-        old_memory_stage = uvs.memory_stage
-
         # TODO: ideally store StageComplete
 
-        # TODO: combine record_verse_action and award_action_points
-        action_change = identity.record_verse_action(uvs.localized_reference, uvs.version.slug, stage, accuracy)
-
-        if action_change is None:
-            # implies client error
-            return rc.BAD_REQUEST("action_change required")
-
-        action_logs = identity.award_action_points(
-            uvs.localized_reference,
-            uvs.version.language_code,
-            uvs.scoring_text,
-            old_memory_stage,
-            action_change,
-            stage,
-            accuracy,
-        )
+        result = identity.complete_verse_action(uvs_id, stage, accuracy)
+        if result is None:
+            return rc.BAD_REQUEST("valid verse_status id/uvs_id for user required")
+        _, action_logs = result
 
         if stage == StageType.TEST or (stage == StageType.READ and not needs_testing):
             session.verse_status_finished(request, uvs_id, action_logs)
@@ -285,6 +265,102 @@ class ActionCompleteHandler(ApiView):
         return {}
 
 
+MAX_ACTION_BATCH_SIZE = 100
+
+ACTION_LOG_FIELDS = [
+    "id",  # used for uniqueness tests
+    "points",
+    "reason",
+    "created",
+]
+
+
+class ActionCompleteBatchHandler(ApiView):
+    """
+    Records a list of results, as for ActionCompleteHandler, e.g. for results
+    that were queued while offline.
+
+    POST param 'results' is a JSON list of objects with keys 'uvs_id',
+    'uvs_needs_testing', 'stage', 'accuracy' (for tests), 'practice'
+    (optional) and 'timestamp' (milliseconds since epoch).
+    """
+
+    @require_preexisting_identity_m
+    def post(self, request):
+        identity: Identity = request.identity
+        try:
+            results = [parse_action_result(item) for item in json.loads(request.POST["results"])]
+        except (KeyError, ValueError, TypeError, OverflowError, OSError):
+            # OverflowError and OSError come from out of range numbers, e.g.
+            # for timestamps.
+            return rc.BAD_REQUEST("results required, as list of uvs_id, uvs_needs_testing, stage, accuracy, timestamp")
+        if len(results) > MAX_ACTION_BATCH_SIZE:
+            return rc.BAD_REQUEST(f"Maximum of {MAX_ACTION_BATCH_SIZE} results allowed")
+
+        practice_uvs_ids = set(
+            identity.verse_statuses.filter(id__in=[r.uvs_id for r in results if r.practice]).values_list(
+                "id", flat=True
+            )
+        )
+        completed = iter(
+            identity.complete_verse_actions(
+                [(r.uvs_id, r.stage, r.accuracy, r.timestamp) for r in results if not r.practice]
+            )
+        )
+
+        output = []
+        finished = []
+        for r in results:
+            if r.practice:
+                recorded = r.uvs_id in practice_uvs_ids
+                action_logs = []
+            else:
+                result = next(completed)
+                recorded = result is not None
+                action_logs = result[1] if recorded else []
+            if recorded and (r.practice or r.stage == StageType.TEST or not r.needs_testing):
+                finished.append((r.uvs_id, action_logs))
+            output.append(
+                {
+                    "uvs_id": r.uvs_id,
+                    "recorded": recorded,
+                    "action_logs": make_serializable(action_logs, ACTION_LOG_FIELDS),
+                }
+            )
+
+        # One update of the session for all results
+        session.verse_statuses_finished(request, finished)
+        return {"results": output}
+
+
+@dataclass
+class ActionResult:
+    uvs_id: int
+    needs_testing: bool
+    practice: bool
+    stage: StageType
+    accuracy: float | None
+    timestamp: datetime.datetime
+
+
+def parse_json_bool(value):
+    if not isinstance(value, bool):
+        raise TypeError(f"Expected true or false, got {value!r}")
+    return value
+
+
+def parse_action_result(item):
+    stage = StageType(item["stage"])
+    return ActionResult(
+        uvs_id=int(item["uvs_id"]),
+        needs_testing=parse_json_bool(item["uvs_needs_testing"]),
+        practice=parse_json_bool(item.get("practice", False)),
+        stage=stage,
+        accuracy=float(item["accuracy"]) if stage == StageType.TEST else None,
+        timestamp=datetime.datetime.fromtimestamp(int(item["timestamp"]) / 1000, tz=datetime.timezone.utc),
+    )
+
+
 class SkipVerseHandler(ApiView):
     @require_preexisting_identity_m
     def post(self, request):
@@ -377,12 +453,7 @@ class SessionStats(ApiView):
 
 
 class ActionLogs(ApiView):
-    fields = [
-        "id",  # used for uniqueness tests
-        "points",
-        "reason",
-        "created",
-    ]
+    fields = ACTION_LOG_FIELDS
 
     def get(self, request):
         if not hasattr(request, "identity"):
@@ -522,10 +593,7 @@ class UserTimelineStats(ApiView):
             raise Http404
         account = get_object_or_404(Account.objects.active().filter(username=username))
         identity = account.identity
-        started = get_verses_started_per_day(identity.id)
-        tested = get_verses_tested_per_day(account.id)
-
-        rows = combine_timeline_stats(started, tested)
+        rows = get_timeline_stats(identity.id)
 
         # Add 'Combined' column
         rows2 = []
@@ -581,32 +649,9 @@ class UserTimelineStats(ApiView):
         }
 
 
-def combine_timeline_stats(*statslists):
-    # Each item in statslists is a sorted list containing a date object as first
-    # item, and some other number as a second item. We zip together, based on
-    # equality of dates, and supplying zero for missing items in any lists.
-    retval = []
-    num_lists = len(statslists)
-    positions = [0] * num_lists  # current position in each of statslists
-    statslist_r = list(range(0, num_lists))
-    statslist_lengths = list(map(len, statslists))
-
-    # Modify statslists to make end condition easier to handler
-    for i in statslist_r:
-        statslists[i].append((None, None))
-
-    while any(positions[i] < statslist_lengths[i] for i in statslist_r):
-        next_rows = [statslists[i][positions[i]] for i in statslist_r]
-        next_dt_vals = [r[0] for r in next_rows if r[0] is not None]
-        next_dt = min(next_dt_vals)
-        rec = [0] * num_lists
-        for i in statslist_r:
-            dt, val = next_rows[i]
-            if dt == next_dt:
-                rec[i] = val
-                positions[i] += 1
-        rec.insert(0, next_dt)
-        retval.append(rec)
+def get_timeline_stats(identity_id):
+    # Returns a list of rows containing date, verses started, verses tested
+    retval = get_identity_daily_stats(identity_id)
 
     # Some things (calculating streaks client side) work correctly only if we
     # make sure that the data goes right up to today, or ends with a zero if it
@@ -616,6 +661,6 @@ def combine_timeline_stats(*statslists):
         last_date = retval[-1][0]
         if last_date < today:
             next_day = last_date + timedelta(days=1)
-            retval.append(tuple([next_day] + [0 for s in statslists]))
+            retval.append((next_day, 0, 0))
 
     return retval
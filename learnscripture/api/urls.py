@@ -11,6 +11,11 @@ urlpatterns = [
     path("versestolearn2/", handlers.VersesToLearnHandler.as_view(), name="learnscripture.api.versestolearn2"),
     path("versestolearn/", handlers.VersesToLearnHandler.as_view(), name="learnscripture.api.versestolearn"),
     path("actioncomplete/", handlers.ActionCompleteHandler.as_view(), name="learnscripture.api.actioncomplete"),
+    path(
+        "actioncompletebatch/",
+        handlers.ActionCompleteBatchHandler.as_view(),
+        name="learnscripture.api.actioncompletebatch",
+    ),
     path("setpreferences/", handlers.SetPreferences.as_view(), name="learnscripture.api.setpreferences"),
     path("sessionstats/", handlers.SessionStats.as_view(), name="learnscripture.api.sessionstats"),
     path("skipverse/", handlers.SkipVerseHandler.as_view(), name="learnscripture.api.skipverse"),
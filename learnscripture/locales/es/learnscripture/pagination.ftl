@@ -10,3 +10,7 @@ pagination-jump-to-top = Volver arriba
 # $shown is the number of results shown so far,
 # $total is the total number of results.
 pagination-showing-shown-of-total = Mostrando { $shown } de { $total }
+
+# Displayed in paging area under a list of results, when the total is not known.
+# $shown is the number of results shown so far.
+pagination-showing-shown = Mostrando { $shown }
@@ -10,3 +10,7 @@ pagination-jump-to-top = Ga naar begin
 # $shown is the number of results shown so far,
 # $total is the total number of results.
 pagination-showing-shown-of-total = { $shown } van de { $total } resultaten getoond
+
+# Displayed in paging area under a list of results, when the total is not known.
+# $shown is the number of results shown so far.
+pagination-showing-shown = { $shown } resultaten getoond
@@ -0,0 +1,106 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import Account
+from bibleverses import versesetsearch
+from bibleverses.languages import LANG
+from bibleverses.models import VerseSet, VerseSetType
+
+QUERIES = [
+    ("reference", "John 3:16"),
+    ("chapter", "Psalm 23"),
+    ("range", "Psalm 23:1-3"),
+    ("text", "love"),
+]
+
+PAGE_SIZE = 10
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure query count and time for verse set searches (reference, chapter, range and text), "
+        "for the first page and a later page. Use --extra-sets to add generated public sets, "
+        "to check that timings don't grow with the number of sets. Changes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--extra-sets", type=int, default=0, help="Number of generated sets to add")
+        parser.add_argument("--order", choices=versesetsearch.ORDER_FIELDS, default="popularity")
+        parser.add_argument("--page", type=int, default=5, help="Later page to measure, as well as the first")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options["extra_sets"]:
+                self.create_sets(options["extra_sets"])
+            self.stdout.write(f"{VerseSet.objects.public().count()} public verse sets")
+            for name, query in QUERIES:
+                self.benchmark(name, query, options["order"], options["page"], options["repeat"])
+            transaction.set_rollback(True)
+
+    def create_sets(self, count):
+        account = Account.objects.order_by("id").first()
+        with connection.cursor() as cursor:
+            # Raw SQL so that this is quick for big numbers. Half are
+            # selections, half passages, with a spread of popularity and
+            # verses, some of which match the benchmark queries.
+            cursor.execute(
+                """
+                INSERT INTO bibleverses_verseset
+                  (name, slug, description, additional_info, set_type, public, breaks, popularity,
+                   date_added, created_by_id, passage_id, language_code, any_language)
+                SELECT 'Benchmark set ' || i || CASE WHEN i %% 10 = 0 THEN ' - love' ELSE '' END,
+                       'benchmark-set-' || i, '', '',
+                       CASE WHEN i %% 2 = 0 THEN %(selection)s ELSE %(passage)s END,
+                       true, '', i %% 1000, NOW() - i * INTERVAL '1 minute', %(account_id)s,
+                       '', 'en', false
+                FROM generate_series(1, %(count)s) AS i;
+
+                INSERT INTO bibleverses_versechoice (internal_reference, verse_set_id, set_order)
+                SELECT 'BOOK' || (vs.id %% 66) || ' ' || (vs.id %% 20 + 1) || ':' || v, vs.id, v
+                FROM bibleverses_verseset vs, generate_series(1, 5) AS v
+                WHERE vs.slug LIKE 'benchmark-set-%%';
+                """,
+                dict(
+                    count=count,
+                    account_id=account.id,
+                    selection=VerseSetType.SELECTION,
+                    passage=VerseSetType.PASSAGE,
+                ),
+            )
+            cursor.execute("ANALYZE bibleverses_verseset; ANALYZE bibleverses_versechoice;")
+
+    def benchmark(self, name, query, order_field, page, repeat):
+        def search(after=None):
+            verse_sets = VerseSet.objects.public().search([LANG.EN], query)
+            return versesetsearch.get_search_results_page(verse_sets, order_field, 0, PAGE_SIZE, after=after)
+
+        # Find the 'after' value for the later page, using keyset pagination
+        # like the 'choose' page.
+        after = None
+        page_number = 1
+        for _ in range(page - 1):
+            results = search(after=after)
+            if len(results) <= PAGE_SIZE:
+                break
+            after = versesetsearch.parse_after(
+                versesetsearch.format_after(results[PAGE_SIZE - 1], order_field), order_field
+            )
+            page_number += 1
+
+        for page_name, page_after in [("page 1", None), (f"page {page_number}", after)]:
+            timings = []
+            query_counts = []
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    search(after=page_after)
+                    timings.append(time.perf_counter() - start)
+                query_counts.append(len(queries))
+            self.stdout.write(
+                f"{name} ({query!r}), {page_name}: {min(query_counts)} queries, "
+                f"best {min(timings) * 1000:.1f}ms, mean {sum(timings) / len(timings) * 1000:.1f}ms"
+            )
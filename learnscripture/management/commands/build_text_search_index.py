@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Build the local text search index for Bible versions (see bibleverses.textsearch)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("version_slug", nargs="*")
+
+    def handle(self, *args, **options):
+        from bibleverses.models import TextType, TextVersion
+        from bibleverses.services import get_external_search_service
+        from bibleverses.textsearch import build_text_search_index
+
+        versions = TextVersion.objects.filter(text_type=TextType.BIBLE)
+        if options["version_slug"]:
+            versions = versions.filter(slug__in=options["version_slug"])
+        for version in versions:
+            if get_external_search_service(version.slug) is not None:
+                self.stdout.write(f"Skipping {version.slug}, which uses an external search service")
+                continue
+            filename = build_text_search_index(version)
+            self.stdout.write(f"Built {filename}")
@@ -0,0 +1,25 @@
+import logging
+import sys
+
+from django.core.management.base import BaseCommand
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    def handle(self, *args, **options):
+        try:
+            from datetime import timedelta
+
+            from django.conf import settings
+            from django.utils import timezone
+
+            from learnscripture.models import LearningSession
+
+            # Once the Django session has expired, the LearningSession can't be
+            # reached.
+            LearningSession.objects.filter(
+                started__lt=timezone.now() - timedelta(seconds=settings.SESSION_COOKIE_AGE)
+            ).delete()
+        except Exception:
+            logger.error("Couldn't clean old learning sessions", exc_info=sys.exc_info())
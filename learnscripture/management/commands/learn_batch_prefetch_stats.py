@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Print hit ratio and build time metrics for learn page batch prefetching"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Reset the metrics after printing them")
+
+    def handle(self, *args, **options):
+        from learnscripture import prefetch
+
+        metrics = prefetch.get_metrics()
+        for name, value in metrics.items():
+            if value is None:
+                value = "-"
+            elif isinstance(value, float):
+                value = f"{value:.3f}"
+            self.stdout.write(f"{name}: {value}")
+        if options["reset"]:
+            prefetch.reset_metrics()
@@ -19,6 +19,7 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         from bibleverses.models import TextType
+        from bibleverses.verseindex import invalidate_verse_index
 
         settings.LOADING_VERSES = True
 
@@ -57,3 +58,4 @@ class Command(BaseCommand):
                 if version.text_type == TextType.BIBLE:
                     print("Generating search index...")
                     version.update_text_search(version.verse_set.all())
+                    invalidate_verse_index(version.id)
@@ -15,6 +15,12 @@ class Command(BaseCommand):
             default=False,
             help="If supplied, suggestions will be created even if already existing",
         )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=1,
+            help="Number of worker processes to use for generating Bible suggestions in parallel",
+        )
 
     def handle(self, *args, **options):
         from bibleverses.models import TextVersion
@@ -28,4 +34,4 @@ class Command(BaseCommand):
             versions = versions.filter(slug__in=slugs)
         for v in versions:
             logger.info("Generating suggestions for %s", v.slug)
-            generate_suggestions(v, missing_only=not options["recreate"])
+            generate_suggestions(v, missing_only=not options["recreate"], jobs=options["jobs"])
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.27 on 2026-10-18 11:20
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0036_learningstreak"),
+        ("learnscripture", "0004_alter_sitenotice_language_code"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LearningSession",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("learning_type", models.CharField(max_length=20)),
+                ("return_to", models.CharField(max_length=255)),
+                ("started", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "uvs_ids",
+                    django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), size=None),
+                ),
+                (
+                    "needs_testing_overrides",
+                    django.contrib.postgres.fields.ArrayField(base_field=models.BooleanField(null=True), size=None),
+                ),
+                ("position", models.IntegerField(default=0)),
+                (
+                    "untested_order_vals",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.IntegerField(), default=list, size=None
+                    ),
+                ),
+                (
+                    "action_log_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.BigIntegerField(), default=list, size=None
+                    ),
+                ),
+                (
+                    "identity",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="learning_sessions",
+                        to="accounts.identity",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
 from django.utils import timezone
 
@@ -22,3 +23,38 @@ class SiteNotice(models.Model):
 
     def __str__(self):
         return self.message_html
+
+
+class LearningSession(models.Model):
+    """
+    The queue of verses for a learning session. See learnscripture.session.
+    """
+
+    identity = models.ForeignKey("accounts.Identity", on_delete=models.CASCADE, related_name="learning_sessions")
+    learning_type = models.CharField(max_length=20)
+    return_to = models.CharField(max_length=255)
+    started = models.DateTimeField(default=timezone.now)
+
+    # The queue is stored as parallel arrays, where the index into the arrays
+    # is the 'learn order' used by the front end.
+    uvs_ids = ArrayField(models.BigIntegerField())
+    needs_testing_overrides = ArrayField(models.BooleanField(null=True))
+    # Cursor - items before this index have been finished, skipped or
+    # cancelled, so we never need to rewrite the arrays.
+    position = models.IntegerField(default=0)
+
+    untested_order_vals = ArrayField(models.IntegerField(), default=list)
+    action_log_ids = ArrayField(models.BigIntegerField(), default=list)
+
+    def __str__(self):
+        return f"{self.identity_id} {self.learning_type} {self.started}"
+
+    def remaining(self):
+        """
+        Returns a list of (order, uvs_id, needs_testing_override) tuples for
+        the items still to be done
+        """
+        return [
+            (order, self.uvs_ids[order], self.needs_testing_overrides[order])
+            for order in range(self.position, len(self.uvs_ids))
+        ]
@@ -0,0 +1,112 @@
+"""
+Prefetching of verse texts and prompt lists for the learn page.
+
+The learn page loads verses in batches (see session.get_verse_statuses_batch).
+Getting the text and prompt list for each verse needs queries against the
+main DB and the word suggestions DB, and the client has to wait for this every
+time it runs out of verses. So when we serve one batch, we queue a task that
+builds this data for the next batch and puts it in the cache, and the next
+request just reads it.
+
+Only data that depends on the version and reference is cached, not anything
+from the UserVerseStatus itself (strength, memory stage etc.), because those
+can change between batches.
+
+Hit/miss counts and build times are recorded in the cache, see `get_metrics`
+and the `learn_batch_prefetch_stats` command.
+"""
+
+import time
+from hashlib import sha1
+
+from django.core.cache import cache
+
+from accounts.models import add_verse_status_texts
+from bibleverses.models import UserVerseStatus
+
+PREFETCH_TIMEOUT = 600  # seconds
+
+PREFETCHED_ATTRIBUTES = ["text", "scoring_text", "suggestion_text", "title_text", "prompt_list"]
+
+METRICS_TIMEOUT = None  # forever
+METRICS = ["hits", "misses", "builds", "build_time_ms"]
+
+
+def _cache_key(uvs):
+    ref_hash = sha1(uvs.localized_reference.encode("utf-8")).hexdigest()
+    return f"learnscripture.prefetch.{uvs.version_id}.{ref_hash}"
+
+
+def _metric_key(name):
+    return f"learnscripture.prefetch.metrics.{name}"
+
+
+def apply_prefetched(uvs_list):
+    """
+    Sets prefetched attributes on the UserVerseStatus objects, where we have
+    them, and returns a list of the ones that were not found.
+    """
+    if not uvs_list:
+        return []
+    found = cache.get_many([_cache_key(uvs) for uvs in uvs_list])
+    missing = []
+    for uvs in uvs_list:
+        data = found.get(_cache_key(uvs), None)
+        if data is None:
+            missing.append(uvs)
+            continue
+        for attr, value in data.items():
+            setattr(uvs, attr, value)
+    _incr_metric("hits", len(uvs_list) - len(missing))
+    _incr_metric("misses", len(missing))
+    return missing
+
+
+def prefetch(identity_id, uvs_ids):
+    """
+    Builds the data for the given UserVerseStatus ids and stores it in the cache.
+    """
+    start = time.monotonic()
+    uvs_list = list(
+        UserVerseStatus.objects.filter(for_identity_id=identity_id, id__in=uvs_ids).select_related("version")
+    )
+    # Skip ones we already have
+    existing = cache.get_many([_cache_key(uvs) for uvs in uvs_list])
+    uvs_list = [uvs for uvs in uvs_list if _cache_key(uvs) not in existing]
+    if not uvs_list:
+        return
+    add_verse_status_texts(uvs_list)
+    cache.set_many(
+        {
+            _cache_key(uvs): {attr: getattr(uvs, attr) for attr in PREFETCHED_ATTRIBUTES if attr in uvs.__dict__}
+            for uvs in uvs_list
+        },
+        PREFETCH_TIMEOUT,
+    )
+    _incr_metric("builds", 1)
+    _incr_metric("build_time_ms", round((time.monotonic() - start) * 1000))
+
+
+def _incr_metric(name, delta):
+    if delta == 0:
+        return
+    key = _metric_key(name)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Missing key. There is a race condition here, but we don't need
+        # perfect accuracy.
+        cache.add(key, delta, METRICS_TIMEOUT)
+
+
+def get_metrics():
+    values = cache.get_many([_metric_key(name) for name in METRICS])
+    metrics = {name: values.get(_metric_key(name), 0) for name in METRICS}
+    lookups = metrics["hits"] + metrics["misses"]
+    metrics["hit_ratio"] = metrics["hits"] / lookups if lookups else None
+    metrics["mean_build_time_ms"] = metrics["build_time_ms"] / metrics["builds"] if metrics["builds"] else None
+    return metrics
+
+
+def reset_metrics():
+    cache.delete_many([_metric_key(name) for name in METRICS])
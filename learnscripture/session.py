@@ -1,12 +1,17 @@
 from dataclasses import dataclass
 from datetime import datetime
 
-from django.db.models import TextChoices
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import BigIntegerField, Case, F, Func, IntegerField, TextChoices, Value, When
+from django.db.models.functions import Cast, Greatest
 from django.urls import reverse
 from django.utils import timezone
 
 from accounts.models import Account, Identity, UserVerseStatus
 from bibleverses.models import MemoryStage
+from learnscripture import prefetch
+from learnscripture.models import LearningSession
+from learnscripture.tasks import prefetch_verse_statuses
 
 LANGUAGE_SESSION_KEY = "_language"
 
@@ -19,15 +24,22 @@ class LearningType(TextChoices):
     PRACTICE = "PRACTICE", "Practice"
 
 
-# In the session we store a list of verses to look at.
+# For a learning session we store a list of verses to look at.
 #
 # We store the order the verses should be looked at (which allows us to remove
 # items from the list without confusion).
 #
-# We use the tuple (localized_reference, verse_set_id) as an ID.  We need VerseSet ID
-# because we treat verses differently if they are part of a passage. By avoiding
-# the specific UserVerseStatus id, we can cope with a change of version more
-# easily.
+# The list is kept in a LearningSession row, with just its id in the Django
+# session. Finishing or skipping a verse only moves the LearningSession.position
+# cursor forward, so long sessions don't have to re-serialize the whole queue
+# on every API call.
+#
+# Sessions started before LearningSession existed kept the list in the Django
+# session, under 'verses_to_learn', as (order, uvs_id, needs_testing_override)
+# tuples. These are converted when first used.
+
+LEARNING_SESSION_KEY = "learning_session_id"
+OLD_LEARNING_SESSION_KEYS = ["verses_to_learn", "untested_order_vals", "action_logs", "learning_type", "return_to"]
 
 # Batch for verse statuses to avoid really long JSON which can get truncated.
 # See also Learn.elm
@@ -44,13 +56,18 @@ class VerseStatusBatch:
 
 
 def get_verse_statuses_batch(request):
-    learning_type = request.session.get("learning_type", None)
-    untested_order_vals = request.session.get("untested_order_vals", [])
-
-    id_data = _get_verse_status_ids(request)
-
-    if len(id_data) > 0:
-        max_order_val = max(order for order, uvs_id, n in id_data)
+    learning_session = _get_learning_session(request)
+    if learning_session is None:
+        return VerseStatusBatch(
+            verse_statuses=[],
+            max_order_val=None,
+            learning_type=None,
+            return_to=reverse("dashboard"),
+            untested_order_vals=[],
+        )
+
+    if learning_session.position < len(learning_session.uvs_ids):
+        max_order_val = len(learning_session.uvs_ids) - 1
     else:
         max_order_val = None
 
@@ -62,15 +79,25 @@ def get_verse_statuses_batch(request):
     else:
         seen_ids = set()
 
-    id_batch = [(order, uvs_id, n) for order, uvs_id, n in id_data if uvs_id not in seen_ids]
-
-    # Batching:
-    id_batch = id_batch[:VERSE_STATUS_BATCH_SIZE]
+    # Batching, reading forward from the cursor. We also get the batch after,
+    # so that it can be prefetched.
+    id_batch = []
+    for order in range(learning_session.position, len(learning_session.uvs_ids)):
+        uvs_id = learning_session.uvs_ids[order]
+        if uvs_id in seen_ids:
+            continue
+        id_batch.append((order, uvs_id, learning_session.needs_testing_overrides[order]))
+        if len(id_batch) >= VERSE_STATUS_BATCH_SIZE * 2:
+            break
+    id_batch, next_id_batch = id_batch[:VERSE_STATUS_BATCH_SIZE], id_batch[VERSE_STATUS_BATCH_SIZE:]
 
     bulk_ids = [uvs_id for order, uvs_id, needs_testing_override in id_batch]
-    uvs_dict = request.identity.get_verse_statuses_bulk(bulk_ids)
+    uvs_dict = request.identity.get_verse_statuses_bulk(bulk_ids, prefetched=prefetch.apply_prefetched)
+    if next_id_batch:
+        prefetch_verse_statuses.apply_async(
+            [request.identity.id, [uvs_id for order, uvs_id, needs_testing_override in next_id_batch]]
+        )
     retval = []
-    return_to = request.session.get("return_to", reverse("dashboard"))
     for order, uvs_id, needs_testing_override in id_batch:
         try:
             uvs = uvs_dict[uvs_id]
@@ -85,18 +112,59 @@ def get_verse_statuses_batch(request):
     return VerseStatusBatch(
         verse_statuses=retval,
         max_order_val=max_order_val,
-        learning_type=learning_type,
-        return_to=return_to,
-        untested_order_vals=untested_order_vals,
+        learning_type=learning_session.learning_type,
+        return_to=learning_session.return_to,
+        untested_order_vals=learning_session.untested_order_vals,
     )
 
 
-def _get_verse_status_ids(request):
-    return request.session.get("verses_to_learn", [])
+def _get_learning_session(request):
+    if hasattr(request, "_learning_session"):
+        return request._learning_session
+    learning_session = None
+    learning_session_id = request.session.get(LEARNING_SESSION_KEY, None)
+    if learning_session_id is not None:
+        learning_session = LearningSession.objects.filter(
+            id=learning_session_id, identity=getattr(request, "identity", None)
+        ).first()
+    elif "verses_to_learn" in request.session:
+        learning_session = _convert_old_learning_session(request)
+    request._learning_session = learning_session
+    return learning_session
+
+
+def _convert_old_learning_session(request):
+    identity = getattr(request, "identity", None)
+    if identity is None:
+        return None
+    data = request.session["verses_to_learn"]
+    # Items are only ever removed from the front of the list, so the orders
+    # that remain are contiguous. We pad the start of the arrays so that the
+    # index is still the order.
+    position = data[0][0] if data else 0
+    learning_session = LearningSession.objects.create(
+        identity=identity,
+        learning_type=request.session.get("learning_type", None) or LearningType.PRACTICE,
+        return_to=request.session.get("return_to", reverse("dashboard")),
+        started=get_learning_session_start(request) or timezone.now(),
+        uvs_ids=[0] * position + [uvs_id for order, uvs_id, needs_testing_override in data],
+        needs_testing_overrides=[None] * position
+        + [needs_testing_override for order, uvs_id, needs_testing_override in data],
+        position=position,
+        untested_order_vals=request.session.get("untested_order_vals", []),
+        action_log_ids=request.session.get("action_logs", []),
+    )
+    for key in OLD_LEARNING_SESSION_KEYS:
+        request.session.pop(key, None)
+    request.session[LEARNING_SESSION_KEY] = learning_session.id
+    return learning_session
 
 
-def _save_verse_status_data(request, data):
-    request.session["verses_to_learn"] = data
+def _get_verse_status_ids(request):
+    learning_session = _get_learning_session(request)
+    if learning_session is None:
+        return []
+    return learning_session.remaining()
 
 
 def _set_learning_session_start(request, dt):
@@ -111,42 +179,52 @@ def get_learning_session_start(request):
         return datetime.utcfromtimestamp(int(learning_start)).replace(tzinfo=timezone.utc)
 
 
-def _set_verse_statuses(request, user_verse_statuses):
+def start_learning_session(request, user_verse_statuses, learning_type, return_to):
     # We enumerate at this point and assign an order.  This order ends up being
     # used as 'learn_order', and is used in the front end as an index into a
-    # dictionary (not an array), because items can be expelled from the list
-    # stored in the session.
-
-    # Assign order and save:
-    data = [
-        (order, uvs.id, getattr(uvs, "needs_testing_override", None)) for order, uvs in enumerate(user_verse_statuses)
-    ]
-    _save_verse_status_data(request, data)
+    # dictionary (not an array), because items can be expelled from the list.
 
     # To get the 'review mode' progress bar correct in the front end, we need to
     # know which items are not up for review and should be excluded.
     # Since the front end may have partial data and uses the learning order
     # val to progress, we use the order as an ID.
-    order_vals = {uvs_id: order for (order, uvs_id, needs_testing_override) in data}
-    untested_order_vals = [order_vals[uvs.id] for uvs in user_verse_statuses if uvs.memory_stage < MemoryStage.TESTED]
-    request.session["untested_order_vals"] = untested_order_vals
-
-
-def start_learning_session(request, user_verse_statuses, learning_type, return_to):
-    _set_verse_statuses(request, user_verse_statuses)
-    _set_learning_session_start(request, timezone.now())
-    request.session["learning_type"] = learning_type
-    request.session["action_logs"] = []
-    request.session["return_to"] = return_to
+    now = timezone.now()
+    old_learning_session_id = request.session.get(LEARNING_SESSION_KEY, None)
+    if old_learning_session_id is not None:
+        LearningSession.objects.filter(id=old_learning_session_id).delete()
+    learning_session = LearningSession.objects.create(
+        identity=request.identity,
+        learning_type=learning_type,
+        return_to=return_to,
+        started=now,
+        uvs_ids=[uvs.id for uvs in user_verse_statuses],
+        needs_testing_overrides=[getattr(uvs, "needs_testing_override", None) for uvs in user_verse_statuses],
+        untested_order_vals=[
+            order for order, uvs in enumerate(user_verse_statuses) if uvs.memory_stage < MemoryStage.TESTED
+        ],
+    )
+    for key in OLD_LEARNING_SESSION_KEYS:
+        request.session.pop(key, None)
+    request.session[LEARNING_SESSION_KEY] = learning_session.id
+    request._learning_session = learning_session
+    _set_learning_session_start(request, now)
+    if learning_session.uvs_ids:
+        prefetch_verse_statuses.apply_async(
+            [learning_session.identity_id, learning_session.uvs_ids[:VERSE_STATUS_BATCH_SIZE]]
+        )
 
 
 def verse_status_finished(request, uvs_id, new_action_logs):
-    _remove_user_verse_status(request, uvs_id)
+    verse_statuses_finished(request, [(uvs_id, new_action_logs)])
+
 
-    if new_action_logs and request.session.get("learning_type", LearningType.PRACTICE) == LearningType.REVISION:
-        action_log_ids = list(request.session["action_logs"])
-        action_log_ids.extend([sl.id for sl in new_action_logs])
-        request.session["action_logs"] = action_log_ids
+def verse_statuses_finished(request, finished):
+    """
+    Updates the learning session for a list of (uvs_id, new action logs) that
+    have been finished, in order.
+    """
+    new_action_log_ids = [action_log.id for uvs_id, action_logs in finished for action_log in action_logs]
+    _advance_learning_session(request, [uvs_id for uvs_id, action_logs in finished], new_action_log_ids)
 
 
 def verse_status_skipped(request, uvs_id):
@@ -158,23 +236,51 @@ def verse_status_cancelled(request, uvs_id):
 
 
 def _remove_user_verse_status(request, u_id):
-    # We remove all that appear before u_id, since we know that they will
-    # be processed in order client side, and otherwise we potentially have race
-    # conditions if the user presses 'next' or 'skip' multiple times quickly.
-    ids = _get_verse_status_ids(request)
-    new_ids = []
-    found_id = False
-    for order, uvs_id, needs_testing_override in ids:
-        if found_id:
-            new_ids.append((order, uvs_id, needs_testing_override))
-        if u_id == uvs_id:
-            found_id = True
+    _advance_learning_session(request, [u_id], [])
 
-    if not found_id:
-        # Presumably an error, or an old request arriving very late, so ignore
-        new_ids = ids
 
-    _save_verse_status_data(request, new_ids)
+def _advance_learning_session(request, uvs_ids, new_action_log_ids):
+    # We remove all that appear before each uvs_id, since we know that they will
+    # be processed in order client side, and otherwise we potentially have race
+    # conditions if the user presses 'next' or 'skip' multiple times quickly.
+    #
+    # This is done with a single UPDATE that moves the cursor to just after
+    # the last of the uvs_ids found after the current position. Any that are
+    # not found are presumably errors, or old requests arriving very late, so
+    # are ignored.
+    learning_session = _get_learning_session(request)
+    if learning_session is None or not uvs_ids:
+        return
+    update = {
+        "position": Greatest(
+            F("position"),
+            *[
+                ArrayPosition(F("uvs_ids"), Cast(Value(uvs_id), BigIntegerField()), F("position") + 1)
+                for uvs_id in uvs_ids
+            ],
+        )
+    }
+    if new_action_log_ids:
+        update["action_log_ids"] = Case(
+            When(
+                learning_type=LearningType.REVISION,
+                then=ArrayCat(F("action_log_ids"), Cast(Value(new_action_log_ids), ArrayField(BigIntegerField()))),
+            ),
+            default=F("action_log_ids"),
+        )
+    LearningSession.objects.filter(id=learning_session.id).update(**update)
+    # Cached copy is now out of date
+    del request._learning_session
+
+
+class ArrayPosition(Func):
+    # array_position(array, value, start) - 1-based index, or NULL if not found
+    function = "array_position"
+    output_field = IntegerField()
+
+
+class ArrayCat(Func):
+    function = "array_cat"
 
 
 def get_identity(request):
@@ -226,7 +332,7 @@ def save_referrer(request):
         request.session["referrer_username"] = request.GET["from"]
 
 
-def unfinished_session_first_uvs(request):
+def unfinished_session_first_uvs(request, learning_state=None):
     uvs_data = _get_verse_status_ids(request)
     if len(uvs_data) == 0:
         return None
@@ -234,14 +340,25 @@ def unfinished_session_first_uvs(request):
     # We might have a stale session due to verses already being
     # tested in another session.
     ids = [uvs_id for (order, uvs_id, needs_testing_override) in uvs_data]
-    if request.identity.verse_statuses.needs_reviewing(timezone.now()).filter(id__in=ids).count() == 0:
+    now = timezone.now()
+    if learning_state is not None:
+        id_set = set(ids)
+        any_need_reviewing = any(uvs.id in id_set and uvs.needs_reviewing(now) for uvs in learning_state.verse_statuses)
+    else:
+        any_need_reviewing = request.identity.verse_statuses.needs_reviewing(now).filter(id__in=ids).exists()
+    if not any_need_reviewing:
         # Stale session, or a session including only new verses.
         # We want to ignore these on the dashboard (at least the first),
         # so we return False here.
         return None
 
+    first_uvs_id = uvs_data[0][1]
+    if learning_state is not None:
+        uvs = learning_state.get(first_uvs_id)
+        if uvs is not None:
+            return uvs
     try:
-        return request.identity.verse_statuses.get(id=uvs_data[0][1])
+        return request.identity.verse_statuses.get(id=first_uvs_id)
     except UserVerseStatus.DoesNotExist:
         return None
 
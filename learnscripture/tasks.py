@@ -11,3 +11,10 @@ def message(message: str):
     if message == "crash":
         raise AssertionError("Crashed!")
     print(message)
+
+
+@task
+def prefetch_verse_statuses(identity_id: int, uvs_ids: list[int]):
+    from learnscripture import prefetch
+
+    prefetch.prefetch(identity_id, uvs_ids)
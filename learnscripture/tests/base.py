@@ -20,6 +20,8 @@ from selenium.webdriver.support.ui import WebDriverWait
 
 from accounts.models import Account, Identity
 from bibleverses.models import TextVersion
+from bibleverses.suggestions.serving import clear_prompt_source_cache
+from bibleverses.verseindex import clear_verse_indexes
 
 TESTS_SHOW_BROWSER = os.environ.get("TESTS_SHOW_BROWSER", "")
 SELENIUM_SCREENSHOT_ON_FAILURE = os.environ.get("SELENIUM_SCREENSHOT_ON_FAILURE", "")
@@ -149,6 +151,9 @@ class Fixtures:
         super().setUp()
         if not isinstance(self, TestCase):
             self.setUpFixtures()
+        # In-process caches may have data from previous tests
+        clear_prompt_source_cache()
+        clear_verse_indexes()
 
     @classmethod
     def setUpFixtures(cls):
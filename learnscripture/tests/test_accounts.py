@@ -3,6 +3,7 @@ from datetime import timedelta
 from urllib.parse import quote
 
 from django.core import mail
+from django.core.management import call_command
 from django.db.models import F
 from django.urls import reverse
 from six.moves.urllib.parse import ParseResult, urlparse
@@ -178,6 +179,52 @@ class AccountTests(AccountTestMixin, TestBase):
 
             assert account.awards.filter(award_type=AwardType.ADDICT).count() == (0 if i < 23 else 1)
 
+    def test_give_awards_batch(self):
+        from accounts.models import Identity
+        from awards.batch import _create_awards, give_awards
+        from awards.models import RecruiterAward
+
+        _, account1 = self.create_account()
+        _, account2 = self.create_account()
+        _, account3 = self.create_account()
+        for referrer, count in [(account1, 3), (account2, 1)]:
+            for i in range(count):
+                identity, _ = self.create_account()
+                Identity.objects.filter(id=identity.id).update(referred_by=referrer)
+
+        # Existing level should be kept, and not give points again
+        RecruiterAward(level=1).give_to(account2)
+        account2_points = account2.total_score.points
+        notice_count = account1.identity.notices.count()
+
+        give_awards([AwardType.RECRUITER])
+
+        assert sorted(account1.awards.filter(award_type=AwardType.RECRUITER).values_list("level", flat=True)) == [
+            1,
+            2,
+            3,
+        ]
+        assert account2.awards.filter(award_type=AwardType.RECRUITER).count() == 1
+        assert account3.awards.filter(award_type=AwardType.RECRUITER).count() == 0
+
+        account1 = Account.objects.get(id=account1.id)
+        account2 = Account.objects.get(id=account2.id)
+        assert account1.total_score.points == sum(RecruiterAward.POINTS[level] for level in [1, 2, 3])
+        assert account2.total_score.points == account2_points
+        assert account1.action_logs.filter(award__isnull=False).count() == 3
+        # Signals sent:
+        assert account1.identity.notices.count() == notice_count + 3
+
+        # Running again does nothing
+        give_awards([AwardType.RECRUITER])
+        assert account1.awards.filter(award_type=AwardType.RECRUITER).count() == 3
+        assert Account.objects.get(id=account1.id).total_score.points == account1.total_score.points
+
+        # Levels created by another task since checking are skipped
+        created = _create_awards(AwardType.RECRUITER, [(account1.id, 3), (account1.id, 4)])
+        assert [(award.account_id, award.level) for award in created] == [(account1.id, 4)]
+        assert account1.awards.filter(award_type=AwardType.RECRUITER, level=3).count() == 1
+
     def test_friendship_weights(self):
         from .test_groups import create_group
 
@@ -224,15 +271,39 @@ class AccountTests(AccountTestMixin, TestBase):
         assert account2.is_following(account3)
         assert not account3.is_following(account2)
 
-        # get_friendship_weights is cached, but 'follow_user' clears it, because
-        # it's nice for explicit actions to be reflected immediately on the
-        # dashboard.
+        # 'follow_user' updates the weights immediately, because it's nice for
+        # explicit actions to be reflected immediately on the dashboard.
 
         w2_with_1 = account2.get_friendship_weights()[account1.id]
         w2_with_3 = account2.get_friendship_weights()[account3.id]
 
         assert w2_with_3 > w2_with_1
 
+        # Leaving a group updates the other members too
+        group.remove_user(account2)
+        assert account1.get_friendship_weights() == {account1.id: 0.3}
+        assert account1.id not in account2.get_friendship_weights()
+
+        # Rebuilding from scratch gives the same as the incremental updates
+        weights = {account.id: account.get_friendship_weights() for account in [account1, account2, account3, account4]}
+        call_command("rebuild_friendship_weights")
+        assert {
+            account.id: account.get_friendship_weights() for account in [account1, account2, account3, account4]
+        } == weights
+
+        # Changing count_for_friendships updates members
+        group2.count_for_friendships = False
+        group2.save()
+        assert account4.get_friendship_weights() == {account4.id: 0.3}
+        group2.count_for_friendships = True
+        group2.save()
+        assert account3.id in account4.get_friendship_weights()
+
+        # As does deleting a group
+        group2.delete()
+        assert account4.get_friendship_weights() == {account4.id: 0.3}
+        assert account3.get_friendship_weights() == {account3.id: 0.3}
+
 
 class PasswordResetTestsBase:
     def setUp(self):
@@ -1,7 +1,14 @@
+import threading
+import time
 import unittest
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
 import pytest
 
+from bibleverses import services
+from bibleverses.models import ensure_text
 from bibleverses.services import get_esv_v2, search_esv_v2
 
 from .base import TestBase
@@ -50,3 +57,91 @@ class TestEsvSearch(SetupEsvMixin, TestBase):
             "“For **God** so **loved** the **world**, that he **gave** his only Son, that whoever believes in him should"
             in verse.verses[0].text_saved
         )
+
+
+class EsvStandInHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the ESV v2 API passageQuery method
+    """
+
+    PASSAGES = {
+        "John 3:16": "  [16] For God so loved the world.",
+        "John 3:17": "  [17] For God did not send his Son into the world to condemn the world.",
+    }
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            server.active_requests += 1
+            server.max_active_requests = max(server.max_active_requests, server.active_requests)
+        try:
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            refs = query["passage"][0].split(";")
+            time.sleep(0.05)
+            body = "".join(f"{ref}\n\n{self.PASSAGES[ref]}\n\n" for ref in refs if ref in self.PASSAGES)
+            content = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        finally:
+            with server.lock:
+                server.active_requests -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class EsvStandInServerMixin:
+    def setUp(self):
+        super().setUp()
+        server = ThreadingHTTPServer(("127.0.0.1", 0), EsvStandInHandler)
+        server.lock = threading.Lock()
+        server.request_count = 0
+        server.active_requests = 0
+        server.max_active_requests = 0
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+        for patcher in [
+            mock.patch("bibleverses.services.ESV_V2_BASE_URL", f"http://127.0.0.1:{server.server_port}/"),
+            mock.patch("bibleverses.services.esv_v2_rate_limiter", services.RateLimiter(0.01)),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class TestEsvServiceStandIn(EsvStandInServerMixin, unittest.TestCase):
+    def test_get_esv_v2_batches(self):
+        refs = ["John 3:16", "John 3:17", "John 5:4"] * 3
+        d = get_esv_v2(refs, batch_size=1)
+        assert d == [
+            ("John 3:16", "For God so loved the world."),
+            ("John 3:17", "For God did not send his Son into the world to condemn the world."),
+        ]
+        assert self.server.request_count == len(refs)
+        assert 1 < self.server.max_active_requests <= services.ESV_V2_MAX_CONCURRENT_REQUESTS
+
+    def test_rate_limiter(self):
+        limiter = services.RateLimiter(0.05)
+        start = time.monotonic()
+        services.map_concurrently(lambda i: limiter.wait(), range(5), 5)
+        assert time.monotonic() - start >= 0.2
+
+
+class TestEnsureTextStandIn(EsvStandInServerMixin, SetupEsvMixin, TestBase):
+    def test_ensure_text(self):
+        verses = list(self.esv.verse_set.all())
+        with mock.patch.dict(services._FETCH_SERVICES, {"ESV": get_esv_v2}):
+            ensure_text(verses)
+        verses = {v.localized_reference: v for v in self.esv.verse_set.all()}
+        assert verses["John 3:16"].text_saved == "For God so loved the world."
+        assert verses["John 3:16"].text_fetched_at is not None
+        assert not verses["John 3:16"].missing
+        assert verses["John 3:17"].text_saved.startswith("For God did not send")
+        assert verses["John 5:4"].missing
+        assert self.server.request_count == 1
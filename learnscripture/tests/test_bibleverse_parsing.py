@@ -1,11 +1,15 @@
 import pytest
 from django_ftl import override
 
-from bibleverses.books import get_bible_book_number, get_bible_books, is_single_chapter_book
+from bibleverses.books import get_bible_book_name, get_bible_book_number, get_bible_books, is_single_chapter_book
+from bibleverses.constants import BIBLE_BOOK_INFO
 from bibleverses.languages import LANG, LANGUAGES, normalize_reference_input_turkish
 from bibleverses.models import InvalidVerseReference
 from bibleverses.parsing import (
     ParsedReference,
+    bible_reference_parser_for_lang,
+    parse_break_list,
+    parse_canonical_reference_fast,
     parse_unvalidated_localized_reference,
     parse_validated_localized_reference,
 )
@@ -347,3 +351,44 @@ def test_is_in_bounds_chapter_zero():
     assert not pu(LANG.EN, "1 Corinthians 0").is_in_bounds()
     assert not pu(LANG.EN, "1 Corinthians 0:1").is_in_bounds()
     assert not pu(LANG.EN, "1 Corinthians 0:1-0:2").is_in_bounds()
+
+
+def _sample_references(language_code):
+    for book_number, book in enumerate(get_bible_books(language_code)):
+        book_info = BIBLE_BOOK_INFO[get_bible_book_name(LANG.INTERNAL, book_number)]
+        yield book
+        for chapter, verse_count in book_info.verse_counts.items():
+            yield f"{book} {chapter}"
+            yield f"{book} {chapter}:1"
+            yield f"{book} {chapter}:{verse_count}"
+            yield f"{book} {chapter}:1-{verse_count}"
+            yield f"{book} {chapter}:2-{chapter + 1}:3"
+
+
+@pytest.mark.parametrize("lang", [lang.code for lang in LANGUAGES] + [LANG.INTERNAL])
+def test_fast_parser_matches_parser(lang):
+    parser = bible_reference_parser_for_lang(lang, True)
+    for ref in _sample_references(lang):
+        assert parse_canonical_reference_fast(lang, ref) == parser.parse(ref)
+
+
+def test_fast_parser_non_canonical():
+    for ref in ["Garbage", "Genesis 1:", "Genesis  1", "Genesis 1:2-", "Genesis 1:x", "Gen 1:1", "Genesis 1:1 "]:
+        assert parse_canonical_reference_fast(LANG.EN, ref) is None
+    # en dash is allowed
+    assert parse_canonical_reference_fast(LANG.EN, "Genesis 1:2–3").canonical_form() == "Genesis 1:2-3"
+    # No backtracking to shorter book names
+    assert parse_canonical_reference_fast(LANG.INTERNAL, "BOOK10 1:1").book_name == "BOOK10"
+
+
+def test_parse_validated_cached_copies():
+    parsed_1 = pv(LANG.EN, "Genesis 1:1")
+    parsed_1.start_verse = 2
+    assert pv(LANG.EN, "Genesis 1:1").start_verse == 1
+
+
+def test_parse_break_list():
+    assert parse_break_list("") == []
+    assert [p.canonical_form() for p in parse_break_list("BOOK0 1:3,BOOK10 2:4")] == ["BOOK0 1:3", "BOOK10 2:4"]
+    with pytest.raises(ValueError):
+        parse_break_list("BOOK0 1:3,")
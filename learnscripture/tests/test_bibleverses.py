@@ -1,9 +1,11 @@
 import unittest
 
 import pytest
+from django.core.cache import cache
 from django_ftl import override
 
 from accounts.models import Identity
+from bibleverses import verseindex
 from bibleverses.languages import LANG
 from bibleverses.models import (
     InvalidVerseReference,
@@ -23,6 +25,7 @@ from bibleverses.parsing import (
 from bibleverses.suggestions.modelapi import (
     create_prompt_list,
     create_word_suggestion_data,
+    get_word_suggestion_lists_by_localized_reference_bulk,
     item_suggestions_need_updating,
 )
 from bibleverses.suggestions.utils.text import split_into_words_for_suggestions
@@ -172,7 +175,7 @@ class VersionTests(BibleVersesMixin, TestBase):
 
         with self.assertNumQueries(3):
             # 1 query for single verses,
-            # 2 for each combo
+            # 1 for each combo, plus 1 for loading the verse index
             l2 = version.get_verses_by_localized_reference_bulk(["Genesis 1:1", "Genesis 1:2-3"])
 
         assert l1["Genesis 1:1"].text == "In the beginning God created the heaven and the earth. "
@@ -200,8 +203,8 @@ class VersionTests(BibleVersesMixin, TestBase):
         with self.assertNumQueries(2):
             # We could in theory get this in one query as it is a merged verse,
             # but because it looks like a verse range, we end up in the combo
-            # verse route. Fixing this would end up increasing query counts
-            # in other cases.
+            # verse route, which needs the verse index loading. Fixing this
+            # would end up increasing query counts in other cases.
             vl = self.TCL02.get_verse_list("Romalılar 3:25-26")
             assert len(vl) == 1
             assert vl[0].localized_reference == "Romalılar 3:25-26"
@@ -225,12 +228,42 @@ class VersionTests(BibleVersesMixin, TestBase):
             assert v1[0].localized_reference == "Romalılar 3:24"
             assert v1[1].localized_reference == "Romalılar 3:25-26"
 
-        with self.assertNumQueries(2):
+        with self.assertNumQueries(1):
+            # Verse index already loaded
             v2 = self.TCL02.get_verse_list("Romalılar 3:26-27")
             assert len(v2) == 2
             assert v2[0].localized_reference == "Romalılar 3:25-26"
             assert v2[1].localized_reference == "Romalılar 3:27"
 
+    def test_verse_index(self):
+        version = self.TCL02
+        with self.assertNumQueries(1):
+            assert version.get_localized_reference_list("Romalılar 3:24-27") == [
+                "Romalılar 3:24",
+                "Romalılar 3:25-26",
+                "Romalılar 3:27",
+            ]
+        with self.assertNumQueries(0):
+            assert version.get_localized_reference_list("Romalılar 3:26-27") == ["Romalılar 3:25-26", "Romalılar 3:27"]
+            with override("en"):
+                with pytest.raises(InvalidVerseReference):
+                    version.get_localized_reference_list("Romalılar 3:27-24")
+
+    def test_verse_index_invalidated(self):
+        version = self.KJV
+        assert version.get_localized_reference_list("Genesis 1:1-3") == ["Genesis 1:1", "Genesis 1:2", "Genesis 1:3"]
+        version.verse_set.get(localized_reference="Genesis 1:2").mark_missing()
+        assert version.get_localized_reference_list("Genesis 1:1-3") == ["Genesis 1:1", "Genesis 1:3"]
+
+    def test_verse_index_invalidated_other_process(self):
+        version = self.KJV
+        assert version.get_localized_reference_list("Genesis 1:1-3") == ["Genesis 1:1", "Genesis 1:2", "Genesis 1:3"]
+        # Simulate another process changing a verse, which updates the shared
+        # generation token, but not our in-memory copy
+        version.verse_set.filter(localized_reference="Genesis 1:2").update(missing=True)
+        cache.set(verseindex._generation_cache_key(version.id), "new")
+        assert version.get_localized_reference_list("Genesis 1:1-3") == ["Genesis 1:1", "Genesis 1:3"]
+
     def test_get_verses_by_localized_reference_bulk_merged(self):
         version = self.TCL02
         with self.assertNumQueries(1):
@@ -351,17 +384,29 @@ class VersionTests(BibleVersesMixin, TestBase):
 
     def test_suggestions_bulk(self):
         version = TextVersion.objects.get(slug="KJV")
-        with self.assertNumQueries(2, using="default"):
-            with self.assertNumQueries(2, using="wordsuggestions"):
-                # 4 queries
-                # - 1 for WordSuggestionData for v1, v2, v3
-                # - 2 for parseref for v2-3,
-                # - 1 for WordSuggestionData for v2-3
+        with self.assertNumQueries(1, using="default"):
+            with self.assertNumQueries(1, using="wordsuggestions"):
+                # 2 queries
+                # - 1 for loading the verse index, for v2-3,
+                # - 1 for WordSuggestionData for everything
                 d = version.get_suggestions_by_localized_reference_bulk(
                     ["Genesis 1:1", "Genesis 1:2", "Genesis 1:3", "Genesis 1:2-3"]
                 )
                 assert len(d) == 4
 
+    def test_suggestion_lists_bulk_mixed(self):
+        version = TextVersion.objects.get(slug="KJV")
+        refs = ["Genesis 1:1-2", "Genesis 1:3", "Genesis 1:2-3", "Genesis 1:4"]
+        with self.assertNumQueries(1, using="default"):
+            with self.assertNumQueries(1, using="wordsuggestions"):
+                # - 1 for loading the verse index, for the combo refs
+                # - 1 for all WordSuggestionData
+                d = get_word_suggestion_lists_by_localized_reference_bulk(version, refs)
+        assert d["Genesis 1:1-2"] == self._gen_1_1_suggestions() + self._gen_1_2_suggestions()
+        assert d["Genesis 1:3"] == self._gen_1_3_suggestions()
+        assert d["Genesis 1:2-3"] == self._gen_1_2_suggestions() + self._gen_1_3_suggestions()
+        assert d["Genesis 1:4"] == []
+
     def test_create_prompt_list(self):
         # Check that we are adding the correct word, and ordering correctly.
         assert create_prompt_list("Y Él", [{"por", "éstos"}, {"yo", "el"}]) == [
@@ -372,6 +417,34 @@ class VersionTests(BibleVersesMixin, TestBase):
     def test_create_prompt_list_empty(self):
         assert create_prompt_list("Y Él", []) == []
 
+    def test_prompt_lists_bulk(self):
+        version = TextVersion.objects.get(slug="KJV")
+        text_dict = {
+            ref: version.get_text_by_localized_reference(ref) for ref in ["Genesis 1:1", "Genesis 1:2-3", "Genesis 1:4"]
+        }
+        d = version.get_prompt_lists_by_localized_reference_bulk(text_dict)
+        expected = {
+            ref: create_prompt_list(text, version.get_suggestions_by_localized_reference(ref))
+            for ref, text in text_dict.items()
+        }
+        assert d == expected
+        assert d["Genesis 1:1"][1] == ["a", "all", "his", "the"]
+        assert d["Genesis 1:4"] == []
+
+        # Second time, available suggestions come from cache, only missing
+        # ones are queried again.
+        with self.assertNumQueries(1, using="wordsuggestions"):
+            assert version.get_prompt_lists_by_localized_reference_bulk(text_dict) == expected
+
+    def test_prompt_lists_bulk_text_changed(self):
+        version = TextVersion.objects.get(slug="KJV")
+        text = version.get_text_by_localized_reference("Genesis 1:1")
+        version.get_prompt_lists_by_localized_reference_bulk({"Genesis 1:1": text})
+        # Changed text invalidates cache
+        with self.assertNumQueries(1, using="wordsuggestions"):
+            d = version.get_prompt_lists_by_localized_reference_bulk({"Genesis 1:1": "And " + text})
+        assert d["Genesis 1:1"][0] == ["and", "and", "but", "thou"]
+
     def test_item_suggestions_needs_updating(self):
         v = Verse.objects.get(version__slug="KJV", localized_reference="Genesis 1:1")
         # Already has suggestions set up
@@ -0,0 +1,143 @@
+from datetime import timedelta
+
+from django.urls import reverse
+from django.utils import timezone
+from time_machine import travel
+
+from accounts.models import get_account_stats
+from bibleverses.models import StageType
+from scores.dailystats import MONTHLY_ACTIVE_DAYS, rebuild_daily_stats, utc_date
+from scores.models import IdentityDailyStats, ScoreReason, SiteDailyStats, get_verses_tested_per_day
+
+from .base import AccountTestMixin, BibleVersesMixin, TestBase
+
+
+class DailyStatsTests(BibleVersesMixin, AccountTestMixin, TestBase):
+    def _learn(self, identity, ref):
+        version = identity.default_bible_version
+        identity.add_verse_choice(ref, version)
+        identity.record_verse_action(ref, version.slug, StageType.TEST, accuracy=1.0)
+        uvs = identity.verse_statuses.filter(localized_reference=ref).first()
+        identity.account.add_points(10, ScoreReason.VERSE_FIRST_TESTED, localized_reference=ref)
+        return uvs
+
+    def _snapshot(self):
+        return (
+            sorted(
+                IdentityDailyStats.objects.exclude(
+                    actions=0, verses_first_tested=0, verses_reviewed=0, verses_started=0
+                ).values_list(
+                    "identity_id", "date", "actions", "verses_first_tested", "verses_reviewed", "verses_started"
+                )
+            ),
+            sorted(
+                SiteDailyStats.objects.exclude(
+                    new_accounts=0,
+                    active_accounts=0,
+                    monthly_active_accounts_change=0,
+                    verses_first_tested=0,
+                    verses_reviewed=0,
+                ).values_list(
+                    "date",
+                    "new_accounts",
+                    "active_accounts",
+                    "monthly_active_accounts_change",
+                    "verses_first_tested",
+                    "verses_reviewed",
+                )
+            ),
+        )
+
+    def test_incremental_matches_rebuild(self):
+        start = timezone.now()
+        identity1, account1 = self.create_account()
+        identity2, account2 = self.create_account(username="tester2", email="t2@example.com")
+        for days, identity, ref in [
+            (0, identity1, "Genesis 1:1"),
+            (0, identity1, "Genesis 1:2-3"),
+            (0, identity1, "Genesis 1:2"),
+            (2, identity2, "Genesis 1:1"),
+            (3, identity1, "Genesis 1:4"),
+            (40, identity1, "Genesis 1:5"),
+            (45, identity1, "Genesis 1:6"),
+        ]:
+            with travel(start + timedelta(days=days)):
+                self._learn(identity, ref)
+        with travel(start + timedelta(days=45)):
+            # Deleting the only action log of a day
+            log = account2.add_points(10, ScoreReason.VERSE_REVIEWED)
+            log.delete()
+
+        incremental = self._snapshot()
+        rebuild_daily_stats()
+        assert self._snapshot() == incremental
+
+        identity1_stats = {row.date: row for row in IdentityDailyStats.objects.filter(identity=identity1)}
+        # Genesis 1:2-3 counts as 2, Genesis 1:2 is a duplicate
+        assert identity1_stats[utc_date(start)].verses_started == 3
+
+    def test_cancel_learning(self):
+        start = timezone.now()
+        identity, account = self.create_account()
+        with travel(start):
+            self._learn(identity, "Genesis 1:1")
+            self._learn(identity, "Genesis 1:2-3")
+        version = identity.default_bible_version
+
+        def verses_started():
+            return IdentityDailyStats.objects.get(identity=identity, date=utc_date(start)).verses_started
+
+        identity.cancel_learning(["Genesis 1:2-3"], version.slug)
+        assert verses_started() == 1
+        incremental = self._snapshot()
+        rebuild_daily_stats()
+        assert self._snapshot() == incremental
+
+        # Adding it again restores it
+        identity.add_verse_choice("Genesis 1:2-3", version)
+        assert verses_started() == 3
+        incremental = self._snapshot()
+        rebuild_daily_stats()
+        assert self._snapshot() == incremental
+
+    def test_account_stats(self):
+        start = timezone.now()
+        identity1, account1 = self.create_account()
+        identity2, account2 = self.create_account(username="tester2", email="t2@example.com")
+        with travel(start):
+            account1.add_points(10, ScoreReason.VERSE_FIRST_TESTED)
+            account1.add_points(10, ScoreReason.VERSE_REVIEWED)
+        with travel(start + timedelta(days=1)):
+            account1.add_points(10, ScoreReason.VERSE_REVIEWED)
+            account2.add_points(10, ScoreReason.VERSE_REVIEWED)
+        with travel(start + timedelta(days=MONTHLY_ACTIVE_DAYS + 5)):
+            account2.add_points(10, ScoreReason.VERSE_REVIEWED)
+
+        stats = {s.date: s for s in get_account_stats(start - timedelta(days=1), start + timedelta(days=60))}
+        day0 = utc_date(start)
+
+        def get(days):
+            return stats[day0 + timedelta(days=days)]
+
+        assert get(-1).monthly_active_users == 0
+        assert get(0).new_accounts == 2
+        assert (get(0).daily_active_users, get(0).verses_started, get(0).verses_tested) == (1, 1, 1)
+        assert (get(1).daily_active_users, get(1).verses_started, get(1).verses_tested) == (2, 0, 2)
+        assert get(0).monthly_active_users == 1
+        assert get(1).monthly_active_users == 2
+        assert get(MONTHLY_ACTIVE_DAYS - 1).monthly_active_users == 2
+        assert get(MONTHLY_ACTIVE_DAYS).monthly_active_users == 1
+        assert get(MONTHLY_ACTIVE_DAYS + 1).monthly_active_users == 0
+        assert get(MONTHLY_ACTIVE_DAYS + 5).monthly_active_users == 1
+        assert get(60).monthly_active_users == 0
+
+        assert get_verses_tested_per_day(account1.id) == [(day0, 2), (day0 + timedelta(days=1), 1)]
+
+    def test_stats_pages(self):
+        identity, account = self.create_account()
+        self._learn(identity, "Genesis 1:1")
+        resp = self.client.get(reverse("stats"))
+        assert resp.status_code == 200
+        resp = self.client.get(reverse("learnscripture.api.usertimelinestats"), {"username": account.username})
+        assert resp.status_code == 200
+        assert resp.json()["streaks"]["verses_started"]["current"] == 1
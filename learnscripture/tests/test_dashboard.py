@@ -1,5 +1,7 @@
 from datetime import timedelta
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from time_machine import travel
@@ -206,4 +208,34 @@ class DashboardTestsFB(DashboardTestsBase, FullBrowserTest):
 
 
 class DashboardTestsWT(DashboardTestsBase, WebTestBase):
-    pass
+    def get_dashboard_query_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_url("dashboard")
+        return len(queries)
+
+    def test_dashboard_query_count(self):
+        # The number of queries for the dashboard should not depend on how
+        # many verse sets, passages and catechisms are being learned.
+        i = self.setup_identity()
+        i.add_verse_set(VerseSet.objects.get(slug="bible-101"))
+        i.add_catechism(TextVersion.objects.get(slug="WSC"))
+        i.record_verse_action("John 3:16", "NET", StageType.TEST, 1.0)
+        self.get_url("dashboard")  # warm up any caches
+        initial_count = self.get_dashboard_query_count()
+
+        i.add_verse_set(VerseSet.objects.get(slug="basic-gospel"))
+        i.add_verse_choice("Psalm 23:2")
+        vs = VerseSet.objects.get(slug="psalm-23")
+        i.add_verse_set(vs)
+        i.verse_statuses.filter(verse_set=vs).update(
+            strength=accounts.memorymodel.STRENGTH_FOR_GROUP_TESTING + 0.01,
+            last_tested=timezone.now() - timedelta(days=10),
+            next_test_due=timezone.now() - timedelta(days=1),
+            memory_stage=MemoryStage.TESTED,
+        )
+        i.record_verse_action("John 14:6", "NET", StageType.TEST, 1.0)
+        i.record_verse_action("Q1", "WSC", StageType.TEST, 1.0)
+
+        self.get_url("dashboard")
+        self.assertTextPresent("Psalm 23")  # sanity check
+        assert self.get_dashboard_query_count() == initial_count
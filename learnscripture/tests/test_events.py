@@ -1,11 +1,20 @@
 from datetime import timedelta
+from unittest import mock
 
 import django_ftl
 from django.utils import timezone
 from time_machine import travel
 
+from bibleverses.models import VerseSet, VerseSetType
 from comments.models import Comment
-from events.models import Event, EventType, GroupJoinedEvent, PointsMilestoneEvent
+from events.models import (
+    EVENTSTREAM_CUTOFF_NUMBER,
+    Event,
+    EventType,
+    GroupJoinedEvent,
+    PointsMilestoneEvent,
+    StartedLearningVerseSetEvent,
+)
 
 from .base import AccountTestMixin, TestBase
 from .test_groups import create_group
@@ -84,6 +93,50 @@ class EventTests(AccountTestMixin, TestBase):
         # account2 and viewer are friends, so e3 should be before e2
         assert stream.index(e3) < stream.index(e2)
 
+    def test_dashboard_stream_candidates(self):
+        _, account1 = self.create_account(username="1")
+        _, viewer = self.create_account(username="viewer")
+        verse_set = VerseSet.objects.create(
+            name="Psalm 23",
+            slug="psalm-23",
+            language_code="en",
+            set_type=VerseSetType.PASSAGE,
+            created_by=account1,
+            public=True,
+        )
+        start = timezone.now() - timedelta(days=2)
+        with travel(start) as tm:
+            for i in range(10):
+                PointsMilestoneEvent(account=account1, points=(i + 1) * 1000).save()
+                # Higher weight, but older:
+                if i == 0:
+                    StartedLearningVerseSetEvent(verse_set=verse_set, chosen_by=account1).save()
+                tm.shift(timedelta(hours=3))
+
+        all_events = list(Event.objects.all())
+        now = timezone.now()
+        # Ordering by base_rank is the same as ordering by get_rank (ignoring affinity)
+        assert sorted(all_events, key=lambda e: e.base_rank) == sorted(all_events, key=lambda e: e.get_rank(now=now))
+
+        expected = sorted(all_events, key=lambda e: e.get_rank(viewer=viewer, now=now), reverse=True)
+        expected = expected[:EVENTSTREAM_CUTOFF_NUMBER]
+        expected.sort(key=lambda e: e.created, reverse=True)
+
+        with mock.patch("events.models.EVENTSTREAM_CANDIDATE_NUMBER", 9):
+            stream = Event.objects.for_dashboard("en", account=viewer)
+        assert stream == expected
+        assert all(e.comment_count == 0 for e in stream)
+
+    def test_dashboard_stream_comment_count(self):
+        _, account1 = self.create_account(username="1")
+        _, viewer = self.create_account(username="viewer")
+        event = PointsMilestoneEvent(account=account1, points=1000).save()
+        event.add_comment(author=account1, message="Hello")
+        event.add_comment(author=viewer, message="Hello to you")
+        stream = Event.objects.for_dashboard("en", account=viewer)
+        [event_2] = [e for e in stream if e.id == event.id]
+        assert event_2.comment_count == 2
+
     def test_group_comment_event_visibility(self):
         _, account1 = self.create_account(username="1")
         _, viewer = self.create_account(username="viewer")
@@ -1,12 +1,26 @@
+import io
+import json
+import math
 from datetime import timedelta
 
+from django.core.management import call_command
+from django.db import connection
 from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
 from django_ftl import override
 from time_machine import travel
 
 import accounts.memorymodel
-from accounts.models import ChosenVerseSet
+from accounts.models import (
+    ChosenVerseSet,
+    LearningStreak,
+    get_learning_streaks,
+    get_verse_started_running_streaks,
+    learning_streak_day,
+    rebuild_learning_streaks,
+)
 from awards.models import AwardType
 from bibleverses.languages import LANG
 from bibleverses.models import (
@@ -20,7 +34,16 @@ from bibleverses.models import (
     WordSuggestionData,
 )
 from bibleverses.parsing import internalize_localized_reference
+from bibleverses.textutils import count_words
 from events.models import Event, EventType
+from learnscripture.models import LearningSession
+from scores.models import (
+    ScoreReason,
+    Scores,
+    TotalScore,
+    get_verses_finished_count,
+    get_verses_started_counts,
+)
 
 from .base import AccountTestMixin, BibleVersesMixin, CatechismsMixin, FuzzyInt, TestBase, get_or_create_any_account
 from .test_bibleverses import RequireExampleVerseSetsMixin
@@ -81,6 +104,23 @@ class IdentityTests(RequireExampleVerseSetsMixin, AccountTestMixin, CatechismsMi
                 with self.subTest(attr=attr):
                     assert getattr(uvs, attr) == getattr(uvs_orig, attr)
 
+    def test_add_verse_set_query_count(self):
+        # The number of queries should not depend on the number of verses
+        def count_queries(verse_set):
+            i = self.create_identity(version_slug="NET")
+            with CaptureQueriesContext(connection) as queries:
+                uvss = i.add_verse_set(verse_set)
+            return len(queries), uvss
+
+        small_set = self.create_verse_set(VerseSetType.SELECTION, "Small", "small", "", ["Psalm 23:1"])
+        small_count, small_uvss = count_queries(small_set)
+        passage_count, passage_uvss = count_queries(VerseSet.objects.get(slug="psalm-23"))
+        assert len(small_uvss) == 1
+        assert [uvs.localized_reference for uvs in passage_uvss] == [f"Psalm 23:{v}" for v in range(1, 7)]
+        assert passage_count == small_count
+        # Order is preserved in 'added'
+        assert sorted(passage_uvss, key=lambda uvs: uvs.added) == passage_uvss
+
     def test_add_verse_set_passage_with_merged(self):
         i = self.create_identity(version_slug="TCL02")
         vs = VerseSet.objects.create(
@@ -151,6 +191,47 @@ class IdentityTests(RequireExampleVerseSetsMixin, AccountTestMixin, CatechismsMi
             == MemoryStage.TESTED
         )
 
+    def test_verse_counts(self):
+        i = self.create_identity(version_slug="NET")
+        i.add_verse_set(VerseSet.objects.get(name="Bible 101"))
+
+        def assert_counts(started, finished):
+            assert (i.verses_started_count(), i.verses_finished_count()) == (started, finished)
+            # Same as calculating from scratch:
+            assert (i.verses_started_count(), i.verses_finished_count()) == (
+                get_verses_started_counts([i.id])[i.id],
+                get_verses_finished_count(i.id),
+            )
+
+        for ref in ["John 3:16", "Ephesians 2:8-9"]:
+            i.record_verse_action(ref, "NET", StageType.TEST, 1.0)
+        # Combo verses count for each verse:
+        assert_counts(3, 0)
+
+        # Testing again, or adding the same verses again, changes nothing
+        i.record_verse_action("John 3:16", "NET", StageType.TEST, 1.0)
+        i.add_verse_set(VerseSet.objects.get(name="Basic Gospel"))
+        assert_counts(3, 0)
+
+        # Finishing
+        i.verse_statuses.filter(localized_reference="John 3:16").update(
+            strength=accounts.memorymodel.MM.LEARNED - 0.001
+        )
+        with travel(timezone.now() + timedelta(days=100)):
+            i.record_verse_action("John 3:16", "NET", StageType.TEST, 1.0)
+            assert_counts(3, 1)
+
+            # Forgetting
+            i.record_verse_action("John 3:16", "NET", StageType.TEST, 0.5)
+            assert_counts(3, 0)
+
+        i.cancel_learning(["Ephesians 2:8-9"], "NET")
+        assert_counts(1, 0)
+
+        out = io.StringIO()
+        call_command("check_verse_counts", stdout=out)
+        assert "0 wrong" in out.getvalue()
+
     def test_record_against_verse_in_multiple_sets(self):
         # Setup
         i = self.create_identity(version_slug="NET")
@@ -179,6 +260,147 @@ class IdentityTests(RequireExampleVerseSetsMixin, AccountTestMixin, CatechismsMi
         assert now + timedelta(seconds=0.9 * MM.MIN_TIME_BETWEEN_TESTS) < next_due
         assert next_due < now + timedelta(seconds=1.1 * MM.MIN_TIME_BETWEEN_TESTS)
 
+    def test_action_complete_queries(self):
+        i, account = self.create_account(version_slug="NET")
+        i.add_verse_set(VerseSet.objects.get(name="Bible 101"))
+        i.add_verse_set(VerseSet.objects.get(name="Basic Gospel"))
+        uvs = i.verse_statuses.get(localized_reference="John 3:16", verse_set__name="Bible 101")
+        # First test, so that the review below doesn't create awards
+        i.complete_verse_action(uvs.id, StageType.TEST, 1)
+        session = self.client.session
+        session["identity_id"] = i.id
+        session.save()
+        start_points = TotalScore.objects.get(account=account).points
+
+        with CaptureQueriesContext(connection) as captured:
+            resp = self.client.post(
+                reverse("learnscripture.api.actioncomplete"),
+                {"uvs_id": uvs.id, "uvs_needs_testing": "true", "stage": StageType.TEST.value, "accuracy": "0.8"},
+            )
+        assert resp.status_code == 200
+
+        queries = [q["sql"].replace('"', "") for q in captured.captured_queries]
+
+        def count(sql):
+            return len([q for q in queries if sql in q])
+
+        # One round trip for each of fetching, updating and scoring
+        assert count("FOR UPDATE") == 1
+        assert count("UPDATE bibleverses_userversestatus") == 1
+        assert count("INSERT INTO scores_actionlog") == 1
+        assert count("UPDATE scores_totalscore") == 1
+
+        # Both UserVerseStatuses are updated
+        assert [uvs.memory_stage for uvs in i.verse_statuses.filter(localized_reference="John 3:16")] == [
+            MemoryStage.TESTED
+        ] * 2
+        action_log = account.action_logs.order_by("-id").first()
+        expected_points = math.floor(count_words(uvs.scoring_text) * Scores.points_per_word(LANG.EN) * 0.8)
+        assert (action_log.reason, action_log.points, action_log.accuracy) == (
+            ScoreReason.VERSE_REVIEWED,
+            expected_points,
+            0.8,
+        )
+        assert TotalScore.objects.get(account=account).points == start_points + expected_points
+
+    def test_action_complete_batch(self):
+        i, account = self.create_account(version_slug="NET")
+        i.add_verse_set(VerseSet.objects.get(name="Bible 101"))
+        uvs1, uvs2, uvs3 = [
+            i.verse_statuses.get(localized_reference=ref) for ref in ["John 3:16", "John 14:6", "Ephesians 2:8-9"]
+        ]
+        session = self.client.session
+        session["identity_id"] = i.id
+        session["verses_to_learn"] = [[0, uvs1.id, None], [1, uvs2.id, None], [2, uvs3.id, None]]
+        session["learning_type"] = "REVISION"
+        session["action_logs"] = []
+        session.save()
+        tested_at = timezone.now() - timedelta(minutes=10)
+        timestamp = int(tested_at.timestamp() * 1000)
+
+        resp = self.client.post(
+            reverse("learnscripture.api.actioncompletebatch"),
+            {
+                "results": json.dumps(
+                    [
+                        {"uvs_id": uvs1.id, "uvs_needs_testing": True, "stage": "READ", "timestamp": timestamp},
+                        {
+                            "uvs_id": uvs1.id,
+                            "uvs_needs_testing": True,
+                            "stage": "TEST",
+                            "accuracy": 1,
+                            "timestamp": timestamp + 1000,
+                        },
+                        {
+                            "uvs_id": uvs2.id,
+                            "uvs_needs_testing": True,
+                            "stage": "TEST",
+                            "accuracy": 1,
+                            "practice": True,
+                            "timestamp": timestamp + 2000,
+                        },
+                        {"uvs_id": 0, "uvs_needs_testing": True, "stage": "READ", "timestamp": timestamp + 3000},
+                    ]
+                )
+            },
+        )
+        assert resp.status_code == 200
+        results = resp.json()["results"]
+        assert [(r["uvs_id"], r["recorded"]) for r in results] == [
+            (uvs1.id, True),
+            (uvs1.id, True),
+            (uvs2.id, True),
+            (0, False),
+        ]
+        assert results[0]["action_logs"] == []
+        assert [log["reason"] for log in results[1]["action_logs"]] == [
+            ScoreReason.VERSE_FIRST_TESTED,
+            ScoreReason.PERFECT_TEST_BONUS,
+        ]
+        assert results[2]["action_logs"] == []
+
+        # Memory model uses the time of the test
+        uvs1.refresh_from_db()
+        assert uvs1.memory_stage == MemoryStage.TESTED
+        assert abs((uvs1.last_tested - tested_at).total_seconds() - 1) < 0.01
+        # but first_seen, and summary data that depends on it, uses the current
+        # time, so that it is recorded in order.
+        assert uvs1.first_seen > tested_at + timedelta(minutes=5)
+        # Practice doesn't change anything
+        uvs2.refresh_from_db()
+        assert uvs2.memory_stage == MemoryStage.ZERO
+
+        # Old style session data has been moved to a LearningSession
+        session = self.client.session
+        assert "verses_to_learn" not in session
+        learning_session = LearningSession.objects.get(id=session["learning_session_id"])
+        assert learning_session.remaining() == [(2, uvs3.id, None)]
+        assert learning_session.action_log_ids == [log["id"] for log in results[1]["action_logs"]]
+
+    def test_action_complete_batch_invalid(self):
+        i, account = self.create_account(version_slug="NET")
+        i.add_verse_set(VerseSet.objects.get(name="Bible 101"))
+        uvs = i.verse_statuses.get(localized_reference="John 3:16")
+        session = self.client.session
+        session["identity_id"] = i.id
+        session.save()
+        timestamp = int(timezone.now().timestamp() * 1000)
+        valid = {"uvs_id": uvs.id, "uvs_needs_testing": True, "stage": "READ", "timestamp": timestamp}
+        for invalid in [
+            {"uvs_needs_testing": "false"},
+            {"practice": "true"},
+            {"timestamp": float("inf")},
+            {"timestamp": 10**20},
+            {"timestamp": -(10**20)},
+        ]:
+            resp = self.client.post(
+                reverse("learnscripture.api.actioncompletebatch"),
+                {"results": json.dumps([valid | invalid])},
+            )
+            assert resp.status_code == 400, invalid
+        uvs.refresh_from_db()
+        assert uvs.memory_stage == MemoryStage.ZERO
+
     def test_review_sooner(self):
         i = self.create_identity(version_slug="NET")
         vs1 = VerseSet.objects.get(name="Bible 101")
@@ -863,19 +1085,56 @@ class IdentityTests(RequireExampleVerseSetsMixin, AccountTestMixin, CatechismsMi
         identity, account = self.create_account(version_slug="KJV")
 
         def learn(i):
-            # We simulate testing over time by moving previous data back a day
-            identity.verse_statuses.update(first_seen=F("first_seen") - timedelta(days=1))
             ref = f"Genesis 1:{i}"
             identity.add_verse_choice(ref)
             identity.record_verse_action(ref, "KJV", StageType.TEST, 1.0)
 
+        start = timezone.now()
         for i in range(1, 10):
-            learn(i)
-            # Simulate the cronjob that runs
-            awards.tasks.give_all_consistent_learner_awards()
+            # We simulate testing over time by moving forward a day each time
+            with travel(start + timedelta(days=i)):
+                learn(i)
+                # Simulate the cronjob that runs
+                awards.tasks.give_all_consistent_learner_awards()
 
             assert account.awards.filter(award_type=AwardType.CONSISTENT_LEARNER).count() == (0 if i < 7 else 1)
 
+    def test_learning_streaks(self):
+        # Test LearningStreak against get_verse_started_running_streaks
+        identity1, account1 = self.create_account(version_slug="KJV")
+        identity2, account2 = self.create_account(version_slug="KJV", username="tester2", email="t2@example.com")
+
+        def learn(identity, i):
+            ref = f"Genesis 1:{i}"
+            identity.add_verse_choice(ref)
+            identity.record_verse_action(ref, "KJV", StageType.TEST, 1.0)
+
+        start = timezone.now()
+        # identity1: streak of 3 days, gap, streak of 2 days, gap, streak of 4
+        # days, with some days having several verses.
+        # identity2: streak of 5 days
+        days1 = [0, 1, 1, 2, 5, 6, 8, 9, 10, 11]
+        days2 = [3, 4, 5, 6, 7]
+        verse_numbers = iter(range(1, 11))
+        for day in range(0, 12):
+            with travel(start + timedelta(days=day)):
+                for _ in range(days1.count(day)):
+                    learn(identity1, next(verse_numbers))
+                if day in days2:
+                    learn(identity2, day)
+
+        expected = {account1.id: 4, account2.id: 5}
+        assert get_verse_started_running_streaks() == expected
+        assert get_learning_streaks() == expected
+        with travel(start + timedelta(days=11)):
+            assert get_learning_streaks(active_since=learning_streak_day(timezone.now())) == {account1.id: 4}
+
+        # Backfill gives the same results
+        LearningStreak.objects.all().delete()
+        rebuild_learning_streaks()
+        assert get_learning_streaks() == expected
+        assert identity1.learning_streak.current_start == identity1.learning_streak.last_active - timedelta(days=3)
+
     def test_verse_sets_chosen(self):
         i = self.create_identity(version_slug="NET")
 
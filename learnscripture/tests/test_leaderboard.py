@@ -9,7 +9,16 @@ from accounts.models import Account, Identity
 from bibleverses.models import MemoryStage, StageType, TextVersion, VerseSet, VerseSetType
 from groups.models import Group
 from learnscripture.tests.base import TestBase
-from scores.models import ScoreReason, get_verses_finished_count, get_verses_started_counts, get_verses_started_per_day
+from scores.models import (
+    WEEKLY_SCORE_PERIOD,
+    ScoreReason,
+    TotalScore,
+    get_all_time_leaderboard,
+    get_verses_finished_count,
+    get_verses_started_counts,
+    get_verses_started_per_day,
+    get_weekly_leaderboard,
+)
 
 from .base import AccountTestMixin, BibleVersesMixin, CatechismsMixin
 
@@ -42,6 +51,98 @@ class LeaderboardTests(TestBase):
         self.assertContains(resp, self.a1.username)
         self.assertNotContains(resp, self.a2.username)
 
+    def test_paging(self):
+        accounts = []
+        for i in range(35):
+            account = Account.objects.create(username=f"pageduser{i}", email="test@test.com")
+            Identity.objects.create(account=account)
+            account.add_points(1000 - (i // 2), ScoreReason.VERSE_FIRST_TESTED)
+            self.group.add_user(account)
+            accounts.append(account)
+        resp = self.client.get(reverse("group_leaderboard", args=(self.group.slug,)))
+        more_link = resp.context["results"].more_link
+        assert "after=" in str(more_link)
+        resp2 = self.client.get(str(more_link))
+        items = resp2.context["results"].items
+        assert [item["username"] for item in items] == [a.username for a in accounts[30:]] + [self.a1.username]
+        assert [item["rank"] for item in items] == list(range(31, 37))
+
+
+class LeaderboardStoreTests(TestBase):
+    def setUp(self):
+        super().setUp()
+        self.accounts = []
+        for i in range(5):
+            account = Account.objects.create(username=f"testuser{i}", email="test@test.com")
+            Identity.objects.create(account=account)
+            self.accounts.append(account)
+
+    def test_all_time(self):
+        a0, a1, a2, a3, a4 = self.accounts
+        a0.add_points(10, ScoreReason.VERSE_FIRST_TESTED)
+        a1.add_points(30, ScoreReason.VERSE_FIRST_TESTED)
+        a2.add_points(20, ScoreReason.VERSE_FIRST_TESTED)
+        a3.add_points(20, ScoreReason.VERSE_FIRST_TESTED)
+        a4.is_hellbanned = True
+        a4.save()
+        a4.add_points(100, ScoreReason.VERSE_FIRST_TESTED)
+
+        def ids(leaderboard):
+            return [item["account_id"] for item in leaderboard]
+
+        assert ids(get_all_time_leaderboard(False, 0, 10)) == [a1.id, a2.id, a3.id, a0.id]
+        assert ids(get_all_time_leaderboard(True, 0, 10)) == [a4.id, a1.id, a2.id, a3.id, a0.id]
+
+        # Paging with OFFSET and with keyset give the same results
+        page = get_all_time_leaderboard(False, 0, 2)
+        assert page == [
+            {"account_id": a1.id, "points": 30, "rank": 1},
+            {"account_id": a2.id, "points": 20, "rank": 2},
+        ]
+        expected_page_2 = [
+            {"account_id": a3.id, "points": 20, "rank": 3},
+            {"account_id": a0.id, "points": 10, "rank": 4},
+        ]
+        assert get_all_time_leaderboard(False, 2, 2) == expected_page_2
+        assert get_all_time_leaderboard(False, 2, 2, after=(20, a2.id)) == expected_page_2
+
+    def test_weekly(self):
+        a0, a1, a2 = self.accounts[0:3]
+        a0.add_points(100, ScoreReason.VERSE_FIRST_TESTED)
+        with travel(timezone.now() + timedelta(days=4)):
+            a1.add_points(50, ScoreReason.VERSE_FIRST_TESTED)
+            a0.add_points(10, ScoreReason.VERSE_FIRST_TESTED)
+            log = a2.add_points(20, ScoreReason.VERSE_FIRST_TESTED)
+            log.delete()
+            assert [(item["account_id"], item["points"]) for item in get_weekly_leaderboard(False, 0, 10)] == [
+                (a0.id, 110),
+                (a1.id, 50),
+            ]
+
+        with travel(timezone.now() + WEEKLY_SCORE_PERIOD + timedelta(days=1)):
+            # a0's first points have expired
+            assert [(item["account_id"], item["points"]) for item in get_weekly_leaderboard(False, 0, 10)] == [
+                (a1.id, 50),
+                (a0.id, 10),
+            ]
+            assert TotalScore.objects.get(account=a0).points == 110
+
+        with travel(timezone.now() + WEEKLY_SCORE_PERIOD * 2):
+            assert get_weekly_leaderboard(False, 0, 10) == []
+
+    def test_group(self):
+        a0, a1, a2 = self.accounts[0:3]
+        for account in [a0, a1, a2]:
+            account.add_points(10, ScoreReason.VERSE_FIRST_TESTED)
+        group = Group.objects.create(name="My group", slug="my-group", created_by=a0, open=True, public=True)
+        group.add_user(a0)
+        group.add_user(a2)
+        a2.is_hellbanned = True
+        a2.save()
+        assert {item["account_id"] for item in get_weekly_leaderboard(False, 0, 10, group=group)} == {a0.id}
+        assert {item["account_id"] for item in get_weekly_leaderboard(True, 0, 10, group=group)} == {a0.id, a2.id}
+        assert {item["account_id"] for item in get_all_time_leaderboard(True, 0, 10, group=group)} == {a0.id, a2.id}
+
 
 class VerseCountTests(BibleVersesMixin, CatechismsMixin, AccountTestMixin, TestBase):
     def test_catechisms(self):
@@ -92,6 +193,7 @@ class VerseCountTests(BibleVersesMixin, CatechismsMixin, AccountTestMixin, TestB
 
         # Started
         assert get_verses_started_counts([identity.id])[identity.id] == count
+        assert identity.verses_started_count() == count
 
         # Started per day
         dt = identity.verse_statuses.filter(localized_reference__in=refs).first().last_tested.date()
@@ -110,6 +212,7 @@ class VerseCountTests(BibleVersesMixin, CatechismsMixin, AccountTestMixin, TestB
 
             # Finished
             assert get_verses_finished_count(identity.id) == count
+            assert identity.verses_finished_count() == count
 
             # Finished since
             last_tested = identity.verse_statuses.filter(localized_reference__in=refs).first().last_tested
@@ -0,0 +1,87 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from bibleverses.models import VerseSet
+from learnscripture import prefetch, session
+from learnscripture.models import LearningSession
+
+from .base import AccountTestMixin, TestBase
+from .test_bibleverses import RequireExampleVerseSetsMixin
+
+
+class LearningSessionTests(RequireExampleVerseSetsMixin, AccountTestMixin, TestBase):
+    databases = {"default", "wordsuggestions"}
+
+    def make_request(self, identity, django_session=None):
+        request = RequestFactory().get("/")
+        request.session = self.client.session if django_session is None else django_session
+        request.identity = identity
+        return request
+
+    def test_queue(self):
+        i = self.create_identity(version_slug="NET")
+        i.add_verse_set(VerseSet.objects.get(name="Bible 101"))
+        uvs1, uvs2, uvs3 = uvs_list = list(i.verse_statuses.order_by("text_order"))
+        request = self.make_request(i)
+        session.start_learning_session(request, uvs_list, session.LearningType.LEARNING, "/")
+
+        batch = session.get_verse_statuses_batch(request)
+        assert [uvs.learn_order for uvs in batch.verse_statuses] == [0, 1, 2]
+        assert batch.max_order_val == 2
+        assert batch.untested_order_vals == [0, 1, 2]
+
+        # Skipping a verse removes any before it, with a single UPDATE
+        with self.assertNumQueries(1):
+            session.verse_status_skipped(request, uvs2.id)
+
+        # Unknown or already removed ids are ignored
+        request = self.make_request(i, request.session)
+        session.verse_status_finished(request, 0, [])
+        request = self.make_request(i, request.session)
+        session.verse_status_finished(request, uvs1.id, [])
+
+        request = self.make_request(i, request.session)
+        batch = session.get_verse_statuses_batch(request)
+        assert [(uvs.id, uvs.learn_order) for uvs in batch.verse_statuses] == [(uvs3.id, 2)]
+        assert batch.max_order_val == 2
+
+        # Starting a new session replaces the old one
+        session.start_learning_session(request, [uvs1], session.LearningType.PRACTICE, "/")
+        assert LearningSession.objects.filter(identity=i).count() == 1
+
+    def test_prefetch(self):
+        cache.clear()
+        i = self.create_identity(version_slug="NET")
+        i.add_verse_set(VerseSet.objects.get(name="Bible 101"))
+        uvs_list = list(i.verse_statuses.order_by("text_order"))
+        # Starting the session prefetches the first batch (tasks are run
+        # immediately in tests)
+        request = self.make_request(i)
+        session.start_learning_session(request, uvs_list, session.LearningType.LEARNING, "/")
+        with CaptureQueriesContext(connection) as prefetched_queries:
+            batch = session.get_verse_statuses_batch(request)
+
+        metrics = prefetch.get_metrics()
+        assert metrics["hits"] == 3
+        assert metrics["misses"] == 0
+        assert metrics["hit_ratio"] == 1
+        assert metrics["builds"] == 1
+
+        # Same data as without prefetching
+        expected = i.get_verse_statuses_bulk([uvs.id for uvs in uvs_list])
+        for uvs in batch.verse_statuses:
+            expected_uvs = expected[uvs.id]
+            assert uvs.text == expected_uvs.text
+            assert uvs.title_text == expected_uvs.title_text
+            assert uvs.scoring_text == expected_uvs.scoring_text
+            assert uvs.prompt_list == expected_uvs.prompt_list
+
+        # Without the cache, we need more queries
+        cache.clear()
+        request = self.make_request(i, request.session)
+        with CaptureQueriesContext(connection) as unprefetched_queries:
+            session.get_verse_statuses_batch(request)
+        assert len(unprefetched_queries) > len(prefetched_queries)
+        assert prefetch.get_metrics()["misses"] == 3
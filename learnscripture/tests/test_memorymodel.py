@@ -1,8 +1,12 @@
 import json
 import os.path
 import unittest
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from types import SimpleNamespace
 
 from accounts.memorymodel import MM, strength_estimate
+from accounts.reviewqueue import maximum_urgency, rank_by_urgency, urgencies
 
 
 class StrengthEstimate(unittest.TestCase):
@@ -38,3 +42,37 @@ class StrengthEstimate(unittest.TestCase):
         for vals in data:
             with self.subTest(vals=vals):
                 assert vals[3] == strength_estimate(vals[0], vals[1], vals[2])
+
+
+class Urgency(unittest.TestCase):
+    now = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+
+    def uvs(self, strength, overdue):
+        return SimpleNamespace(
+            strength=strength, next_test_due=None if overdue is None else self.now - timedelta(seconds=overdue)
+        )
+
+    def test_urgencies(self):
+        strength = 0.5
+        overdue = 3 * 24 * 3600
+        gap_length = MM.t(strength) - MM.t(strength - MM.DELTA_S_IDEAL)
+        result = urgencies([self.uvs(strength, overdue), self.uvs(0.1, None), self.uvs(0, 100)], now=self.now)
+        assert abs(result[0] - overdue / gap_length) < 1e-9
+        assert result[1] == 0
+        assert result[2] == 100  # gap clipped to 1 second
+
+    def test_rank_by_urgency(self):
+        day = 24 * 3600
+        # Overdue by the same amount, but the newer verse has a much shorter
+        # gap so is more urgent. Verses that are not due yet come last.
+        established = self.uvs(0.6, day)
+        new = self.uvs(0.1, day)
+        not_due = self.uvs(0.1, -day)
+        assert rank_by_urgency([not_due, established, new], now=self.now) == [new, established, not_due]
+        assert rank_by_urgency([], now=self.now) == []
+
+    def test_maximum_urgency(self):
+        day = 24 * 3600
+        verse_statuses = [self.uvs(0.6, day), self.uvs(0.1, day), self.uvs(0.1, -day)]
+        assert maximum_urgency(verse_statuses, now=self.now) == urgencies(verse_statuses, now=self.now)[1]
+        assert maximum_urgency([], now=self.now) == 0
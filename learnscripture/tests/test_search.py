@@ -1,14 +1,25 @@
+import io
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.urls import reverse
 from django_ftl import override
 
+from bibleverses import versesetsearch
 from bibleverses.languages import LANG, LANGUAGES
 from bibleverses.models import (
     POSTGRES_SEARCH_CONFIGURATIONS,
     StageType,
     TextVersion,
+    Verse,
     VerseSet,
     VerseSetType,
     quick_find,
 )
+from bibleverses.services import get_search_service
+from bibleverses.textsearch import search_local_index
+from learnscripture.forms import VERSE_SET_ORDER_POPULARITY
 
 from .base import BibleVersesMixin, TestBase, create_identity, get_or_create_any_account
 
@@ -239,6 +250,49 @@ class SearchTests(SearchTestsMixin, TestBase):
         results = VerseSet.objects.all().search([LANG.TR], "", default_language_code="tr")
         assert set(results) == {vs1, vs2}
 
+    def test_search_paging(self):
+        verse_sets = []
+        for i in range(25):
+            verse_sets.append(
+                VerseSet.objects.create(
+                    name=f"Set {i}",
+                    slug=f"set-{i}",
+                    public=True,
+                    language_code="en",
+                    set_type=VerseSetType.SELECTION,
+                    created_by=self.account,
+                    popularity=i // 3,  # Some ties
+                )
+            )
+        for order_field in versesetsearch.ORDER_FIELDS:
+            expected = list(VerseSet.objects.order_by(f"-{order_field}", "-id"))
+            found = []
+            after = None
+            while True:
+                page = versesetsearch.get_search_results_page(
+                    VerseSet.objects.all().search([LANG.EN], ""), order_field, len(found), 10, after=after
+                )
+                found.extend(page[0:10])
+                if len(page) <= 10:
+                    break
+                after = versesetsearch.parse_after(versesetsearch.format_after(page[9], order_field), order_field)
+            assert found == expected
+
+        # Through the view:
+        resp = self.client.get(reverse("choose"), {"query": "Set", "order": VERSE_SET_ORDER_POPULARITY})
+        results = resp.context["results"]
+        assert results.more
+        assert "after=" in str(results.more_link)
+        resp2 = self.client.get(str(results.more_link))
+        results2 = resp2.context["results"]
+        assert results.items + results2.items == sorted(verse_sets, key=lambda vs: (-vs.popularity, -vs.id))[0:20]
+        assert results2.shown_count == 20
+
+        # Empty order is valid, and uses the default order
+        resp = self.client.get(reverse("choose"), {"query": "Set", "order": ""})
+        assert resp.status_code == 200
+        assert resp.context["results"].items == results.items
+
 
 class QuickFindTests(SearchTestsMixin, TestBase):
     """
@@ -297,8 +351,9 @@ class QuickFindTests(SearchTestsMixin, TestBase):
             ("Romalılar 3:25", "Romalılar 3:25-26", 25, 26, 1, 1),
             ("Romalılar 3:26", "Romalılar 3:25-26", 25, 26, 1, 1),
             ("Romalılar 3:25-26", "Romalılar 3:25-26", 25, 26, 1, 2),
-            ("Romalılar 3:24-25", "Romalılar 3:24-26", 24, 26, 2, 2),
-            ("Romalılar 3:26-27", "Romalılar 3:25-27", 25, 27, 2, 2),
+            # Verse index already loaded for these:
+            ("Romalılar 3:24-25", "Romalılar 3:24-26", 24, 26, 2, 1),
+            ("Romalılar 3:26-27", "Romalılar 3:25-27", 25, 27, 2, 1),
         ]
         for ref, corrected_ref, start_verse, end_verse, length, q in refs:
             with self.assertNumQueries(q):
@@ -344,6 +399,45 @@ class QuickFindTests(SearchTestsMixin, TestBase):
                 assert not result.already_learning
 
 
+class LocalTextSearchQuickFindTests(QuickFindTests):
+    """
+    Run the quick find tests using the local text search index
+    """
+
+    def setUp(self):
+        super().setUp()
+        data_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_root)
+        settings_override = self.settings(DATA_ROOT=data_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command("build_text_search_index", stdout=io.StringIO())
+
+    def test_uses_local_index(self):
+        assert get_search_service(self.KJV.slug) is search_local_index
+
+    def test_matches_db_search(self):
+        version = self.KJV
+        for query in ["God", "God created", "the waters", "light"]:
+            db_refs = {v.localized_reference for v in Verse.objects.text_search(query, version, limit=1000)}
+            results, more = quick_find(query, version, page_size=1000)
+            assert {r.localized_reference for r in results} == db_refs
+
+    def test_highlighting(self):
+        results, more = quick_find("create heavens", self.KJV, page_size=1000)
+        [verse] = [r.verses[0] for r in results if r.localized_reference == "Genesis 1:1"]
+        assert verse.highlighted_text == "In the beginning God **created** the **heaven** and the earth. "
+
+    def test_paging(self):
+        version = self.KJV
+        all_results, more = quick_find("God", version, page_size=1000)
+        assert not more
+        page_1, more_1 = quick_find("God", version, page_size=2)
+        page_2, more_2 = quick_find("God", version, page=1, page_size=2)
+        assert more_1
+        assert [r.localized_reference for r in page_1 + page_2] == [r.localized_reference for r in all_results[0:4]]
+
+
 def test_search_conf():
     for lang in LANGUAGES:
         assert lang.code in POSTGRES_SEARCH_CONFIGURATIONS, f"{lang.code} needs POSTGRES_SEARCH_CONFIGURATIONS defining"
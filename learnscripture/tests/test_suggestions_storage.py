@@ -0,0 +1,47 @@
+from collections import OrderedDict
+
+from bibleverses.suggestions.tools.markov import Markov
+from bibleverses.suggestions.tools.thesaurus import Thesaurus
+
+
+def _round_trip(cls, obj, tmp_path):
+    filename = tmp_path / "test.analysisdata"
+    with filename.open("wb") as f:
+        cls.dump(obj, f)
+    with filename.open("rb") as f:
+        return cls.load(f)
+
+
+def test_markov_round_trip(tmp_path):
+    markov = Markov(
+        OrderedDict(
+            [
+                (
+                    ("in", "the"),
+                    OrderedDict([(("the", "beginning"), 0.5), (("the", "end"), 0.25), (("the", "éon"), 0.25)]),
+                ),
+                (("the", "beginning"), OrderedDict([(("beginning", "god"), 1.0)])),
+            ]
+        )
+    )
+    loaded = _round_trip(Markov, markov, tmp_path)
+    for start in [("in", "the"), ("the", "beginning"), ("the", "end"), ("not", "there")]:
+        assert loaded.get_next_word_options(start) == markov.get_next_word_options(start)
+
+
+def test_markov_single_word_round_trip(tmp_path):
+    markov = Markov(OrderedDict([("a", OrderedDict([("b", 0.5), ("c", 0.5)])), ("b", OrderedDict([("a", 1.0)]))]))
+    loaded = _round_trip(Markov, markov, tmp_path)
+    assert loaded.get_next_word_options("a") == [("b", 0.5), ("c", 0.5)]
+    assert loaded.get_next_word_options("b") == [("a", 1.0)]
+    assert loaded.get_next_word_options("c") == []
+
+
+def test_thesaurus_round_trip(tmp_path):
+    thesaurus = Thesaurus.from_dict({"big": ["large", "huge"], "small": ["little"]})
+    loaded = _round_trip(Thesaurus, thesaurus, tmp_path)
+    assert loaded["big"] == ["large", "huge"]
+    assert loaded.get("small", None) == ["little"]
+    # In vocabulary, but no entry:
+    assert loaded.get("large", None) is None
+    assert loaded.get("missing", []) == []
@@ -1,3 +1,5 @@
+import threading
+from collections import OrderedDict
 from functools import wraps
 from hashlib import sha1
 
@@ -63,3 +65,42 @@ def memoize_function(func):
     wrapper.clear_result_cache = clearer
 
     return wrapper
+
+
+class LRUCache:
+    """
+    A simple bounded, in-process cache that discards the least recently used
+    items once it reaches `maxsize` items.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
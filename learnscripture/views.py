@@ -33,6 +33,7 @@ import learnscripture.tasks
 from accounts.forms import AccountDetailsForm, PreferencesForm
 from accounts.models import Account, HeatmapStatsType, Identity, get_account_stats
 from awards.models import AWARD_LOGIC_CLASSES, AnyLevel, Award, AwardType
+from bibleverses import versesetsearch
 from bibleverses.books import BIBLE_BOOK_COUNT, get_bible_book_name
 from bibleverses.forms import VerseSetForm
 from bibleverses.languages import LANG, LANGUAGES
@@ -71,7 +72,6 @@ from learnscripture.forms import (
     USER_VERSES_ORDER_STRONGEST,
     USER_VERSES_ORDER_WEAKEST,
     VERSE_SET_ORDER_AGE,
-    VERSE_SET_ORDER_POPULARITY,
     VERSE_SET_TYPE_ALL,
     AccountPasswordChangeForm,
     AccountPasswordResetForm,
@@ -87,7 +87,12 @@ from learnscripture.forms import (
 from learnscripture.ftl_bundles import t
 from moderation import models as moderation
 from payments.sign import sign_payment_info
-from scores.models import get_all_time_leaderboard, get_leaderboard_since, get_verses_started_counts
+from scores.models import (
+    WEEKLY_SCORE_PERIOD,
+    get_all_time_leaderboard,
+    get_verses_started_counts,
+    get_weekly_leaderboard,
+)
 
 from .decorators import (
     for_htmx,
@@ -315,7 +320,12 @@ def get_next(request, default_url):
     return HttpResponseRedirect(default_url)
 
 
-def todays_stats(identity):
+def todays_stats(identity, learning_state=None):
+    if learning_state is not None:
+        return {
+            "total_verses_tested": learning_state.total_tested_today_count(),
+            "new_verses_started": learning_state.started_today_count(),
+        }
     return {
         "total_verses_tested": identity.verse_statuses.total_tested_today_count(),
         "new_verses_started": identity.verse_statuses.started_today_count(),
@@ -474,19 +484,21 @@ def dashboard(request):
 
     groups, more_groups = get_user_groups(identity)
 
-    passages_for_reviewing, passages_for_learning = identity.passages_for_reviewing_and_learning()
+    # All the learning/reviewing info comes from the same snapshot
+    learning_state = identity.learning_state()
+    passages_for_reviewing, passages_for_learning = learning_state.passages_for_reviewing_and_learning()
     # Bring passages that have already been started to the top,
     # and ones that have more to review above them.
     passages_for_learning.sort(key=lambda cvs: (cvs.tested_total == 0, -cvs.needs_review_total))
 
     ctx = {
-        "learn_verses_queues": identity.bible_verse_statuses_for_learning_grouped(),
-        "review_verses_queue": identity.bible_verse_statuses_for_reviewing(),
+        "learn_verses_queues": learning_state.bible_verse_statuses_for_learning_grouped(),
+        "review_verses_queue": learning_state.bible_verse_statuses_for_reviewing(),
         "passages_for_learning": passages_for_learning,
         "passages_for_reviewing": passages_for_reviewing,
-        "catechisms_for_learning": identity.catechisms_for_learning(),
-        "catechisms_for_reviewing": identity.catechisms_for_reviewing(),
-        "next_verse_due": identity.next_verse_due(),
+        "catechisms_for_learning": learning_state.catechisms_for_learning(),
+        "catechisms_for_reviewing": learning_state.catechisms_for_reviewing(),
+        "next_verse_due": learning_state.next_verse_due(),
         "title": t("dashboard-page-title"),
         "events": identity.get_dashboard_events(),
         "create_account_warning": identity.account is None,
@@ -494,10 +506,10 @@ def dashboard(request):
         "more_groups": more_groups,
         "url_after_logout": "/",
         "heatmap_stats_types": HeatmapStatsType.choices,
-        "unfinished_session_first_uvs": session.unfinished_session_first_uvs(request),
+        "unfinished_session_first_uvs": session.unfinished_session_first_uvs(request, learning_state=learning_state),
         "use_dashboard_nav": True,
     }
-    ctx.update(todays_stats(identity))
+    ctx.update(todays_stats(identity, learning_state=learning_state))
     return TemplateResponse(request, "learnscripture/dashboard.html", ctx)
 
 
@@ -567,7 +579,7 @@ def choose(request):
         "verseset_search_form": verseset_search_form,
     }
 
-    verse_sets = verse_sets.order_by("name").prefetch_related("verse_choices")
+    verse_sets = verse_sets.prefetch_related("verse_choices")
 
     query = verseset_search_form.cleaned_data["query"].strip()
     language_code = verseset_search_form.cleaned_data["language_code"]
@@ -598,10 +610,31 @@ def choose(request):
         verse_sets = verse_sets.filter(set_type=set_type)
 
     order = verseset_search_form.cleaned_data["order"]
-    if order == VERSE_SET_ORDER_POPULARITY:
-        verse_sets = verse_sets.order_by("-popularity", "-id")
-    elif order == VERSE_SET_ORDER_AGE:
-        verse_sets = verse_sets.order_by("-date_added", "-id")
+    if order == VERSE_SET_ORDER_AGE:
+        order_field = "date_added"
+    else:
+        order_field = "popularity"
+
+    PAGE_SIZE = 10
+    from_item = get_request_from_item(request)
+    after = versesetsearch.parse_after(request.GET.get("after", None), order_field)
+    verse_set_list = versesetsearch.get_search_results_page(verse_sets, order_field, from_item, PAGE_SIZE, after=after)
+    more = len(verse_set_list) > PAGE_SIZE
+    verse_set_list = verse_set_list[0:PAGE_SIZE]
+    more_link = furl.furl(request.get_full_path()).remove(query=["from_item", "after"])
+    more_link.add(query_params={"from_item": from_item + PAGE_SIZE})
+    if verse_set_list:
+        # Keyset pagination for the next page
+        more_link.add(query_params={"after": versesetsearch.format_after(verse_set_list[-1], order_field)})
+    # We don't do a count() for the total, because it gets slow with
+    # lots of results.
+    results = Page(
+        items=verse_set_list,
+        from_item=from_item,
+        shown_count=from_item + len(verse_set_list),
+        more=more,
+        more_link=more_link,
+    )
 
     if set_type != VerseSetType.SELECTION and query != "":
         # Does the query look like a Bible reference?
@@ -618,18 +651,16 @@ def choose(request):
         if parsed_ref is not None:
             # TODO It would also be nice to detect the case where
             # is no complete match for the searched passage.
-            if len(verse_sets) == 0:
+            if results.empty:
                 ctx["create_passage_set_prompt"] = {
                     "internal_reference": parsed_ref.to_internal().canonical_form(),
                     "localized_reference": parsed_ref.canonical_form(),
                 }
 
-    PAGE_SIZE = 10
-
     if active_section:
         ctx["active_section"] = active_section
 
-    ctx["results"] = get_paged_results(verse_sets, request, PAGE_SIZE)
+    ctx["results"] = results
     ctx["default_bible_version"] = default_bible_version
 
     ctx.update(context_for_quick_find(request))
@@ -1645,15 +1676,28 @@ def group_wall(request, slug: str):
     return TemplateResponse(request, "learnscripture/group_wall.html", ctx)
 
 
+def get_leaderboard_after(request):
+    """
+    Returns the (points, account_id) of the last item of the previous page
+    of a leaderboard, or None
+    """
+    try:
+        points, account_id = request.GET["after"].split(":")
+        return int(points), int(account_id)
+    except (KeyError, ValueError):
+        return None
+
+
 @for_htmx(use_block_from_params=True)
 def group_leaderboard(request, slug: str):
     PAGE_SIZE = 30
     from_item = get_request_from_item(request)
+    after = get_leaderboard_after(request)
     leaderboard_filter_form = LeaderboardFilterForm.from_request_data(request.GET)
     thisweek = leaderboard_filter_form.cleaned_data["when"] == LEADERBOARD_WHEN_THIS_WEEK
 
     if thisweek:
-        cutoff = timezone.now() - timedelta(7)
+        cutoff = timezone.now() - WEEKLY_SCORE_PERIOD
     else:
         cutoff = None
 
@@ -1661,9 +1705,9 @@ def group_leaderboard(request, slug: str):
 
     hellbanned_mode = get_hellbanned_mode(request)
     if thisweek:
-        accounts = get_leaderboard_since(cutoff, hellbanned_mode, from_item, PAGE_SIZE, group=group)
+        accounts = get_weekly_leaderboard(hellbanned_mode, from_item, PAGE_SIZE, group=group, after=after)
     else:
-        accounts = get_all_time_leaderboard(hellbanned_mode, from_item, PAGE_SIZE, group=group)
+        accounts = get_all_time_leaderboard(hellbanned_mode, from_item, PAGE_SIZE, group=group, after=after)
 
     # Now decorate these accounts with additional info from additional queries
     account_ids = [a["account_id"] for a in accounts]
@@ -1682,23 +1726,23 @@ def group_leaderboard(request, slug: str):
 
     last_item = from_item + PAGE_SIZE
     shown_count = min(last_item, from_item + len(accounts))
+    more_link = furl.furl(request.get_full_path()).remove(query=["from_item", "after"])
+    more_link.add(query_params={"from_item": last_item})
+    if accounts:
+        # Keyset pagination for the next page
+        more_link.add(query_params={"after": f"{accounts[-1]['points']}:{accounts[-1]['account_id']}"})
 
     ctx = {
         "include_referral_links": True,
         "thisweek": thisweek,
         # We can't use get_paged_results for 'results' because it doesn't use a
-        # normal queryset. Could possibly fix this by rewriting leaderboard
-        # queries with Window functions introduced in Django 2.0?
+        # normal queryset.
         "results": Page(
             items=accounts,
             from_item=from_item,
             shown_count=shown_count,
             more=len(accounts) == PAGE_SIZE,  # There *might* be more in this case, otherwise definitely not
-            more_link=(
-                furl.furl(request.get_full_path())
-                .remove(query=["from_item"])
-                .add(query_params={"from_item": last_item})
-            ),
+            more_link=more_link,
         ),
         "group": group,
         "title": t("groups-leaderboard-page-title", dict(name=group.name)),
@@ -0,0 +1,371 @@
+"""
+Daily rollups of activity, used for the site stats page and user timeline
+heatmaps.
+
+IdentityDailyStats and SiteDailyStats are updated incrementally as ActionLogs
+are created or deleted, as verses are started (see
+Identity.record_verse_action) or cancelled (see Identity.cancel_learning), and
+as accounts are created, so that the stats pages only need to read one row per
+day shown. Days are UTC days.
+
+`rebuild_daily_stats` recalculates everything from the source tables, and
+should be used to backfill.
+"""
+
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Max, Min, Q, Sum
+
+from .models import IdentityDailyStats, ScoreReason, SiteDailyStats
+
+# Accounts are 'monthly active' on a day if they were active on that day or
+# the previous MONTHLY_ACTIVE_DAYS - 1 days.
+MONTHLY_ACTIVE_DAYS = 30
+
+
+def utc_date(dt):
+    return dt.astimezone(dt_timezone.utc).date()
+
+
+# -- Incremental updates
+
+
+def record_action_log(account_id, created, reason, change):
+    """
+    Updates stats for an ActionLog being created (change=1) or deleted (change=-1)
+    """
+    record_action_logs(account_id, created, [reason], change)
+
+
+def record_action_logs(account_id, created, reasons, change):
+    """
+    Updates stats for ActionLogs for the same account and creation time being
+    created (change=1) or deleted (change=-1). `reasons` contains the
+    ActionLog.reason values.
+    """
+    if not reasons:
+        return
+    day = utc_date(created)
+    counts = {
+        "actions": change * len(reasons),
+        "verses_first_tested": change * reasons.count(ScoreReason.VERSE_FIRST_TESTED),
+        "verses_reviewed": change * reasons.count(ScoreReason.VERSE_REVIEWED),
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO scores_identitydailystats
+              (identity_id, date, actions, verses_first_tested, verses_reviewed, verses_started)
+            SELECT id, %(date)s, GREATEST(%(actions)s, 0), GREATEST(%(verses_first_tested)s, 0),
+                   GREATEST(%(verses_reviewed)s, 0), 0
+            FROM accounts_identity WHERE account_id = %(account_id)s
+            ON CONFLICT (identity_id, date) DO UPDATE SET
+              actions = GREATEST(scores_identitydailystats.actions + %(actions)s, 0),
+              verses_first_tested = GREATEST(scores_identitydailystats.verses_first_tested + %(verses_first_tested)s, 0),
+              verses_reviewed = GREATEST(scores_identitydailystats.verses_reviewed + %(verses_reviewed)s, 0)
+            RETURNING identity_id, actions;
+            """,
+            dict(counts, date=day, account_id=account_id),
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return  # No identity
+    identity_id, actions = row
+
+    site_changes = {
+        "verses_first_tested": counts["verses_first_tested"],
+        "verses_reviewed": counts["verses_reviewed"],
+    }
+    # The row lock taken by the upsert above means that only one caller
+    # sees the change to/from zero actions.
+    if (change > 0 and actions == counts["actions"]) or (change < 0 and actions == 0):
+        site_changes["active_accounts"] = change
+        update_monthly_active_accounts(identity_id, day, change)
+    increment_site_stats(day, **site_changes)
+
+
+def update_monthly_active_accounts(identity_id, day, change):
+    """
+    Updates SiteDailyStats.monthly_active_accounts_change for an identity
+    becoming active (change=1) or inactive (change=-1) on `day`.
+    """
+    period = timedelta(days=MONTHLY_ACTIVE_DAYS)
+    neighbours = (
+        IdentityDailyStats.objects.filter(identity_id=identity_id, actions__gt=0)
+        .exclude(date=day)
+        .aggregate(
+            previous=Max("date", filter=Q(date__lt=day)),
+            next=Min("date", filter=Q(date__gt=day)),
+        )
+    )
+    # The days that are covered by `day` and not by other active days:
+    start = day if neighbours["previous"] is None else max(day, neighbours["previous"] + period)
+    end = day + period if neighbours["next"] is None else min(day + period, neighbours["next"])
+    if start < end:
+        increment_site_stats(start, monthly_active_accounts_change=change)
+        increment_site_stats(end, monthly_active_accounts_change=-change)
+
+
+def record_new_account(date_joined):
+    increment_site_stats(utc_date(date_joined), new_accounts=1)
+
+
+def record_verses_started(identity_id, verse_statuses, started):
+    """
+    Updates stats for UserVerseStatus objects being started (i.e. first_seen
+    set to `started`). They must all be for the same localized_reference and
+    version.
+    """
+    from bibleverses.models import UserVerseStatus
+
+    verse_statuses = [uvs for uvs in verse_statuses if not uvs.ignored]
+    if not verse_statuses:
+        return
+    day = utc_date(started)
+    day_start = datetime.combine(day, time(), tzinfo=dt_timezone.utc)
+    # Verses are counted once per day, even if started via several
+    # UserVerseStatuses, so we need to exclude ones already started today.
+    already_started = set()
+    for refs in (
+        UserVerseStatus.objects.filter(
+            for_identity_id=identity_id,
+            version_id=verse_statuses[0].version_id,
+            ignored=False,
+            first_seen__gte=day_start,
+            first_seen__lt=day_start + timedelta(days=1),
+        )
+        .exclude(id__in=[uvs.id for uvs in verse_statuses])
+        .values_list("internal_reference_list", flat=True)
+    ):
+        already_started.update(refs)
+    count = len(set(verse_statuses[0].internal_reference_list) - already_started)
+    if count == 0:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO scores_identitydailystats
+              (identity_id, date, actions, verses_first_tested, verses_reviewed, verses_started)
+            VALUES (%(identity_id)s, %(date)s, 0, 0, 0, %(count)s)
+            ON CONFLICT (identity_id, date) DO UPDATE SET
+              verses_started = scores_identitydailystats.verses_started + %(count)s;
+            """,
+            dict(identity_id=identity_id, date=day, count=count),
+        )
+
+
+def refresh_verses_started(identity_id, started_times):
+    """
+    Recalculates IdentityDailyStats.verses_started for an identity, for the
+    days of `started_times` (UserVerseStatus.first_seen values). This is needed
+    when UserVerseStatuses are ignored or un-ignored, which doesn't happen
+    often enough to be worth handling incrementally.
+    """
+    days = sorted({utc_date(started) for started in started_times if started is not None})
+    if not days:
+        return
+    # See also `rebuild_daily_stats`
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO scores_identitydailystats
+              (identity_id, date, actions, verses_first_tested, verses_reviewed, verses_started)
+            SELECT %(identity_id)s, days.day, 0, 0, 0, COALESCE(started.count, 0)
+            FROM unnest(%(days)s::date[]) AS days(day)
+            LEFT OUTER JOIN (
+              SELECT day, COUNT(*) AS count
+              FROM (
+                SELECT (first_seen AT TIME ZONE 'UTC')::date AS day
+                FROM bibleverses_userversestatus
+                WHERE for_identity_id = %(identity_id)s
+                  AND first_seen >= %(start)s AND first_seen < %(end)s
+                  AND ignored = false
+                GROUP BY day, unnest(internal_reference_list), version_id
+              ) verses
+              GROUP BY day
+            ) started ON started.day = days.day
+            ON CONFLICT (identity_id, date) DO UPDATE SET verses_started = EXCLUDED.verses_started;
+            """,
+            dict(
+                identity_id=identity_id,
+                days=days,
+                start=datetime.combine(days[0], time(), tzinfo=dt_timezone.utc),
+                end=datetime.combine(days[-1] + timedelta(days=1), time(), tzinfo=dt_timezone.utc),
+            ),
+        )
+
+
+SITE_STATS_COUNTERS = [
+    "new_accounts",
+    "active_accounts",
+    "monthly_active_accounts_change",
+    "verses_first_tested",
+    "verses_reviewed",
+]
+
+
+def increment_site_stats(day, **changes):
+    changes = {name: changes.get(name, 0) for name in SITE_STATS_COUNTERS}
+    if not any(changes.values()):
+        return
+    # Inserted values must satisfy the check constraints even if the row
+    # exists, hence GREATEST for the positive fields.
+    insert_values = ", ".join(
+        f"%({name})s" if name == "monthly_active_accounts_change" else f"GREATEST(%({name})s, 0)"
+        for name in SITE_STATS_COUNTERS
+    )
+    updates = ", ".join(
+        f"{name} = scores_sitedailystats.{name} + %({name})s"
+        if name == "monthly_active_accounts_change"
+        else f"{name} = GREATEST(scores_sitedailystats.{name} + %({name})s, 0)"
+        for name in SITE_STATS_COUNTERS
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO scores_sitedailystats (date, {", ".join(SITE_STATS_COUNTERS)})
+            VALUES (%(date)s, {insert_values})
+            ON CONFLICT (date) DO UPDATE SET {updates};
+            """,
+            dict(changes, date=day),
+        )
+
+
+# -- Querying
+
+
+def get_site_daily_stats(start_date, end_date):
+    """
+    Returns a list of dicts of stats for each day from start_date to end_date
+    (inclusive), with keys 'date', 'new_accounts', 'monthly_active_accounts',
+    'daily_active_accounts', 'verses_first_tested' and 'verses_reviewed'.
+    """
+    rows = {row.date: row for row in SiteDailyStats.objects.filter(date__gte=start_date, date__lte=end_date)}
+    monthly_active_accounts = (
+        SiteDailyStats.objects.filter(date__lt=start_date).aggregate(total=Sum("monthly_active_accounts_change"))[
+            "total"
+        ]
+        or 0
+    )
+    retval = []
+    day = start_date
+    empty_row = SiteDailyStats()
+    while day <= end_date:
+        row = rows.get(day, empty_row)
+        monthly_active_accounts += row.monthly_active_accounts_change
+        retval.append(
+            {
+                "date": day,
+                "new_accounts": row.new_accounts,
+                "monthly_active_accounts": monthly_active_accounts,
+                "daily_active_accounts": row.active_accounts,
+                "verses_first_tested": row.verses_first_tested,
+                "verses_reviewed": row.verses_reviewed,
+            }
+        )
+        day += timedelta(days=1)
+    return retval
+
+
+def get_identity_daily_stats(identity_id):
+    """
+    Returns a list of (date, verses started, verses tested) for the identity,
+    for all days from the first day with any activity up to the last.
+    """
+    rows = (
+        IdentityDailyStats.objects.filter(identity_id=identity_id)
+        .filter(Q(verses_started__gt=0) | Q(verses_first_tested__gt=0) | Q(verses_reviewed__gt=0))
+        .order_by("date")
+        .values_list("date", "verses_started", "verses_first_tested", "verses_reviewed")
+    )
+    retval = []
+    for day, started, first_tested, reviewed in rows:
+        if retval:
+            # Fill in gaps with zeros
+            previous_day = retval[-1][0]
+            for i in range(1, (day - previous_day).days):
+                retval.append((previous_day + timedelta(days=i), 0, 0))
+        retval.append((day, started, first_tested + reviewed))
+    return retval
+
+
+# -- Rebuilding
+
+
+@transaction.atomic
+def rebuild_daily_stats():
+    """
+    Recalculates IdentityDailyStats and SiteDailyStats from ActionLog,
+    UserVerseStatus and Account.
+    """
+    params = {
+        "reason_first_tested": ScoreReason.VERSE_FIRST_TESTED,
+        "reason_reviewed": ScoreReason.VERSE_REVIEWED,
+        "monthly_active_days": MONTHLY_ACTIVE_DAYS,
+    }
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM scores_identitydailystats;")
+        cursor.execute("DELETE FROM scores_sitedailystats;")
+        cursor.execute(
+            """
+            INSERT INTO scores_identitydailystats
+              (identity_id, date, actions, verses_first_tested, verses_reviewed, verses_started)
+            SELECT accounts_identity.id, (scores_actionlog.created AT TIME ZONE 'UTC')::date,
+              COUNT(*),
+              COUNT(*) FILTER (WHERE scores_actionlog.reason = %(reason_first_tested)s),
+              COUNT(*) FILTER (WHERE scores_actionlog.reason = %(reason_reviewed)s),
+              0
+            FROM scores_actionlog
+            INNER JOIN accounts_identity ON accounts_identity.account_id = scores_actionlog.account_id
+            GROUP BY 1, 2;
+            """,
+            params,
+        )
+        # See also `get_verses_started_counts`
+        cursor.execute(
+            """
+            INSERT INTO scores_identitydailystats
+              (identity_id, date, actions, verses_first_tested, verses_reviewed, verses_started)
+            SELECT for_identity_id, day, 0, 0, 0, COUNT(*)
+            FROM (
+              SELECT for_identity_id, (first_seen AT TIME ZONE 'UTC')::date AS day
+              FROM bibleverses_userversestatus
+              WHERE first_seen IS NOT NULL AND ignored = false
+              GROUP BY for_identity_id, day, unnest(internal_reference_list), version_id
+            ) started
+            GROUP BY for_identity_id, day
+            ON CONFLICT (identity_id, date) DO UPDATE SET verses_started = EXCLUDED.verses_started;
+            """,
+            params,
+        )
+        cursor.execute(
+            """
+            INSERT INTO scores_sitedailystats
+              (date, new_accounts, active_accounts, monthly_active_accounts_change,
+               verses_first_tested, verses_reviewed)
+            SELECT date, SUM(new_accounts), SUM(active_accounts), SUM(monthly_active_accounts_change),
+              SUM(verses_first_tested), SUM(verses_reviewed)
+            FROM (
+              SELECT (date_joined AT TIME ZONE 'UTC')::date AS date, 1 AS new_accounts, 0 AS active_accounts,
+                0 AS monthly_active_accounts_change, 0 AS verses_first_tested, 0 AS verses_reviewed
+              FROM accounts_account
+              UNION ALL
+              SELECT date, 0, 1, 0, verses_first_tested, verses_reviewed
+              FROM scores_identitydailystats WHERE actions > 0
+              UNION ALL
+              -- Start of each period of being 'monthly active'
+              SELECT GREATEST(date, previous_date + %(monthly_active_days)s), 0, 0, 1, 0, 0
+              FROM (
+                SELECT date, LAG(date) OVER (PARTITION BY identity_id ORDER BY date) AS previous_date
+                FROM scores_identitydailystats WHERE actions > 0
+              ) active_days
+              UNION ALL
+              SELECT date + %(monthly_active_days)s, 0, 0, -1, 0, 0
+              FROM scores_identitydailystats WHERE actions > 0
+            ) changes
+            GROUP BY date;
+            """,
+            params,
+        )
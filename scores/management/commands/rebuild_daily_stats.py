@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from scores.dailystats import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuilds daily stats (used for the stats page and user heatmaps) from action logs and verse statuses"
+
+    def handle(self, **options):
+        rebuild_daily_stats()
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.27 on 2026-10-18 10:12
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.utils import timezone
+
+
+def forwards(apps, schema_editor):
+    ActionLog = apps.get_model("scores", "ActionLog")
+    TotalScore = apps.get_model("scores", "TotalScore")
+    cutoff = timezone.now() - timedelta(days=7)
+    ActionLog.objects.filter(created__gt=cutoff).update(in_weekly_score=True)
+    weekly_totals = (
+        ActionLog.objects.filter(in_weekly_score=True)
+        .order_by()
+        .values_list("account_id")
+        .annotate(weekly_points=Sum("points"))
+    )
+    for account_id, weekly_points in weekly_totals:
+        TotalScore.objects.filter(account_id=account_id).update(weekly_points=weekly_points)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("scores", "0015_fix_psalms_name"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="actionlog",
+            name="in_weekly_score",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="totalscore",
+            name="weekly_points",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="actionlog",
+            index=models.Index(
+                condition=models.Q(("in_weekly_score", True)), fields=["created"], name="actionlog_weekly_created"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="totalscore",
+            index=models.Index(fields=["-points", "account"], name="totalscore_points_rank"),
+        ),
+        migrations.AddIndex(
+            model_name="totalscore",
+            index=models.Index(
+                condition=models.Q(("weekly_points__gt", 0)),
+                fields=["-weekly_points", "account"],
+                name="totalscore_weekly_rank",
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.27 on 2026-10-18 12:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0036_learningstreak"),
+        ("scores", "0016_weekly_points"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SiteDailyStats",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField(unique=True)),
+                ("new_accounts", models.PositiveIntegerField(default=0)),
+                ("active_accounts", models.PositiveIntegerField(default=0)),
+                ("monthly_active_accounts_change", models.IntegerField(default=0)),
+                ("verses_first_tested", models.PositiveIntegerField(default=0)),
+                ("verses_reviewed", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="IdentityDailyStats",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField()),
+                ("actions", models.PositiveIntegerField(default=0)),
+                ("verses_first_tested", models.PositiveIntegerField(default=0)),
+                ("verses_reviewed", models.PositiveIntegerField(default=0)),
+                ("verses_started", models.PositiveIntegerField(default=0)),
+                (
+                    "identity",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to="accounts.identity",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="identitydailystats",
+            constraint=models.UniqueConstraint(fields=("identity", "date"), name="identitydailystats_unique"),
+        ),
+    ]
@@ -3,15 +3,17 @@ Records of user scores and actions.
 
 ActionLog is used for scores and for various things like calculating
 streaks and awards.
-TotalScore is a summary used for all time scores.
+TotalScore is a summary used for all time and weekly scores, which is kept up
+to date as ActionLogs are created, and used for leaderboards.
 
 """
 
-import uuid
+from collections import defaultdict
 from datetime import timedelta
 
-from django.db import models
+from django.db import connection, models
 from django.db.models import F
+from django.db.models.functions import Greatest
 from django.utils import timezone
 
 from bibleverses import languages
@@ -63,6 +65,11 @@ class Scores:
         return cls._LANGUAGE_POINTS_PER_WORD[language_code]
 
 
+# Period covered by weekly scores, which are the points gained within this
+# period up to now.
+WEEKLY_SCORE_PERIOD = timedelta(days=7)
+
+
 class ActionLog(models.Model):
     account = models.ForeignKey("accounts.Account", on_delete=models.CASCADE, related_name="action_logs")
     points = models.PositiveIntegerField()
@@ -71,24 +78,111 @@ class ActionLog(models.Model):
     accuracy = models.FloatField(null=True, blank=True)
     created = models.DateTimeField(db_index=True)
     award = models.OneToOneField("awards.Award", null=True, blank=True, on_delete=models.PROTECT)
+    # True if `points` is included in TotalScore.weekly_points
+    in_weekly_score = models.BooleanField(default=False)
 
     def save(self, *args, **kwargs):
         """On save, update timestamps"""
         if not self.id:
             self.created = timezone.now()
-            self.update_total_score(self.points)
+            self.in_weekly_score = True
+            self.update_total_score(self.points, weekly=True)
+            self.update_daily_stats(1)
         super().save(*args, **kwargs)
 
-    def update_total_score(self, by_points):
-        TotalScore.objects.filter(account=self.account).update(points=F("points") + by_points)
+    def update_total_score(self, by_points, weekly=False):
+        updates = {"points": F("points") + by_points}
+        if weekly:
+            updates["weekly_points"] = Greatest(F("weekly_points") + by_points, 0)
+        TotalScore.objects.filter(account=self.account).update(**updates)
+
+    def update_daily_stats(self, change):
+        from .dailystats import record_action_log
+
+        record_action_log(self.account_id, self.created, self.reason, change)
+
+    @classmethod
+    def create_for_account(cls, account_id, action_logs):
+        """
+        Saves new (unsaved) ActionLogs for an account, with the same effect as
+        calling `save()` on each, but using one query each for the ActionLog
+        insert and the TotalScore update. Returns the TotalScore.points value
+        from before the update.
+        """
+        from .dailystats import record_action_logs
+
+        now = timezone.now()
+        for action_log in action_logs:
+            action_log.account_id = account_id
+            action_log.created = now
+            action_log.in_weekly_score = True
+        cls.objects.bulk_create(action_logs)
+        added_points = sum(action_log.points for action_log in action_logs)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE scores_totalscore
+                SET points = points + %(points)s, weekly_points = GREATEST(weekly_points + %(points)s, 0)
+                WHERE account_id = %(account_id)s
+                RETURNING points;
+                """,
+                dict(points=added_points, account_id=account_id),
+            )
+            (points,) = cursor.fetchone()
+        record_action_logs(account_id, now, [action_log.reason for action_log in action_logs], 1)
+        return points - added_points
+
+    @classmethod
+    def create_for_accounts(cls, action_logs):
+        """
+        Saves new (unsaved) ActionLogs, which can be for many accounts, with the
+        same effect as `create_for_account`, but using one query for all the
+        ActionLog inserts and one for all the TotalScore updates. Returns a
+        dictionary of {account_id: TotalScore.points before the update}.
+        """
+        from .dailystats import record_action_logs
+
+        if not action_logs:
+            return {}
+        now = timezone.now()
+        added_points = defaultdict(int)
+        reasons = defaultdict(list)
+        for action_log in action_logs:
+            action_log.created = now
+            action_log.in_weekly_score = True
+            added_points[action_log.account_id] += action_log.points
+            reasons[action_log.account_id].append(action_log.reason)
+        cls.objects.bulk_create(action_logs)
+        account_ids = list(added_points)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE scores_totalscore
+                SET points = scores_totalscore.points + added.points,
+                    weekly_points = GREATEST(scores_totalscore.weekly_points + added.points, 0)
+                FROM unnest(%(account_ids)s::bigint[], %(points)s::bigint[]) AS added(account_id, points)
+                WHERE scores_totalscore.account_id = added.account_id
+                RETURNING scores_totalscore.account_id, scores_totalscore.points;
+                """,
+                dict(account_ids=account_ids, points=[added_points[account_id] for account_id in account_ids]),
+            )
+            rows = cursor.fetchall()
+        for account_id in account_ids:
+            record_action_logs(account_id, now, reasons[account_id], 1)
+        return {account_id: points - added_points[account_id] for account_id, points in rows}
 
     def delete(self, **kwargs):
         retval = super().delete(**kwargs)
-        self.update_total_score(-self.points)
+        self.update_total_score(-self.points, weekly=self.in_weekly_score)
+        self.update_daily_stats(-1)
         return retval
 
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            # For expire_weekly_scores
+            models.Index(fields=["created"], condition=models.Q(in_weekly_score=True), name="actionlog_weekly_created"),
+        ]
 
     def __str__(self):
         return f"<ActionLog {self.id}>"
@@ -101,137 +195,141 @@ class TotalScore(models.Model):
     account = models.OneToOneField("accounts.Account", on_delete=models.CASCADE, related_name="total_score")
     points = models.PositiveIntegerField(default=0)
     visible = models.BooleanField(default=True)
+    # Points within WEEKLY_SCORE_PERIOD, see expire_weekly_scores
+    weekly_points = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # For leaderboards
+            models.Index(fields=["-points", "account"], name="totalscore_points_rank"),
+            models.Index(
+                fields=["-weekly_points", "account"],
+                condition=models.Q(weekly_points__gt=0),
+                name="totalscore_weekly_rank",
+            ),
+        ]
 
     def __str__(self):
         return f"<TotalScore {self.points}>"
 
 
-def active_user_query(q, hellbanned_mode):
-    from learnscripture.utils.sqla import accounts_account as account
-
-    retval = q.where(account.c.is_active == True)  # noqa
-    if not hellbanned_mode:
-        retval = retval.where(account.c.is_hellbanned != True)  # noqa
-    return retval
-
-
-def leaderboard_group_filter(q, hellbanned_mode, group):
-    from learnscripture.utils.sqla import accounts_account
-
-    if group is not None:
-        members = group.members.all()
-        if not hellbanned_mode:
-            members = members.exclude(is_hellbanned=True)
-        account_ids = [a.id for a in members]
-        q = q.where(accounts_account.c.id.in_(account_ids))
-    return q
-
-
-def get_all_time_leaderboard(hellbanned_mode, from_item, page_size, group=None):
-    # page is zero indexed
+class IdentityDailyStats(models.Model):
+    """
+    Per day counts of activity for an identity, see dailystats.py
+    """
 
-    from sqlalchemy.schema import Sequence
-    from sqlalchemy.sql import select
-    from sqlalchemy.sql.functions import next_value
+    identity = models.ForeignKey("accounts.Identity", on_delete=models.CASCADE, related_name="daily_stats")
+    date = models.DateField()
+    # Number of ActionLogs
+    actions = models.PositiveIntegerField(default=0)
+    # ActionLogs for ScoreReason.VERSE_FIRST_TESTED and VERSE_REVIEWED
+    verses_first_tested = models.PositiveIntegerField(default=0)
+    verses_reviewed = models.PositiveIntegerField(default=0)
+    # Verses started (UserVerseStatus.first_seen set), counting combo and
+    # merged verses for their full value, as in `get_verses_started_counts`
+    verses_started = models.PositiveIntegerField(default=0)
 
-    from learnscripture.utils.sqla import accounts_account, default_engine, scores_totalscore
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["identity", "date"], name="identitydailystats_unique"),
+        ]
 
-    account = accounts_account
-    totalscore = scores_totalscore
+    def __str__(self):
+        return f"<IdentityDailyStats {self.identity_id} {self.date}>"
 
-    sequence_name = f"rank_seq_{uuid.uuid4().hex}"
-    sq = Sequence(sequence_name)
 
-    subq1 = (
-        active_user_query(
-            select([totalscore.c.account_id, totalscore.c.points], from_obj=totalscore.join(account)), hellbanned_mode
-        )
-        .group_by(totalscore.c.account_id, totalscore.c.points)
-        .order_by(totalscore.c.points.desc())
-    )
+class SiteDailyStats(models.Model):
+    """
+    Site wide per day counts of activity, see dailystats.py
+    """
 
-    subq1 = leaderboard_group_filter(subq1, hellbanned_mode, group)
-    subq1 = subq1.alias()
-
-    q1 = (
-        select([subq1.c.account_id, subq1.c.points, next_value(sq).label("rank")], from_obj=subq1)
-        .limit(page_size)
-        .offset(from_item)
-    )
-
-    default_engine.execute(f"CREATE TEMPORARY SEQUENCE {sequence_name};")
-    results = default_engine.execute(q1).fetchall()
-    default_engine.execute(f"DROP SEQUENCE {sequence_name};")
-    return [{"account_id": r[0], "points": r[1], "rank": r[2]} for r in results]
+    date = models.DateField(unique=True)
+    new_accounts = models.PositiveIntegerField(default=0)
+    # Accounts with at least one ActionLog
+    active_accounts = models.PositiveIntegerField(default=0)
+    # The number of accounts active in the MONTHLY_ACTIVE_DAYS period up to a
+    # date is the sum of this field for all dates up to and including that date.
+    monthly_active_accounts_change = models.IntegerField(default=0)
+    verses_first_tested = models.PositiveIntegerField(default=0)
+    verses_reviewed = models.PositiveIntegerField(default=0)
 
+    def __str__(self):
+        return f"<SiteDailyStats {self.date}>"
 
-def get_leaderboard_since(since, hellbanned_mode, from_item, page_size, group=None):
-    # page is zero indexed
 
-    # This uses a completely different strategy to get_all_time_leaderboard,
-    # relying on ActionLog
-    from sqlalchemy.schema import Sequence
-    from sqlalchemy.sql import func, select
-    from sqlalchemy.sql.functions import next_value
+def leaderboard_group_filter(qs, hellbanned_mode, group):
+    if group is not None:
+        members = group.members.all()
+        if not hellbanned_mode:
+            members = members.exclude(is_hellbanned=True)
+        qs = qs.filter(account__in=members)
+    return qs
 
-    from learnscripture.utils.sqla import accounts_account, default_engine, scores_actionlog
 
-    account = accounts_account
-    actionlog = scores_actionlog
+def get_all_time_leaderboard(hellbanned_mode, from_item, page_size, group=None, after=None):
+    qs = TotalScore.objects.all()
+    return _get_leaderboard(qs, "points", hellbanned_mode, from_item, page_size, group=group, after=after)
 
-    sequence_name = f"rank_seq_{uuid.uuid4().hex}"
-    sq = Sequence(sequence_name)
 
-    subq1 = (
-        active_user_query(
-            select(
-                [actionlog.c.account_id, sum_points := func.sum(actionlog.c.points).label("sum_points")],
-                from_obj=actionlog.join(account),
-            ),
-            hellbanned_mode,
-        )
-        .where(actionlog.c.created > since)
-        .group_by(actionlog.c.account_id)
-    )
+def get_weekly_leaderboard(hellbanned_mode, from_item, page_size, group=None, after=None):
+    expire_weekly_scores()
+    qs = TotalScore.objects.filter(weekly_points__gt=0)
+    return _get_leaderboard(qs, "weekly_points", hellbanned_mode, from_item, page_size, group=group, after=after)
 
-    subq1 = leaderboard_group_filter(subq1, hellbanned_mode, group)
 
-    subq1 = subq1.order_by(sum_points.desc())
-    subq1 = subq1.alias()
+def _get_leaderboard(qs, points_field, hellbanned_mode, from_item, page_size, group=None, after=None):
+    """
+    Returns a page of the leaderboard, as a list of dicts with keys
+    'account_id', 'points' and 'rank'.
 
-    q1 = (
-        select(
-            [
-                subq1.c.account_id,
-                subq1.c.sum_points.label("points"),
-                next_value(sq).label("rank"),
-            ],
-            from_obj=subq1,
+    `from_item` is the (zero indexed) rank of the first item. `after` is a
+    (points, account_id) tuple for the last item of the previous page, if
+    known, which allows us to use keyset pagination instead of OFFSET.
+    """
+    qs = qs.filter(account__is_active=True)
+    if not hellbanned_mode:
+        qs = qs.exclude(account__is_hellbanned=True)
+    qs = leaderboard_group_filter(qs, hellbanned_mode, group)
+    qs = qs.order_by(f"-{points_field}", "account_id")
+    if after is not None:
+        after_points, after_account_id = after
+        qs = qs.filter(
+            models.Q(**{f"{points_field}__lt": after_points})
+            | models.Q(**{points_field: after_points, "account_id__gt": after_account_id})
+        )[:page_size]
+    else:
+        qs = qs[from_item : from_item + page_size]
+    return [
+        {"account_id": account_id, "points": points, "rank": from_item + i + 1}
+        for i, (account_id, points) in enumerate(qs.values_list("account_id", points_field))
+    ]
+
+
+def expire_weekly_scores():
+    """
+    Removes points from TotalScore.weekly_points for action logs that are
+    now older than WEEKLY_SCORE_PERIOD.
+    """
+    # Normally there are very few of these (only the ones that have expired
+    # since the last call), and the partial index on ActionLog makes finding
+    # them cheap. Concurrent calls are safe, since the UPDATE of each
+    # ActionLog row can only succeed once.
+    cutoff = timezone.now() - WEEKLY_SCORE_PERIOD
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH expired AS (
+                UPDATE scores_actionlog SET in_weekly_score = false
+                WHERE in_weekly_score AND created <= %s
+                RETURNING account_id, points
+            )
+            UPDATE scores_totalscore
+            SET weekly_points = GREATEST(scores_totalscore.weekly_points - expired_totals.points, 0)
+            FROM (SELECT account_id, SUM(points) AS points FROM expired GROUP BY account_id) AS expired_totals
+            WHERE scores_totalscore.account_id = expired_totals.account_id;
+            """,
+            [cutoff],
         )
-        .limit(page_size)
-        .offset(from_item)
-    )
-
-    default_engine.execute(f"CREATE TEMPORARY SEQUENCE {sequence_name};")
-    results = default_engine.execute(q1).fetchall()
-    default_engine.execute(f"DROP SEQUENCE {sequence_name};")
-    return [{"account_id": r[0], "points": r[1], "rank": r[2]} for r in results]
-
-
-def get_number_of_distinct_hours_for_account_id(account_id):
-    from sqlalchemy import func
-    from sqlalchemy.sql import distinct, extract, select
-
-    from learnscripture.utils.sqla import default_engine, scores_actionlog
-
-    sq1 = select(
-        [distinct(extract("hour", scores_actionlog.c.created)).label("hours")],
-        scores_actionlog.c.account_id == account_id,
-        from_obj=[scores_actionlog],
-    ).alias()
-    q1 = select([func.count(sq1.c.hours)], from_obj=sq1)
-
-    return default_engine.execute(q1).fetchall()[0][0]
 
 
 def _add_zeros(vals):
@@ -282,57 +380,26 @@ def get_verses_started_counts(identity_ids, started_since=None):
 
 
 def get_verses_started_per_day(identity_id):
-    from sqlalchemy import func
-    from sqlalchemy.sql import and_, select
-
-    from learnscripture.utils.sqla import bibleverses_userversestatus, default_engine
-
-    day_col = func.date_trunc("day", bibleverses_userversestatus.c.first_seen).label("day")
-
-    q1 = (
-        select(
-            [day_col],
-            and_(
-                bibleverses_userversestatus.c.for_identity_id == identity_id,
-                bibleverses_userversestatus.c.first_seen != None,  # noqa:E711
-                bibleverses_userversestatus.c.ignored == False,  # noqa:E712
-            ),
-            from_obj=bibleverses_userversestatus,
-        ).group_by(
-            day_col,
-            func.unnest(bibleverses_userversestatus.c.internal_reference_list),
-            bibleverses_userversestatus.c.version_id,
-        )
-    ).alias()
-
-    q2 = select([q1.c.day, func.count()], from_obj=q1).order_by(q1.c.day).group_by(q1.c.day)
-
-    vals = [(d.date(), c) for (d, c) in default_engine.execute(q2).fetchall()]
+    # See dailystats.py
+    vals = (
+        IdentityDailyStats.objects.filter(identity_id=identity_id, verses_started__gt=0)
+        .order_by("date")
+        .values_list("date", "verses_started")
+    )
     # Now we need to add zeros for the missing dates
-    return _add_zeros(vals)
+    return _add_zeros(list(vals))
 
 
 def get_verses_tested_per_day(account_id):
-    from sqlalchemy import func
-    from sqlalchemy.sql import and_, select
-
-    from learnscripture.utils.sqla import default_engine, scores_actionlog
-
-    day_col = func.date_trunc("day", scores_actionlog.c.created).label("day")
-    q1 = (
-        select(
-            [day_col, func.count(day_col)],
-            and_(
-                scores_actionlog.c.account_id == account_id,
-                scores_actionlog.c.reason.in_([ScoreReason.VERSE_FIRST_TESTED, ScoreReason.VERSE_REVIEWED]),
-            ),
-        )
-        .order_by(day_col)
-        .group_by(day_col)
+    # See dailystats.py
+    vals = (
+        IdentityDailyStats.objects.filter(identity__account_id=account_id)
+        .annotate(verses_tested=F("verses_first_tested") + F("verses_reviewed"))
+        .filter(verses_tested__gt=0)
+        .order_by("date")
+        .values_list("date", "verses_tested")
     )
-
-    vals = [(d.date(), c) for (d, c) in default_engine.execute(q1).fetchall()]
-    return _add_zeros(vals)
+    return _add_zeros(list(vals))
 
 
 def get_verses_finished_count(identity_id, finished_since=None):